@@ -1,26 +1,69 @@
-from flask import Flask, request, send_file, jsonify
+from flask import Flask, request, send_file, jsonify, Response
 from flask_cors import CORS
 import sys
 import os
 from pathlib import Path
 import tempfile
 import uuid
+import json
+import io
 
 # Add parent directory to path to import latex_converter
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 from latex_converter import LatexConverter
+from memory import MemoryBudget, MemoryBudgetExceeded
+from metrics import Metrics
+from page_cache import PageCache
+from page_router import HybridConverter
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for Chrome extension
 
-# Initialize converter
-converter = LatexConverter()
+# auto: plain pages are translated from their text layer and only scanned or math-heavy pages
+# go through the vision model; latex: every page through the vision model (the old behaviour)
+ENGINE = os.environ.get('ENGINE', 'auto')
+if ENGINE not in ('auto', 'latex'):
+    raise ValueError(f"ENGINE must be 'auto' or 'latex', not {ENGINE!r}")
+Converter = HybridConverter if ENGINE == 'auto' else LatexConverter
+
+# Initialize converter once at startup so a missing API key fails fast (jobs get their own instance)
+converter = Converter()
+
+# Uploads up to this size are translated entirely in memory; larger ones go through a temp dir
+MAX_IN_MEMORY_BYTES = int(os.environ.get('MAX_IN_MEMORY_MB', 64)) * 1024 * 1024
+
+# Post-process outputs for size (font subsetting, compression); set OPTIMIZE_OUTPUT=0 to skip
+OPTIMIZE_OUTPUT = os.environ.get('OPTIMIZE_OUTPUT', '1') != '0'
+
+# Per-job memory limit (unset: none). Jobs spill pages, translations and images to disk near it;
+# uploads that can't fit are rejected with 413, so a container of known size runs a predictable number of jobs
+MEMORY_BUDGET_MB = float(os.environ.get('MEMORY_BUDGET_MB', 0) or 0)
+
+# Process-wide totals, every finished job is merged in and exposed on /metrics
+server_metrics = Metrics(job="api-server")
 
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
     return jsonify({"status": "healthy", "service": "PDF Hindi Translator"})
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(server_metrics.to_prometheus(), mimetype='text/plain; version=0.0.4')
+
+def translate_via_disk(pdf_file, job_converter):
+    """Large uploads: spool to a temporary directory and convert by path. Returns the PDF bytes or None."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_path = os.path.join(temp_dir, 'input.pdf')
+        output_path = os.path.join(temp_dir, 'output.pdf')
+        pdf_file.save(input_path)
+        job_converter.generate_pdf(input_path, output_path)
+        if not os.path.exists(output_path):
+            return None
+        with open(output_path, 'rb') as f:
+            return f.read()
+
 @app.route('/translate', methods=['POST'])
 def translate_pdf():
     """
@@ -41,33 +84,55 @@ def translate_pdf():
         if not pdf_file.filename.endswith('.pdf'):
             return jsonify({"error": "File must be a PDF"}), 400
         
-        # Create temporary directory
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Save input PDF
-            input_path = os.path.join(temp_dir, 'input.pdf')
-            output_path = os.path.join(temp_dir, 'output.pdf')
-            
-            pdf_file.save(input_path)
-            
-            # Convert
-            print(f"🔄 Starting translation of: {pdf_file.filename}")
-            converter.generate_pdf(input_path, output_path)
-            
-            # Check if output was created
-            if not os.path.exists(output_path):
-                return jsonify({"error": "Translation failed - output not generated"}), 500
-            
-            print(f"✅ Translation complete: {pdf_file.filename}")
-            
-            # Return the translated PDF
-            return send_file(
-                output_path,
-                mimetype='application/pdf',
-                as_attachment=True,
-                download_name=f'translated_{pdf_file.filename}'
-            )
+        print(f"🔄 Starting translation of: {pdf_file.filename}")
+        job_metrics = Metrics(job=pdf_file.filename)
+        job_budget = MemoryBudget(MEMORY_BUDGET_MB, job_metrics) if MEMORY_BUDGET_MB else None
+        # Cross-document page cache (page_cache.py) only when PAGE_CACHE_DIR points at one, bounded by PAGE_CACHE_MAX_MB
+        job_cache = PageCache.from_env(job_metrics, default_dir=None)
+        job_converter = Converter(metrics=job_metrics, optimize=OPTIMIZE_OUTPUT, budget=job_budget, page_cache=job_cache)
+        in_memory = (request.content_length or 0) <= MAX_IN_MEMORY_BYTES
+        try:
+            with job_metrics.span("total"):
+                if job_budget:
+                    job_budget.admit(request.content_length or 0)
+                if in_memory:
+                    output_bytes = job_converter.generate_pdf_bytes(pdf_file.read())
+                else:
+                    output_bytes = translate_via_disk(pdf_file, job_converter)
+        except MemoryBudgetExceeded as e:
+            server_metrics.incr("job_failures")
+            print(f"❌ Rejected: {e}")
+            return jsonify({"error": str(e)}), 413
+        finally:
+            if job_budget:
+                print(job_budget.report())
+                job_budget.close()
+            job_metrics.incr("jobs")
+            job_metrics.incr("jobs_in_memory" if in_memory else "jobs_on_disk")
+            server_metrics.merge(job_metrics)
+
+        # Check if output was created
+        if not output_bytes:
+            server_metrics.incr("job_failures")
+            return jsonify({"error": "Translation failed - output not generated"}), 500
+
+        print(f"✅ Translation complete: {pdf_file.filename}")
+        print(f"📊 {json.dumps(job_metrics.summary())}")
+
+        # Return the translated PDF straight from memory
+        response = send_file(
+            io.BytesIO(output_bytes),
+            mimetype='application/pdf',
+            as_attachment=True,
+            download_name=f'translated_{pdf_file.filename}'
+        )
+        if job_converter.failures:
+            # Partial result: tell the client which pages are untranslated instead of hiding it
+            response.headers['X-Failed-Pages'] = ','.join(str(page) for page, _ in job_converter.failures)
+        return response
     
     except Exception as e:
+        server_metrics.incr("job_failures")
         print(f"❌ Error: {str(e)}")
         return jsonify({"error": f"Translation error: {str(e)}"}), 500
 
@@ -0,0 +1,93 @@
+"""
+Measures CLI cold-start cost with `python -X importtime`.
+
+For each entry module in src/ it imports the module in a fresh interpreter, parses the
+importtime trace and reports the cumulative import time plus the slowest top-level
+imports. It also times `main.py --help` end to end. Exits non-zero if any entry point
+exceeds the startup budget, so it can run in CI or from batch scripts.
+
+Usage:
+    python bench_startup.py [--budget-ms 50] [--runs 5] [--top 8]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
+ENTRY_MODULES = ["main", "latex_converter", "verify"]
+
+
+def import_times(module):
+    """
+    Imports module in a fresh interpreter under -X importtime.
+    Returns (total_us, [(cumulative_us, name), ...]) where the list holds the direct
+    imports made by module itself, slowest first.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        # Skip the header line ("self [us] | cumulative | imported package")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            name = parts[2][1:]  # drop the separator space, keep the nesting indent
+            depth = (len(name) - len(name.lstrip(" "))) // 2
+            rows.append((depth, int(parts[1]), name.strip()))
+
+    # importtime prints children before their parent, so the module's own imports
+    # are the depth-1 rows directly above its depth-0 row
+    total, children = 0, []
+    for index, (depth, cumulative, name) in enumerate(rows):
+        if depth == 0 and name == module:
+            total = cumulative
+            for child_depth, child_cumulative, child_name in reversed(rows[:index]):
+                if child_depth == 0:
+                    break
+                if child_depth == 1:
+                    children.append((child_cumulative, child_name))
+            break
+    return total, sorted(children, reverse=True)
+
+
+def help_wall_time(runs):
+    """Median wall time in ms of `python src/main.py --help`."""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(SRC_DIR, "main.py"), "--help"],
+                       capture_output=True, check=True)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLI startup benchmark (python -X importtime)")
+    parser.add_argument("--budget-ms", type=float, default=50.0, help="Maximum import time per entry module in ms")
+    parser.add_argument("--runs", type=int, default=5, help="Repetitions; the median is reported")
+    parser.add_argument("--top", type=int, default=8, help="Slowest imports to list per module")
+    args = parser.parse_args()
+
+    over_budget = False
+    for module in ENTRY_MODULES:
+        samples = [import_times(module) for _ in range(args.runs)]
+        total_ms = statistics.median(total for total, _ in samples) / 1000
+        status = "OK " if total_ms <= args.budget_ms else "OVER"
+        over_budget |= total_ms > args.budget_ms
+        print(f"[{status}] import {module}: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+        for cumulative, name in samples[-1][1][:args.top]:
+            print(f"         {cumulative / 1000:8.1f} ms  {name}")
+
+    print(f"main.py --help wall time: {help_wall_time(args.runs):.1f} ms (includes interpreter start)")
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
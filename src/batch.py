@@ -0,0 +1,188 @@
+import glob
+import os
+from typing import Dict, List, Optional, Tuple
+try:
+    from .metrics import Metrics
+    from .pages import page_count, parse_page_ranges
+    from .pipeline import apply_translations, collect_segments, extract_pages, translate_segments
+except ImportError:
+    from metrics import Metrics
+    from pages import page_count, parse_page_ranges
+    from pipeline import apply_translations, collect_segments, extract_pages, translate_segments
+
+
+def is_batch_input(path: str) -> bool:
+    """A directory or a glob pattern selects batch mode; anything else is a single PDF."""
+    if os.path.isfile(path):
+        # An existing file is a single PDF even when its name has [, * or ? in it
+        return False
+    return os.path.isdir(path) or glob.has_magic(path)
+
+
+def resolve_inputs(path: str) -> List[str]:
+    """Expands a directory (its *.pdf files) or a glob pattern into a sorted list of PDFs."""
+    if os.path.isdir(path):
+        pattern = os.path.join(path, "*.pdf")
+    else:
+        pattern = path
+    return sorted(p for p in glob.glob(pattern) if os.path.isfile(p) and p.lower().endswith(".pdf"))
+
+
+def output_paths(inputs: List[str], output_dir: str) -> List[str]:
+    """One output per input, named after it; repeated names (from different folders) get a suffix."""
+    seen: Dict[str, int] = {}
+    paths = []
+    for input_pdf in inputs:
+        stem = os.path.splitext(os.path.basename(input_pdf))[0]
+        seen[stem] = seen.get(stem, 0) + 1
+        name = stem if seen[stem] == 1 else f"{stem}_{seen[stem]}"
+        paths.append(os.path.join(output_dir, f"{name}_hinglish.pdf"))
+    return paths
+
+
+def _extract_document(input_pdf: str, max_pages: Optional[int], use_ocr: bool,
+                      page_range: Optional[str] = None, scan_dpi: Optional[int] = None) -> Tuple[list, Metrics]:
+    """Worker: extracts one document in its own process."""
+    metrics = Metrics(job=input_pdf)
+    page_numbers = None
+    if page_range:
+        try:
+            page_numbers = parse_page_ranges(page_range, page_count(input_pdf))
+        except ValueError:
+            # The range lies past the end of this (shorter) document
+            page_numbers = []
+    return extract_pages(input_pdf, max_pages, use_ocr, metrics, page_numbers=page_numbers, scan_dpi=scan_dpi), metrics
+
+
+def _render_document(output_pdf: str, pages_data: list, translation_map: dict,
+                     image_dpi: Optional[float] = None, optimize: bool = False) -> Metrics:
+    """Worker: renders one document in its own process."""
+    try:
+        from .generator import PDFGenerator
+    except ImportError:
+        from generator import PDFGenerator
+
+    metrics = Metrics(job=output_pdf)
+    PDFGenerator(output_pdf, metrics=metrics, image_dpi=image_dpi, optimize=optimize).generate(pages_data, translation_map)
+    return metrics
+
+
+class BatchRunner:
+    """
+    Translates many PDFs as one job:
+
+    1. extracts every document in parallel worker processes,
+    2. dedupes segments across the whole batch (shared boilerplate, running
+       headers and legal footers are translated once, not once per file),
+    3. sends the union through a single Translator, so all documents share one
+       model client, one adaptive batcher and one rate-limit circuit breaker,
+    4. renders the outputs in parallel worker processes.
+    """
+
+    def __init__(self, inputs: List[str], output_dir: str, metrics: Optional[Metrics] = None,
+                 jobs: Optional[int] = None, max_pages: Optional[int] = None, use_ocr: bool = True,
+                 hedge: bool = False, image_dpi: Optional[float] = None, optimize: bool = False,
+                 page_range: Optional[str] = None, layout: bool = True, models: Optional[str] = None,
+                 scan_dpi: Optional[int] = None):
+        self.inputs = inputs
+        self.outputs = output_paths(inputs, output_dir)
+        self.output_dir = output_dir
+        self.metrics = metrics or Metrics()
+        self.jobs = jobs or os.cpu_count() or 1
+        self.max_pages = max_pages
+        self.use_ocr = use_ocr
+        self.hedge = hedge
+        self.image_dpi = image_dpi
+        self.optimize = optimize
+        self.page_range = page_range
+        self.layout = layout
+        # --models spec for the shared Translator (None: $GEMINI_MODELS or the defaults)
+        self.models = models
+        self.scan_dpi = scan_dpi
+        # Per document: pages_data and the SegmentNormalizer used on it
+        self.documents: List[Tuple[list, object]] = []
+
+    def extract(self) -> List[str]:
+        """Extracts and segments all inputs; returns the sorted union of segments."""
+        from concurrent.futures import ProcessPoolExecutor
+
+        print(f"Extracting {len(self.inputs)} documents with {self.jobs} worker(s)...")
+        # Workers record their own "extract" spans; this one is the wall-clock for the whole batch
+        with self.metrics.span("extract_batch"):
+            with ProcessPoolExecutor(max_workers=min(self.jobs, len(self.inputs))) as pool:
+                futures = [pool.submit(_extract_document, path, self.max_pages, self.use_ocr, self.page_range,
+                                       self.scan_dpi)
+                           for path in self.inputs]
+                extracted = []
+                outputs = []
+                for path, output_pdf, future in zip(self.inputs, self.outputs, futures):
+                    # One unreadable PDF only drops that document, not the batch
+                    try:
+                        pages_data, worker_metrics = future.result()
+                    except Exception as e:
+                        self.metrics.incr("extract_failures")
+                        print(f"Error extracting {path}: {e}")
+                        continue
+                    self.metrics.merge(worker_metrics)
+                    extracted.append(pages_data)
+                    outputs.append(output_pdf)
+        # Documents that failed to extract are neither deduplicated nor rendered
+        self.outputs = outputs
+
+        union = set()
+        per_document = 0
+        for pages_data in extracted:
+            sorted_texts, normalizer = collect_segments(pages_data, self.metrics, layout=self.layout)
+            self.documents.append((pages_data, normalizer))
+            per_document += len(sorted_texts)
+            union.update(sorted_texts)
+        self.metrics.incr("documents", len(self.inputs))
+        self.metrics.incr("cross_document_hits", per_document - len(union))
+        print(f"{per_document} segments across documents, {len(union)} unique in the batch.")
+        return sorted(union)
+
+    def translate(self, sorted_texts: List[str]) -> Dict[str, str]:
+        try:
+            from .routing import RoutingPolicy
+            from .translator import Translator
+        except ImportError:
+            from routing import RoutingPolicy
+            from translator import Translator
+
+        translator = Translator(metrics=self.metrics, hedge=self.hedge, routing=RoutingPolicy.from_spec(self.models))
+        return translate_segments(translator, sorted_texts, self.metrics)
+
+    def render(self, translation_map: Dict[str, str]):
+        from concurrent.futures import ProcessPoolExecutor
+
+        if not self.documents:
+            print("No documents to render.")
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        print(f"Rendering {len(self.documents)} documents into {self.output_dir}...")
+        with self.metrics.span("render_batch"), ProcessPoolExecutor(max_workers=min(self.jobs, len(self.documents))) as pool:
+            futures = []
+            for output_pdf, (pages_data, normalizer) in zip(self.outputs, self.documents):
+                # Each worker only receives the entries its own document needs
+                document_map = {}
+                for page in pages_data:
+                    for block in page["blocks"]:
+                        segment = block.get("segment")
+                        if segment in translation_map:
+                            document_map[segment] = translation_map[segment]
+                apply_translations(pages_data, document_map, normalizer)
+                futures.append(pool.submit(_render_document, output_pdf, pages_data, document_map,
+                                           self.image_dpi, self.optimize))
+            for output_pdf, future in zip(self.outputs, futures):
+                try:
+                    self.metrics.merge(future.result())
+                    print(f"  wrote {output_pdf}")
+                except Exception as e:
+                    self.metrics.incr("render_failures")
+                    print(f"Error rendering {output_pdf}: {e}")
+
+    def run(self):
+        sorted_texts = self.extract()
+        translation_map = self.translate(sorted_texts)
+        self.render(translation_map)
+        print("Done!")
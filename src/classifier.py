@@ -0,0 +1,167 @@
+import re
+from typing import Optional
+
+# Whole-segment patterns: the segment is skipped only if it consists entirely of these.
+URL_RE = re.compile(r"(?:https?://|ftp://|www\.)\S+", re.IGNORECASE)
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+DOI_RE = re.compile(r"(?:doi:\s*|https?://(?:dx\.)?doi\.org/)?10\.\d{4,9}/\S+", re.IGNORECASE)
+SEPARATORS_RE = re.compile(r"[\s,;|<>()\[\]]+")
+
+# Numbers with units, including ranges and compound units: "10 mm", "3.5-4 kg", "25 °C", "9.8 m/s²", "40%"
+UNIT_RE = re.compile(
+    r"^[-+±~≈<>≤≥]?\s*\d+(?:[.,]\d+)*(?:\s*(?:-|–|to|±)\s*\d+(?:[.,]\d+)*)?\s*"
+    r"(?:%|‰|°\s*[CF]?|K|[kMGTmµμn]?(?:m|g|s|Hz|W|V|A|J|N|Pa|B|bps|L|l|Ω|mol|eV|Wh)|"
+    r"mm|cm|km|kg|mg|ms|min|h|hr|hrs|sec|in|ft|lb|lbs|oz|px|pt|dpi|rpm|x|×)"
+    r"(?:\s*/\s*[a-zA-Zµμ°]+)?[²³\d]?$"
+)
+
+# A bibliography entry: a citation marker or "Surname, I." start, plus a year and a bibliographic cue.
+REFERENCE_START_RE = re.compile(r"^\s*(?:\[\d+\]|\d+\.\s+[A-Z][\w'-]+,\s+[A-Z]\.|[A-Z][\w'-]+,\s+[A-Z]\.(?:\s*[A-Z]\.)*,)")
+REFERENCE_CUE_RE = re.compile(r"\bet al\.|\bpp\.\s*\d|\bvol\.\s*\d|\bIn:|\bProc\.|\bJ\.\s|\bJournal\b|\barXiv\b|\bdoi\b|\bISBN\b|\bpress\b", re.IGNORECASE)
+YEAR_RE = re.compile(r"\b(?:19|20)\d{2}[a-z]?\b")
+
+# Source code. Lines that can only be code: definitions, imports, preprocessor and SQL statements, comments, closing braces.
+CODE_START_RE = re.compile(
+    r"^\s*(?:def \w+\s*\(|class \w+\s*[:({]|import [\w.]+(?: as \w+)?\s*;?\s*$|from [\w.]+ import |#include\b|#define\b|"
+    r"function\s*\w*\s*\(|SELECT .+ FROM |INSERT INTO |CREATE TABLE |//|/\*|\})"
+)
+# Keywords that also start English sentences ("public ...", "return ..."): code only with a statement on the line
+CODE_KEYWORD_RE = re.compile(
+    r"^\s*(?:public |private |protected |static |const |let |var |return\b|if\s*\(|for\s*\(|while\s*\(|switch\s*\()"
+)
+# A call written without a space ("foo(", "obj.bar("), an assignment, comparison or arrow
+CODE_STATEMENT_RE = re.compile(r"(?<![\w.])[A-Za-z_][\w.]*\(|[\w\])]\s*(?:[-+*/%|&^]?=(?!=)|==|!=|->|=>|::)\s*\S")
+# Statement terminators; prose ends clauses with ";" too, so they only count next to a statement
+CODE_END_RE = re.compile(r"[;{]\s*$")
+CODE_SYMBOLS = set("{}[]();=<>_\\|&*$#@~^`")
+IDENTIFIER_RE = re.compile(r"\b[a-z]+[A-Z]\w*\b|\b\w+_\w+\b|\b\w+\(\)|\w+\.\w+\(")
+
+# Characters that only show up in formulas
+MATH_CHARS = set("=+−×÷±∓√∑∏∫∂∇∞≈≠≤≥≡∝∈∉⊂⊆∪∩∀∃→←⇒⇔^_·′″")
+MATH_FUNCTIONS = {"sin", "cos", "tan", "log", "ln", "exp", "lim", "max", "min", "det", "mod", "sup", "inf", "arg"}
+
+# Common Hinglish function words vs. common English ones, for text that is already Romanized Hindi.
+HINDI_WORDS = {
+    "hai", "hain", "tha", "thi", "ka", "ki", "ke", "ko", "se", "mein", "aur", "nahi", "nahin",
+    "ye", "yeh", "woh", "wo", "kya", "kyun", "kyunki", "bhi", "par", "liye", "karna", "karte", "karta",
+    "karti", "kiya", "kiye", "jata", "jati", "jaata", "jaati", "hum", "aap", "tum", "gaya", "gayi", "raha",
+    "rahi", "rahe", "sakta", "sakti", "sakte", "apne", "apna", "iske", "uske", "iska", "uska", "kuch", "sab",
+    "bahut", "ab", "jab", "tab", "agar", "lekin", "isliye", "hota", "hoti", "hote", "ho", "karke", "diya",
+    "wala", "wali", "wale", "dwara", "upyog", "prakriya", "banane", "dikhate", "kam",
+}
+ENGLISH_WORDS = {
+    "the", "is", "of", "and", "to", "in", "that", "it", "for", "on", "with", "as", "are", "was", "this",
+    "be", "by", "an", "a", "or", "from", "at", "which", "we", "can", "has", "have", "not", "use", "used",
+}
+WORD_RE = re.compile(r"[A-Za-z]+")
+
+
+class SkipClassifier:
+    """
+    Fast local check for segments that should never be sent to the model:
+    URLs, emails, DOIs, code, equations, reference-list entries, numbers with units,
+    and text that is already Hindi (Devanagari or Romanized).
+
+    classify() returns the reason as a short string, or None if the segment needs translating.
+    Everything is compiled regexes and a single character-class pass, so it costs
+    microseconds per segment compared to a network round trip.
+    """
+
+    def classify(self, text: str) -> Optional[str]:
+        stripped = text.strip() if text else ""
+        if not stripped:
+            return "empty"
+        if len(stripped) < 3 and not stripped.isalpha():
+            return "short"
+        try:
+            float(stripped.replace(",", ""))
+            return "numeric"
+        except ValueError:
+            pass
+
+        letters = devanagari = code_symbols = math_symbols = 0
+        for char in stripped:
+            if char.isalpha():
+                letters += 1
+                if 0x0900 <= ord(char) <= 0x0D7F:
+                    devanagari += 1
+            if char in CODE_SYMBOLS:
+                code_symbols += 1
+            if char in MATH_CHARS or 0x0370 <= ord(char) <= 0x03FF or 0x2200 <= ord(char) <= 0x22FF:
+                math_symbols += 1
+
+        if letters == 0:
+            return "no_letters"
+        if devanagari > letters / 2:
+            return "hindi"
+        if self._only(stripped, URL_RE, EMAIL_RE, DOI_RE):
+            return "link"
+        if UNIT_RE.match(stripped):
+            return "units"
+        if self._is_reference(stripped):
+            return "reference"
+        if self._is_code(stripped, code_symbols):
+            return "code"
+        if self._is_equation(stripped, math_symbols):
+            return "equation"
+        if self._is_romanized_hindi(stripped):
+            return "romanized_hindi"
+        return None
+
+    def _only(self, text: str, *patterns) -> bool:
+        """True if text is nothing but matches of patterns plus separators."""
+        remainder = text
+        for pattern in patterns:
+            remainder = pattern.sub(" ", remainder)
+        return not SEPARATORS_RE.sub("", remainder).strip(".:")
+
+    def _is_reference(self, text: str) -> bool:
+        return bool(REFERENCE_START_RE.match(text) and YEAR_RE.search(text) and REFERENCE_CUE_RE.search(text))
+
+    def _is_code(self, text: str, code_symbols: int) -> bool:
+        """
+        Brackets and a trailing semicolon alone are not code; prose has them too:
+
+        >>> SkipClassifier().classify("(i) the pressure (in bar) must remain stable;") is None
+        True
+        >>> SkipClassifier().classify("Results (Table 2) show a clear improvement in accuracy;") is None
+        True
+        >>> SkipClassifier().classify("Ensure the device is powered off [see Fig. 3];") is None
+        True
+        >>> SkipClassifier().classify("count = items.size();")
+        'code'
+        >>> SkipClassifier().classify("def main(args):\\n    return run(args)")
+        'code'
+        """
+        lines = [line for line in text.splitlines() if line.strip()]
+        code_lines = sum(1 for line in lines if self._is_code_line(line))
+        if lines and code_lines / len(lines) >= 0.5 and code_symbols >= 2:
+            return True
+        # Single-line snippets like "x = foo_bar(y)" or "obj.method()"
+        words = text.split()
+        identifiers = len(IDENTIFIER_RE.findall(text))
+        return code_symbols / len(text) > 0.12 and identifiers >= max(1, len(words) // 3)
+
+    def _is_code_line(self, line: str) -> bool:
+        if CODE_START_RE.match(line):
+            return True
+        statement = CODE_STATEMENT_RE.search(line)
+        if CODE_KEYWORD_RE.match(line):
+            return bool(statement or CODE_END_RE.search(line))
+        return bool(statement and CODE_END_RE.search(line))
+
+    def _is_equation(self, text: str, math_symbols: int) -> bool:
+        if math_symbols == 0:
+            return False
+        # Formulas have at most one real word; the rest are single-letter variables or functions
+        prose_words = [word for word in WORD_RE.findall(text)
+                       if len(word) > 2 and word.lower() not in MATH_FUNCTIONS]
+        return len(prose_words) <= 1
+
+    def _is_romanized_hindi(self, text: str) -> bool:
+        words = [word.lower() for word in WORD_RE.findall(text)]
+        if len(words) < 4:
+            return False
+        hindi = sum(1 for word in words if word in HINDI_WORDS)
+        english = sum(1 for word in words if word in ENGLISH_WORDS and word not in HINDI_WORDS)
+        return hindi / len(words) >= 0.3 and hindi > 2 * english
@@ -0,0 +1,159 @@
+import math
+import os
+from typing import Any, Dict, List, Optional
+
+try:
+    from .classifier import SkipClassifier
+    from .scheduler import AdaptiveBatcher, estimate_tokens
+    from .prompts import LATEX_INSTRUCTION, PROMPT_VERSION, TEXT_INSTRUCTION, latex_payload, packed_payload, text_payload
+except ImportError:
+    from classifier import SkipClassifier
+    from scheduler import AdaptiveBatcher, estimate_tokens
+    from prompts import LATEX_INSTRUCTION, PROMPT_VERSION, TEXT_INSTRUCTION, latex_payload, packed_payload, text_payload
+
+# Gemini bills an image as 258 tokens per 768x768 tile
+IMAGE_TILE_PX = 768
+IMAGE_TILE_TOKENS = 258
+
+
+class QuotaConfig:
+    """
+    Rate limits and typical latencies used to project wall-clock time.
+    Defaults are the Gemini 2.0 Flash free tier; override with --rpm/--tpm or the
+    GEMINI_RPM / GEMINI_TPM environment variables for paid quotas.
+    """
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None, concurrency: int = 1,
+                 text_latency: float = 2.5, vision_latency: float = 12.0, ocr_seconds_per_image: float = 1.5):
+        self.rpm = rpm or float(os.environ.get("GEMINI_RPM", 15))
+        self.tpm = tpm or float(os.environ.get("GEMINI_TPM", 1_000_000))
+        self.concurrency = concurrency
+        self.text_latency = text_latency
+        self.vision_latency = vision_latency
+        self.ocr_seconds_per_image = ocr_seconds_per_image
+
+
+class CostEstimator:
+    """
+    Projects requests, tokens and wall-clock time for a job without calling the model.
+    Everything it needs (segments, page counts, page sizes) comes from local extraction.
+    """
+
+    def __init__(self, quota: Optional[QuotaConfig] = None):
+        self.quota = quota or QuotaConfig()
+        self.classifier = SkipClassifier()
+
+    def estimate_text_job(self, segments: List[str], ocr_images: int = 0,
+                          pages: int = 0, pages_without_text: int = 0) -> Dict[str, Any]:
+        """Estimate for the block pipeline (main.py): packed text requests plus local OCR."""
+        pending = [text for text in segments if not self.classifier.classify(text)]
+        requests = 0
+        input_tokens = 0
+        output_tokens = 0
+        instruction_tokens = estimate_tokens(TEXT_INSTRUCTION)
+        # Pack with the starting budget; the live batcher usually grows it, so this errs high
+        for batch in AdaptiveBatcher().batches(pending):
+            requests += 1
+            payload = text_payload(batch[0]) if len(batch) == 1 else packed_payload(batch)
+            # The system instruction is billed with every request (at the cached rate when the backend reuses it)
+            input_tokens += instruction_tokens + estimate_tokens(payload)
+            # Romanized Hindi runs ~20% longer than the English source
+            output_tokens += int(sum(estimate_tokens(text) for text in batch) * 1.2) + 2 * len(batch)
+
+        estimate = {
+            "engine": "block",
+            "pages": pages,
+            "unique_segments": len(segments),
+            "segments_to_translate": len(pending),
+            "segments_skipped_locally": len(segments) - len(pending),
+            "requests": requests,
+            "input_tokens": input_tokens,
+            "instruction_tokens": instruction_tokens * requests,
+            "output_tokens": output_tokens,
+            "prompt_version": PROMPT_VERSION,
+            "vision_pages": 0,
+            "pages_without_text_layer": pages_without_text,
+            "ocr_images": ocr_images,
+        }
+        estimate.update(self._project(requests, input_tokens, self.quota.text_latency,
+                                      ocr_images * self.quota.ocr_seconds_per_image))
+        return estimate
+
+    def estimate_vision_job(self, page_stats: List[Dict[str, Any]], dpi: int = 200) -> Dict[str, Any]:
+        """
+        Estimate for the LaTeX vision pipeline: one request per page image.
+        page_stats items need width/height (points), text (text layer) and images (count).
+        """
+        instruction_tokens = estimate_tokens(LATEX_INSTRUCTION)
+        input_tokens = 0
+        output_tokens = 0
+        embedded_images = 0
+        for stats in page_stats:
+            image_names = [f"images/page_{stats['page']}_img_{i + 1}.png" for i in range(stats["images"])]
+            embedded_images += stats["images"]
+            width_px = stats["width"] / 72 * dpi
+            height_px = stats["height"] / 72 * dpi
+            tiles = math.ceil(width_px / IMAGE_TILE_PX) * math.ceil(height_px / IMAGE_TILE_PX)
+            input_tokens += instruction_tokens + estimate_tokens(latex_payload(image_names)) + tiles * IMAGE_TILE_TOKENS
+            # LaTeX markup adds roughly 40% over the translated text; scanned pages have no text layer,
+            # so assume a typical page of prose for them
+            text_tokens = estimate_tokens(stats["text"]) or 500
+            output_tokens += int(text_tokens * 1.2 * 1.4)
+
+        requests = len(page_stats)
+        estimate = {
+            "engine": "latex",
+            "pages": len(page_stats),
+            "requests": requests,
+            "input_tokens": input_tokens,
+            "instruction_tokens": instruction_tokens * requests,
+            "output_tokens": output_tokens,
+            "prompt_version": PROMPT_VERSION,
+            "vision_pages": len(page_stats),
+            "embedded_images": embedded_images,
+            "ocr_images": 0,
+        }
+        estimate.update(self._project(requests, input_tokens, self.quota.vision_latency, 0))
+        return estimate
+
+    def _project(self, requests: int, input_tokens: int, latency: float, local_seconds: float) -> Dict[str, Any]:
+        """Wall-clock projection: the slowest of request quota, token quota and request latency."""
+        quota = self.quota
+        by_requests = requests / quota.rpm
+        by_tokens = input_tokens / quota.tpm
+        by_latency = requests * latency / 60 / max(1, quota.concurrency)
+        limits = {"request quota": by_requests, "token quota": by_tokens, "request latency": by_latency}
+        bottleneck = max(limits, key=limits.get)
+        return {
+            "rpm": quota.rpm,
+            "tpm": quota.tpm,
+            "bottleneck": bottleneck,
+            "local_minutes": round(local_seconds / 60, 2),
+            "projected_minutes": round(limits[bottleneck] + local_seconds / 60, 2),
+        }
+
+
+def format_estimate(estimate: Dict[str, Any]) -> str:
+    """Human-readable dry-run report."""
+    lines = [f"Dry run ({estimate['engine']} pipeline), no model calls were made:"]
+    labels = [
+        ("pages", "Pages"),
+        ("unique_segments", "Unique segments"),
+        ("segments_skipped_locally", "Skipped locally (no model needed)"),
+        ("segments_to_translate", "Segments to translate"),
+        ("vision_pages", "Pages needing vision calls"),
+        ("pages_without_text_layer", "Pages without a text layer"),
+        ("embedded_images", "Embedded images to extract"),
+        ("ocr_images", "Images to OCR"),
+        ("requests", "Model requests"),
+        ("input_tokens", "Input tokens (est.)"),
+        ("instruction_tokens", "  of which shared instructions"),
+        ("output_tokens", "Output tokens (est.)"),
+    ]
+    for key, label in labels:
+        if key in estimate:
+            lines.append(f"  {label:<36} {estimate[key]:>10,}")
+    lines.append(f"  {'Quota':<36} {estimate['rpm']:>g} req/min, {estimate['tpm']:,.0f} tokens/min")
+    lines.append(f"  {'Projected wall-clock':<36} {estimate['projected_minutes']:>10.1f} min "
+                 f"(bound by {estimate['bottleneck']}, local work {estimate['local_minutes']:.1f} min)")
+    return "\n".join(lines)
@@ -1,40 +1,75 @@
 import fitz  # PyMuPDF
-from typing import List, Dict, Any, Optional
+from collections import defaultdict
+from typing import List, Dict, Any, Iterable, Optional
 try:
-    from .ocr import OCRProcessor
+    from .metrics import Metrics
+    from .scan import is_scanned
 except ImportError:
-    # Fallback for when running as script
-    from ocr import OCRProcessor
+    from metrics import Metrics
+    from scan import is_scanned
 
 class PDFExtractor:
-    def __init__(self, pdf_path: str, use_ocr: bool = True):
+    def __init__(self, pdf_path, use_ocr: bool = True, metrics: Optional[Metrics] = None,
+                 scan_dpi: Optional[int] = None):
         self.pdf_path = pdf_path
-        self.doc = fitz.open(pdf_path)
-        self.ocr_processor = OCRProcessor() if use_ocr else None
+        self.metrics = metrics or Metrics()
+        # A path, or the PDF itself as bytes (the API server never writes uploads to disk)
+        if isinstance(pdf_path, (bytes, bytearray)):
+            self.doc = fitz.open(stream=pdf_path, filetype="pdf")
+        else:
+            self.doc = fitz.open(pdf_path)
+        self.images = ImageLoader(self.doc)
+        self.ocr_processor = None
+        self.scanner = None
+        if use_ocr:
+            # Imported lazily so --no-ocr runs never load pytesseract/PIL
+            try:
+                from .ocr import OCRProcessor
+                from .scan import PageScanner
+            except ImportError:
+                # Fallback for when running as script
+                from ocr import OCRProcessor
+                from scan import PageScanner
+            self.ocr_processor = OCRProcessor()
+            # Scanned pages are OCRed as whole pages into text blocks (see scan.py)
+            self.scanner = PageScanner(dpi=scan_dpi, metrics=self.metrics)
 
-    def extract_text_content(self, max_pages: Optional[int] = None) -> List[Dict[str, Any]]:
+    def extract_text_content(self, max_pages: Optional[int] = None,
+                             page_numbers: Optional[Iterable[int]] = None, into=None) -> List[Dict[str, Any]]:
         """
         Extracts content from the PDF page by page.
         Returns a list of dictionaries containing page number and elements.
+        page_numbers (0-based) restricts extraction to those pages, e.g. one shard of a job.
+        into collects the pages instead of a new list, e.g. a memory.PageStore that may
+        move them to disk; pages are only added once they are complete.
         """
-        extracted_data = []
+        extracted_data = into if into is not None else []
         
         total_pages = len(self.doc)
         if max_pages:
             total_pages = min(total_pages, max_pages)
+        if page_numbers is None:
+            page_numbers = range(total_pages)
 
-        for page_num in range(total_pages):
+        scanned = []
+        for page_num in page_numbers:
+            if page_num >= total_pages:
+                continue
+            self.metrics.incr("pages")
             page = self.doc.load_page(page_num)
             page_data = {
                 "page": page_num + 1,
                 "blocks": [],
                 "images": [],
                 "page_width": page.rect.width,
-                "page_height": page.rect.height
+                "page_height": page.rect.height,
+                # Where image bytes are read from later (a path, or the bytes the document was opened from)
+                "source": self.pdf_path,
             }
 
-            # Extract text blocks
-            blocks = page.get_text("dict")["blocks"]
+            # Text only: with the default flags PyMuPDF would decode every image on the page
+            # into the result, whether or not anything ever looks at it
+            blocks = page.get_text("dict", flags=fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES)["blocks"]
             for block in blocks:
                 if block["type"] == 0:  # Text block
                     text_block = {
@@ -59,24 +94,130 @@ class PDFExtractor:
                             line_data["spans"].append(span_data)
                         text_block["lines"].append(line_data)
                     page_data["blocks"].append(text_block)
+                    self.metrics.incr("blocks")
 
-                elif block["type"] == 1:  # Image block
-                    image_block = {
-                        "bbox": block["bbox"],
-                        "image": block.get("image", None), # binary data
-                        "ext": block.get("ext", "png"),
-                        "ocr_text": ""
-                    }
-                    
-                    # If we have OCR capability and image data, try to extract text
-                    if self.ocr_processor and image_block["image"]:
-                         image_block["ocr_text"] = self.ocr_processor.extract_text_from_image(image_block["image"])
-                    
-                    page_data["images"].append(image_block)
+            # Images are recorded by reference; ImageLoader fetches the bytes when a consumer needs them
+            with self.metrics.span("image_refs"):
+                page_data["images"] = self._image_refs(page)
+            self.metrics.incr("images", len(page_data["images"]))
 
+            if self.scanner and is_scanned(page_data):
+                scanned.append(len(extracted_data))
+                extracted_data.append(page_data)
+                continue
+            for image_block in page_data["images"]:
+                if self.ocr_processor:
+                    data = self.images.load(page_data, image_block)
+                    if data:
+                        self.metrics.incr("ocr_calls")
+                        with self.metrics.span("ocr"):
+                            image_block["ocr_text"] = self.ocr_processor.extract_text_from_image(data[0])
             extracted_data.append(page_data)
 
+        if scanned:
+            # All scanned pages at once, so tesseract runs on several pages in parallel
+            ocr_blocks = self.scanner.scan(self.doc, [extracted_data[position]["page"] - 1 for position in scanned])
+            for position in scanned:
+                page_data = extracted_data[position]
+                # The OCR text replaces whatever scrap of text layer the page had (a stamp, a page number)
+                page_data["blocks"] = ocr_blocks.get(page_data["page"] - 1, [])
+                page_data["scanned"] = True
+                self.metrics.incr("blocks", len(page_data["blocks"]))
+                extracted_data[position] = page_data
+
         return extracted_data
 
+    def _image_refs(self, page) -> List[Dict[str, Any]]:
+        """
+        One entry per image placement on the page: bbox, transform and pixel size, no pixel data.
+        The xref is filled in when the page's image resources identify it by pixel size;
+        otherwise (inline images, several images of one size) it is 0 and ImageLoader
+        finds the image by its bbox on the page instead.
+        """
+        # get_image_info(xrefs=True) would find every xref, but it does so by
+        # decoding and hashing each image, which is exactly the work we skip here
+        by_size = defaultdict(set)
+        for item in page.get_images(full=True):
+            by_size[(item[2], item[3])].add(item[0])
+        refs = []
+        for info in page.get_image_info():
+            candidates = by_size.get((info["width"], info["height"]), ())
+            refs.append({
+                "bbox": tuple(info["bbox"]),
+                "xref": next(iter(candidates)) if len(candidates) == 1 else 0,
+                "transform": tuple(info["transform"]),
+                "width": info["width"],
+                "height": info["height"],
+                "image": None,
+                "ext": None,
+                "ocr_text": "",
+            })
+        return refs
+
     def close(self):
         self.doc.close()
+
+
+class ImageLoader:
+    """
+    Fetches the bytes of image references recorded by PDFExtractor, on demand.
+    Source documents are opened on first use and kept open until close(), so
+    a renderer in another process only needs the page data, not the images.
+    Pass doc to read from an already open document instead.
+    """
+
+    def __init__(self, doc=None):
+        self.doc = doc
+        self._docs: Dict[Any, Any] = {}
+        self._page_key = None
+        self._page_images: List[Dict[str, Any]] = []
+
+    def load(self, page_data: Optional[Dict[str, Any]], image_block: Dict[str, Any]):
+        """(bytes, ext) of the image, or None when it can't be read."""
+        if image_block.get("image"):
+            return image_block["image"], image_block.get("ext") or "png"
+        doc = self.doc or self._open(page_data.get("source") if page_data else None)
+        if doc is None:
+            return None
+        try:
+            if image_block.get("xref"):
+                base_image = doc.extract_image(image_block["xref"])
+                if base_image and base_image.get("image"):
+                    return base_image["image"], base_image["ext"]
+                return None
+            if page_data is None:
+                return None
+            return self._from_page(doc, page_data["page"] - 1, image_block["bbox"])
+        except Exception as e:
+            print(f"Error reading image on page {page_data['page'] if page_data else '?'}: {e}")
+            return None
+
+    def _from_page(self, doc, page_index: int, bbox):
+        """Image without a known xref: the page's image block at bbox (blocks are cached for the last page)."""
+        key = (id(doc), page_index)
+        if self._page_key != key:
+            blocks = doc[page_index].get_text("dict", flags=fitz.TEXTFLAGS_DICT)["blocks"]
+            self._page_images = [block for block in blocks if block["type"] == 1]
+            self._page_key = key
+        for block in self._page_images:
+            if max(abs(a - b) for a, b in zip(block["bbox"], bbox)) < 0.5:
+                return block["image"], block.get("ext", "png")
+        return None
+
+    def _open(self, source):
+        if source is None:
+            return None
+        # Bytes sources are the same object on every page, so identity is a stable key
+        key = source if isinstance(source, str) else id(source)
+        if key not in self._docs:
+            if isinstance(source, str):
+                self._docs[key] = fitz.open(source)
+            else:
+                self._docs[key] = fitz.open(stream=source, filetype="pdf")
+        return self._docs[key]
+
+    def close(self):
+        for doc in self._docs.values():
+            doc.close()
+        self._docs.clear()
+        self._page_key, self._page_images = None, []
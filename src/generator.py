@@ -3,12 +3,48 @@ from reportlab.lib.pagesizes import letter
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 import io
+import math
 import os
-from PIL import Image
+import shutil
+import tempfile
+from typing import Optional
+try:
+    from .extractor import ImageLoader
+    from .image_embed import downsample, draw_passthrough
+    from .metrics import Metrics
+except ImportError:
+    from extractor import ImageLoader
+    from image_embed import downsample, draw_passthrough
+    from metrics import Metrics
+
+def block_text(block: dict) -> str:
+    """The key a block is looked up by in the translation map (same joining as main.py)."""
+    return " ".join(span["text"] for line in block["lines"] for span in line["spans"]).strip()
+
+def _render_part(output_path: str, pages_data: list, translated_texts: dict,
+                 image_dpi: Optional[float]) -> Metrics:
+    """Worker: renders one contiguous page range to its own PDF."""
+    metrics = Metrics(job=output_path)
+    PDFGenerator(output_path, metrics=metrics, image_dpi=image_dpi).generate(pages_data, translated_texts)
+    # The parent times the whole render and counts the bytes of the merged file
+    metrics.spans["render_part"] = metrics.spans.pop("render")
+    metrics.counters.pop("bytes_written", None)
+    return metrics
 
 class PDFGenerator:
-    def __init__(self, output_path: str):
+    def __init__(self, output_path: str, metrics: Optional[Metrics] = None, image_dpi: Optional[float] = None,
+                 optimize: bool = False, jobs: int = 1, min_pages_per_part: int = 10):
         self.output_path = output_path
+        self.metrics = metrics or Metrics()
+        # When set, images shown at well above this resolution are downsampled to it
+        self.image_dpi = image_dpi
+        # Run the optimize.py size pass over the finished file
+        self.optimize = optimize
+        # jobs > 1 renders page ranges in a process pool and merges them in order
+        self.jobs = jobs
+        self.min_pages_per_part = min_pages_per_part
+        # Image bytes are read from the source PDF as each image is drawn (see PDFExtractor)
+        self.images = ImageLoader()
         
         # Ensure output directory exists
         output_dir = os.path.dirname(output_path)
@@ -32,42 +68,101 @@ class PDFGenerator:
         Generates the PDF based on extracted data and translated texts.
         translated_texts: dictionary mapping original text to translated text (or just a list corresponding to blocks)
         """
+        # Pages spilled to disk (memory.PageStore) are drawn one at a time in this process:
+        # handing them to a pool would load them all back into memory at once
+        parts = [pages_data] if getattr(pages_data, "spilled", False) else self._split(pages_data)
+        if len(parts) > 1:
+            self._generate_parallel(parts, translated_texts)
+        else:
+            with self.metrics.span("render"):
+                try:
+                    self._draw_pages(pages_data, translated_texts)
+                finally:
+                    self.images.close()
+                self.c.save()
+        if self.optimize:
+            try:
+                from .optimize import optimize_pdf
+            except ImportError:
+                from optimize import optimize_pdf
+            optimize_pdf(self.output_path, self.metrics)
+        self.metrics.incr("bytes_written", os.path.getsize(self.output_path))
+
+    def _split(self, pages_data: list) -> list:
+        """
+        Contiguous page ranges for the pool: a few per worker so a slow range
+        (image-heavy pages) doesn't leave the other cores idle at the end.
+        """
+        if self.jobs <= 1 or len(pages_data) < 2 * self.min_pages_per_part:
+            return [pages_data]
+        size = max(self.min_pages_per_part, math.ceil(len(pages_data) / (self.jobs * 4)))
+        return [pages_data[i:i + size] for i in range(0, len(pages_data), size)]
+
+    def _generate_parallel(self, parts: list, translated_texts: dict):
+        from concurrent.futures import ProcessPoolExecutor
+        try:
+            from .merge import merge_pdfs
+        except ImportError:
+            from merge import merge_pdfs
+
+        parts_dir = tempfile.mkdtemp(prefix="render-", dir=os.path.dirname(os.path.abspath(self.output_path)))
+        try:
+            with self.metrics.span("render"), ProcessPoolExecutor(max_workers=self.jobs) as pool:
+                futures = []
+                for index, pages in enumerate(parts):
+                    # Each worker only gets the translations its pages use
+                    keys = {block_text(block) for page in pages for block in page["blocks"]}
+                    subset = {key: translated_texts[key] for key in keys if key in translated_texts}
+                    part_path = os.path.join(parts_dir, f"{index:05d}.pdf")
+                    futures.append((part_path, pool.submit(_render_part, part_path, pages, subset, self.image_dpi)))
+                paths = []
+                for part_path, future in futures:
+                    self.metrics.merge(future.result())
+                    paths.append(part_path)
+            self.metrics.incr("render_parts", len(paths))
+            # The merge deduplicates fonts and images the parts embedded separately
+            merge_metrics = Metrics()
+            merge_pdfs(paths, self.output_path, merge_metrics)
+            merge_metrics.counters.pop("bytes_written", None)
+            self.metrics.merge(merge_metrics)
+        finally:
+            shutil.rmtree(parts_dir, ignore_errors=True)
+
+    def _draw_pages(self, pages_data: list, translated_texts: dict):
         for page_data in pages_data:
             # Set page size
             self.c.setPageSize((page_data["page_width"], page_data["page_height"]))
             
             # Draw images first
             for img in page_data["images"]:
-                if img["image"]:
+                loaded = self.images.load(page_data, img)
+                if loaded:
                     try:
-                        image_reader = io.BytesIO(img["image"])
-                        # Convert to PIL Image to get dimensions if needed, or draw directly
-                        # reportlab drawImage requires a file path or an ImageReader object
-                        # We use ImageReader from reportlab.lib.utils? No, canvas.drawImage accepts ImageReader
-                        from reportlab.lib.utils import ImageReader
-                        img_obj = ImageReader(image_reader)
                         x0, y0, x1, y1 = img["bbox"]
                         width = x1 - x0
                         height = y1 - y0
-                        # PDF coordinates are bottom-up, PyMuPDF are top-down?
-                        # PyMuPDF: (x0, y0, x1, y1) where (0,0) is top-left.
-                        # ReportLab: (0,0) is bottom-left.
-                        # We need to invert Y.
-                        
+                        # PyMuPDF: (0,0) is top-left. ReportLab: (0,0) is bottom-left, so invert Y.
                         rl_y = page_data["page_height"] - y1
-                        
-                        self.c.drawImage(img_obj, x0, rl_y, width=width, height=height)
-                        
-                        # If OCR text exists, we might want to overlay it (complex) or just ignore 
-                        # as per current scope we are just placing images back.
-                        # If we translated OCR text, we would need to draw it.
-                        if img.get("ocr_text_translated"):
-                            # Very basic overlay - drawing white rect and text
-                            # self.c.setFillColor("white")
-                            # self.c.rect(x0, rl_y, width, height, fill=1)
-                            # self.c.setFillColor("black")
-                            # self.c.drawString(x0, rl_y + height/2, img["ocr_text_translated"])
-                             pass
+
+                        data, ext = loaded
+                        if self.image_dpi:
+                            with self.metrics.span("downsample"):
+                                smaller = downsample(data, ext, width, height, self.image_dpi)
+                            if smaller:
+                                self.metrics.incr("images_downsampled")
+                                self.metrics.incr("image_bytes_saved", len(data) - len(smaller[0]))
+                                data, ext = smaller
+
+                        # Compressed streams (JPEG, JPEG 2000, plain PNG) are embedded as-is;
+                        # anything else goes through ImageReader, which decodes and re-encodes it
+                        if draw_passthrough(self.c, data, ext, x0, rl_y, width, height):
+                            self.metrics.incr("images_passthrough")
+                        else:
+                            from reportlab.lib.utils import ImageReader
+                            self.c.drawImage(ImageReader(io.BytesIO(data)), x0, rl_y, width=width, height=height, mask="auto")
+                            self.metrics.incr("images_reencoded")
+
+                        # OCR text of images is not overlaid; scanned pages get theirs as text blocks (scan.py).
 
                     except Exception as e:
                         print(f"Error drawing image: {e}")
@@ -96,7 +191,11 @@ class PDFGenerator:
                 if not original_text:
                     continue
                     
-                text_to_draw = translated_texts.get(original_text, original_text)
+                if "translated_text" in block:
+                    # This box's share of a paragraph translated as a whole (layout.py)
+                    text_to_draw = block["translated_text"]
+                else:
+                    text_to_draw = translated_texts.get(original_text, original_text)
                 
                 if not first_span:
                     continue
@@ -160,8 +259,7 @@ class PDFGenerator:
                     cursor_y -= leading
 
             self.c.showPage()
-        
-        self.c.save()
+            self.metrics.incr("pages_rendered")
 
     def _int_to_rgb(self, color_int):
         """
@@ -0,0 +1,229 @@
+import io
+import struct
+from typing import Optional, Tuple
+
+from reportlab.pdfbase import pdfdoc
+from reportlab.pdfbase.pdfdoc import PDFArray, PDFDictionary, PDFName, PDFStream
+
+# Image formats PDF can carry without re-encoding, by the "ext" PyMuPDF reports
+JPEG_EXTS = {"jpeg", "jpg"}
+JPX_EXTS = {"jpx", "jp2", "j2k"}
+PNG_EXTS = {"png"}
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_PNG_COLORS = {0: 1, 2: 3}  # grey, RGB; palette (3) handled separately, alpha types (4, 6) are not pass-through
+
+
+class PassthroughImage(pdfdoc.PDFImageXObject):
+    """
+    Image XObject whose stream is an already-compressed image, written to the PDF
+    byte for byte: JPEG as DCTDecode, JPEG 2000 as JPXDecode, and the IDAT data of
+    a PNG as FlateDecode with PNG predictors. Nothing is decoded, so there is no
+    per-pixel work and no generation loss.
+
+    Use probe() to build one; it returns None for anything that needs a decode
+    (alpha or tRNS transparency, interlaced PNGs, unknown formats).
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.decode_parms = None
+        self.palette = None
+
+    @classmethod
+    def probe(cls, name: str, data: bytes, ext: str) -> Optional["PassthroughImage"]:
+        ext = (ext or "").lower()
+        try:
+            if ext in JPEG_EXTS:
+                return cls._from_jpeg(name, data)
+            if ext in JPX_EXTS:
+                return cls._from_jpx(name, data)
+            if ext in PNG_EXTS:
+                return cls._from_png(name, data)
+        except (struct.error, ValueError, IndexError, pdfdoc.PDFError):
+            return None
+        return None
+
+    @classmethod
+    def _from_jpeg(cls, name, data):
+        from reportlab.pdfbase.pdfutils import readJPEGInfo
+
+        width, height, components, _ = readJPEGInfo(io.BytesIO(data))
+        image = cls(name)
+        image.width, image.height = width, height
+        image.bitsPerComponent = 8
+        image.colorSpace = {1: "DeviceGray", 3: "DeviceRGB", 4: "DeviceCMYK"}.get(components)
+        if image.colorSpace is None:
+            return None
+        if components == 4 and b"Adobe" in data[:4096]:
+            # Adobe CMYK JPEGs are stored inverted
+            image._decode = [1, 0, 1, 0, 1, 0, 1, 0]
+        image.streamContent = data
+        image._filters = ("DCTDecode",)
+        return image
+
+    @classmethod
+    def _from_jpx(cls, name, data):
+        # Width/height live in the 'ihdr' box of a JP2 file or the SIZ marker of a bare codestream
+        index = data.find(b"ihdr")
+        if index >= 0:
+            height, width = struct.unpack(">II", data[index + 4:index + 12])
+        elif data[:4] == b"\xff\x4f\xff\x51":
+            width, height, x_offset, y_offset = struct.unpack(">IIII", data[8:24])
+            width, height = width - x_offset, height - y_offset
+        else:
+            return None
+        image = cls(name)
+        image.width, image.height = width, height
+        # The codestream carries its own colour space and bit depth
+        image.colorSpace = None
+        image.bitsPerComponent = None
+        image.streamContent = data
+        image._filters = ("JPXDecode",)
+        return image
+
+    @classmethod
+    def _from_png(cls, name, data):
+        if not data.startswith(_PNG_SIGNATURE):
+            return None
+        position = len(_PNG_SIGNATURE)
+        header = None
+        palette = None
+        idat = []
+        while position + 8 <= len(data):
+            length, kind = struct.unpack(">I4s", data[position:position + 8])
+            chunk = data[position + 8:position + 8 + length]
+            position += 12 + length
+            if kind == b"IHDR":
+                header = struct.unpack(">IIBBBBB", chunk)
+            elif kind == b"PLTE":
+                palette = chunk
+            elif kind == b"tRNS":
+                return None  # transparency needs an SMask, i.e. a decode
+            elif kind == b"IDAT":
+                idat.append(chunk)
+            elif kind == b"IEND":
+                break
+        if header is None or not idat:
+            return None
+        width, height, bit_depth, color_type, _, _, interlace = header
+        if interlace:
+            return None
+
+        image = cls(name)
+        image.width, image.height = width, height
+        image.bitsPerComponent = bit_depth
+        if color_type == 3 and palette:
+            colors = 1
+            image.colorSpace = "DeviceRGB"
+            image.palette = palette
+        elif color_type in _PNG_COLORS and bit_depth in (1, 2, 4, 8, 16):
+            colors = _PNG_COLORS[color_type]
+            image.colorSpace = "DeviceGray" if colors == 1 else "DeviceRGB"
+        else:
+            return None
+        image.decode_parms = {"Predictor": 15, "Colors": colors, "BitsPerComponent": bit_depth, "Columns": width}
+        image.streamContent = b"".join(idat)
+        image._filters = ("FlateDecode",)
+        return image
+
+    def format(self, document):
+        stream = PDFStream(content=self.streamContent)
+        entries = stream.dictionary
+        entries["Type"] = PDFName("XObject")
+        entries["Subtype"] = PDFName("Image")
+        entries["Width"] = self.width
+        entries["Height"] = self.height
+        if self.bitsPerComponent:
+            entries["BitsPerComponent"] = self.bitsPerComponent
+        if self.palette:
+            entries["ColorSpace"] = PDFArray([PDFName("Indexed"), PDFName(self.colorSpace),
+                                              len(self.palette) // 3 - 1, _HexString(self.palette)])
+        elif self.colorSpace:
+            entries["ColorSpace"] = PDFName(self.colorSpace)
+        if getattr(self, "_decode", None):
+            entries["Decode"] = PDFArray(self._decode)
+        # Setting Filter stops PDFStream from re-encoding (ASCII85 would add 25%)
+        entries["Filter"] = PDFArray([PDFName(f) for f in self._filters])
+        if self.decode_parms:
+            # One parameter dictionary per entry of the Filter array
+            entries["DecodeParms"] = PDFArray([PDFDictionary(self.decode_parms)])
+        return stream.format(document)
+
+
+class _HexString(pdfdoc.PDFObject):
+    """Binary string written as <hex>, for the palette of an Indexed colour space."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def format(self, document):
+        return b"<" + self.data.hex().encode("ascii") + b">"
+
+
+def effective_dpi(pixel_width: int, pixel_height: int, box_width: float, box_height: float) -> float:
+    """Resolution an image is shown at on the page, in pixels per inch (the larger axis)."""
+    if box_width <= 0 or box_height <= 0:
+        return 0.0
+    return max(pixel_width / (box_width / 72), pixel_height / (box_height / 72))
+
+
+def downsample(data: bytes, ext: str, box_width: float, box_height: float,
+               target_dpi: float, tolerance: float = 1.5, jpeg_quality: int = 85) -> Optional[Tuple[bytes, str]]:
+    """
+    Re-encodes an image that is oversampled for its on-page box, i.e. shown at more
+    than tolerance * target_dpi. Returns (data, ext) of the smaller image, or None
+    to keep the original. JPEG sources are re-encoded as JPEG; everything else
+    (line art, screenshots, alpha) stays lossless PNG.
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        dpi = effective_dpi(image.width, image.height, box_width, box_height)
+        if dpi <= target_dpi * tolerance:
+            return None
+        scale = target_dpi / dpi
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        lossless = has_alpha or (ext or "").lower() not in JPEG_EXTS
+        if has_alpha:
+            resized = image.convert("RGBA").resize(size, Image.LANCZOS)
+        else:
+            resized = image.convert("L" if image.mode in ("1", "L", "I", "I;16") else "RGB").resize(size, Image.LANCZOS)
+
+    out = io.BytesIO()
+    if lossless:
+        resized.save(out, format="PNG", optimize=True)
+        result = out.getvalue(), "png"
+    else:
+        resized.save(out, format="JPEG", quality=jpeg_quality, optimize=True)
+        result = out.getvalue(), "jpeg"
+    # Never trade a small file for a bigger one
+    return result if len(result[0]) < len(data) else None
+
+
+def draw_passthrough(canvas, data: bytes, ext: str, x: float, y: float, width: float, height: float) -> bool:
+    """
+    Draws data on canvas without decoding it, mirroring what Canvas.drawImage does
+    after it has built its XObject. Identical images (logos, letterheads) are
+    embedded once and referenced from every page. Returns False if the image has
+    to go through ImageReader instead.
+    """
+    name = pdfdoc._digester(data)
+    reg_name = canvas._doc.getXObjectName(name)
+    image = canvas._doc.idToObject.get(reg_name)
+    if image is None:
+        image = PassthroughImage.probe(name, data, ext)
+        if image is None:
+            return False
+        canvas._setXObjects(image)
+        canvas._doc.Reference(image, reg_name)
+        canvas._doc.addForm(name, image)
+
+    canvas.saveState()
+    canvas.translate(x, y)
+    canvas.scale(width, height)
+    canvas._code.append("/%s Do" % reg_name)
+    canvas.restoreState()
+    canvas._formsinuse.append(name)
+    return True
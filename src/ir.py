@@ -0,0 +1,114 @@
+import json
+import os
+import zlib
+from typing import Any, Dict, List, Optional
+
+# Bump when the document layout below changes; older files are rejected, not misread
+IR_VERSION = 1
+MAGIC = b"PHIR"
+# Payload codecs: msgpack when the package is installed, compressed JSON otherwise
+MSGPACK = b"m"
+JSON = b"j"
+
+STAGES = ("extracted", "translated")
+
+
+class IRFormatError(ValueError):
+    """The file is not an intermediate document this version can read."""
+
+
+def new_document(source: str, pages: List[Dict[str, Any]], segments: List[str],
+                 options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    An extracted document: the pages as PDFExtractor and collect_segments left them
+    (blocks with their layout and segment annotations), and the unique segments to
+    translate. Images stay references (xref/bbox) into source, which is recorded
+    with its size and modification time so a later stage can tell it has changed.
+    """
+    source = os.path.abspath(source)
+    stat = os.stat(source)
+    stored = []
+    for page in pages:
+        page = dict(page, source=source)
+        page["images"] = [dict(image, image=None, ext=None) if image.get("xref") or not image.get("image") else image
+                          for image in page["images"]]
+        stored.append(page)
+    return {
+        "version": IR_VERSION,
+        "stage": "extracted",
+        "source": source,
+        "source_size": stat.st_size,
+        "source_mtime": stat.st_mtime,
+        "options": options or {},
+        "pages": stored,
+        "segments": segments,
+        "translations": {},
+        "failures": [],
+    }
+
+
+def source_changed(document: Dict[str, Any]) -> bool:
+    """Whether the source PDF the images refer to is gone or differs from the one extracted."""
+    try:
+        stat = os.stat(document["source"])
+    except OSError:
+        return True
+    return stat.st_size != document["source_size"] or stat.st_mtime != document["source_mtime"]
+
+
+def save(document: Dict[str, Any], path: str):
+    """Writes document to path atomically, so a stage that dies mid-write leaves the previous file."""
+    try:
+        import msgpack
+    except ImportError:
+        msgpack = None
+    if msgpack:
+        header, payload = MSGPACK, msgpack.packb(document, use_bin_type=True)
+    else:
+        header, payload = JSON, zlib.compress(json.dumps(document, ensure_ascii=False, default=_encode_bytes,
+                                                         separators=(",", ":")).encode("utf-8"))
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + bytes([IR_VERSION]) + header)
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise IRFormatError(f"{path} is not an intermediate document")
+    version, codec = data[len(MAGIC)], data[len(MAGIC) + 1:len(MAGIC) + 2]
+    if version != IR_VERSION:
+        raise IRFormatError(f"{path} has format version {version}, this version reads {IR_VERSION}; extract it again")
+    payload = data[len(MAGIC) + 2:]
+    if codec == MSGPACK:
+        try:
+            import msgpack
+        except ImportError:
+            raise IRFormatError(f"{path} was written with msgpack; install it (pip install msgpack) to read it")
+        return msgpack.unpackb(payload, raw=False)
+    if codec == JSON:
+        return json.loads(zlib.decompress(payload).decode("utf-8"), object_hook=_decode_bytes)
+    raise IRFormatError(f"{path} uses an unknown codec {codec!r}")
+
+
+def _encode_bytes(value):
+    # Only inline images without an xref carry bytes; JSON has no binary type
+    if isinstance(value, (bytes, bytearray)):
+        import base64
+
+        return {"$bytes": base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"Object of type {type(value).__name__} can't be stored")
+
+
+def _decode_bytes(obj):
+    if len(obj) == 1 and "$bytes" in obj:
+        import base64
+
+        return base64.b64decode(obj["$bytes"])
+    return obj
@@ -0,0 +1,258 @@
+import json
+import os
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    input_pdf TEXT NOT NULL,
+    output_pdf TEXT NOT NULL,
+    options TEXT NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'running',      -- running, merging, done, failed
+    merge_expires REAL,                          -- lease on the merge step
+    merge_attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS shards (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL REFERENCES jobs(id),
+    shard_index INTEGER NOT NULL,
+    first_page INTEGER NOT NULL,                 -- 0-based, inclusive
+    last_page INTEGER NOT NULL,                  -- 0-based, exclusive
+    status TEXT NOT NULL DEFAULT 'pending',      -- pending, leased, done, failed
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    output_path TEXT,
+    error TEXT,
+    UNIQUE (job_id, shard_index)
+);
+CREATE INDEX IF NOT EXISTS shards_claim ON shards (status, lease_expires);
+"""
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobQueue:
+    """
+    Durable job queue in a single SQLite file, meant to live on a volume every
+    worker machine can reach. No broker: workers claim page shards directly with
+    an atomic UPDATE inside a write transaction.
+
+    A claimed shard carries a lease. Workers extend it with heartbeat() while they
+    work; a shard whose lease runs out (worker crashed, machine lost) is handed to
+    the next claimer. Shards that fail max_attempts times are marked failed, and
+    so is their job; the same goes for a job whose merge fails max_attempts times.
+
+    The file must be on a filesystem with working POSIX locks (local disk, NFSv4,
+    most cluster filesystems); SQLite is not safe over SMB or NFSv3 without lockd.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3):
+        self.path = path
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            # Rollback journal, not WAL: WAL needs shared memory, which network filesystems lack
+            db.executescript(SCHEMA)
+            columns = {row[1] for row in db.execute("PRAGMA table_info(jobs)")}
+            if "merge_attempts" not in columns:
+                # Queue files created before merges were counted
+                db.execute("ALTER TABLE jobs ADD COLUMN merge_attempts INTEGER NOT NULL DEFAULT 0")
+                db.commit()
+        finally:
+            db.close()
+
+    @contextmanager
+    def _transaction(self):
+        # Short-lived connections: nothing is held open between calls, so a worker
+        # that dies mid-job leaves no lock behind, only an expiring lease.
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            db.execute("PRAGMA busy_timeout = 30000")
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+        finally:
+            db.close()
+
+    def submit(self, input_pdf: str, output_pdf: str, page_count: int, shard_pages: int = 10,
+               options: Optional[Dict[str, Any]] = None) -> int:
+        """Queues a document split into shards of shard_pages pages. Returns the job id."""
+        if page_count <= 0:
+            # No shards means nothing to merge: the job could never finish
+            raise ValueError(f"{input_pdf} has no pages to convert")
+        shard_pages = max(1, shard_pages)
+        with self._transaction() as db:
+            cursor = db.execute(
+                "INSERT INTO jobs (input_pdf, output_pdf, options, created_at) VALUES (?, ?, ?, ?)",
+                (os.path.abspath(input_pdf), os.path.abspath(output_pdf), json.dumps(options or {}), time.time()),
+            )
+            job_id = cursor.lastrowid
+            for index, first in enumerate(range(0, page_count, shard_pages)):
+                db.execute(
+                    "INSERT INTO shards (job_id, shard_index, first_page, last_page) VALUES (?, ?, ?, ?)",
+                    (job_id, index, first, min(page_count, first + shard_pages)),
+                )
+        return job_id
+
+    def claim(self, worker: str, lease_seconds: float = 120) -> Optional[Dict[str, Any]]:
+        """
+        Leases the next pending (or abandoned) shard to worker.
+        Returns the shard joined with its job, or None if there is nothing to do.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            self._expire_leases(db, now)
+            row = db.execute(
+                "SELECT shards.id FROM shards JOIN jobs ON jobs.id = shards.job_id "
+                "WHERE shards.status = 'pending' AND jobs.status = 'running' "
+                "ORDER BY shards.job_id, shards.shard_index LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE shards SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE id = ?",
+                (worker, now + lease_seconds, row["id"]),
+            )
+            return self._shard(db, row["id"])
+
+    def heartbeat(self, shard_id: int, worker: str, lease_seconds: float = 120) -> bool:
+        """Extends the lease. False means the lease was lost and the work should be abandoned."""
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE shards SET lease_expires = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+                (time.time() + lease_seconds, shard_id, worker),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, shard_id: int, worker: str, output_path: str) -> bool:
+        """Marks a leased shard done. False if the lease was lost (another worker redoes it)."""
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE shards SET status = 'done', output_path = ?, lease_expires = NULL, error = NULL "
+                "WHERE id = ? AND worker = ? AND status = 'leased'",
+                (output_path, shard_id, worker),
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, shard_id: int, worker: str, error: str):
+        """Returns the shard to the queue, or fails it (and its job) after max_attempts."""
+        with self._transaction() as db:
+            row = db.execute("SELECT job_id, attempts FROM shards WHERE id = ? AND worker = ? AND status = 'leased'",
+                             (shard_id, worker)).fetchone()
+            if row is None:
+                return
+            status = "failed" if row["attempts"] >= self.max_attempts else "pending"
+            db.execute("UPDATE shards SET status = ?, error = ?, worker = NULL, lease_expires = NULL WHERE id = ?",
+                       (status, error[:2000], shard_id))
+            if status == "failed":
+                db.execute("UPDATE jobs SET status = 'failed', finished_at = ? WHERE id = ?", (time.time(), row["job_id"]))
+
+    def claim_merge(self, lease_seconds: float = 600) -> Optional[Dict[str, Any]]:
+        """
+        Claims one job whose shards are all done, for merging. The status flip from
+        'running' to 'merging' is atomic, so exactly one worker merges each job.
+        Returns the job with its shard outputs in page order.
+        """
+        with self._transaction() as db:
+            self._expire_leases(db, time.time())
+            row = db.execute(
+                "SELECT jobs.id FROM jobs WHERE jobs.status = 'running' AND NOT EXISTS "
+                "(SELECT 1 FROM shards WHERE shards.job_id = jobs.id AND shards.status != 'done') "
+                "ORDER BY jobs.id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE jobs SET status = 'merging', merge_expires = ?, merge_attempts = merge_attempts + 1 "
+                       "WHERE id = ?",
+                       (time.time() + lease_seconds, row["id"]))
+            job = dict(db.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+            job["options"] = json.loads(job["options"])
+            job["parts"] = [r["output_path"] for r in db.execute(
+                "SELECT output_path FROM shards WHERE job_id = ? ORDER BY shard_index", (row["id"],))]
+            return job
+
+    def finish_job(self, job_id: int, ok: bool = True):
+        with self._transaction() as db:
+            db.execute("UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?",
+                       ("done" if ok else "failed", time.time(), job_id))
+
+    def requeue_merge(self, job_id: int) -> bool:
+        """
+        Hands a job back for merging after a merge attempt failed, or fails it after
+        max_attempts merges. Returns True if the job was requeued.
+        """
+        with self._transaction() as db:
+            row = db.execute("SELECT merge_attempts FROM jobs WHERE id = ? AND status = 'merging'", (job_id,)).fetchone()
+            if row is None:
+                return False
+            if row["merge_attempts"] >= self.max_attempts:
+                db.execute("UPDATE jobs SET status = 'failed', merge_expires = NULL, finished_at = ? WHERE id = ?",
+                           (time.time(), job_id))
+                return False
+            db.execute("UPDATE jobs SET status = 'running', merge_expires = NULL WHERE id = ?", (job_id,))
+            return True
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Per-job shard counts, for the status command."""
+        with self._transaction() as db:
+            self._expire_leases(db, time.time())
+            rows = db.execute(
+                "SELECT jobs.id, jobs.input_pdf, jobs.output_pdf, jobs.status, "
+                "COUNT(shards.id) AS shards, "
+                "SUM(shards.status = 'done') AS done, "
+                "SUM(shards.status = 'leased') AS leased, "
+                "SUM(shards.status = 'failed') AS failed "
+                "FROM jobs LEFT JOIN shards ON shards.job_id = jobs.id GROUP BY jobs.id ORDER BY jobs.id"
+            ).fetchall()
+            return [dict(row) for row in rows]
+
+    def idle(self) -> bool:
+        """True when no job is waiting for shards or a merge."""
+        with self._transaction() as db:
+            row = db.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('running', 'merging')").fetchone()
+            return row[0] == 0
+
+    def _expire_leases(self, db, now: float):
+        """Re-queues shards whose worker stopped heartbeating."""
+        db.execute(
+            "UPDATE shards SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "worker = NULL, lease_expires = NULL, error = 'lease expired' "
+            "WHERE status = 'leased' AND lease_expires < ?",
+            (self.max_attempts, now),
+        )
+        # A worker that died while merging leaves the job to be merged by someone else
+        db.execute("UPDATE jobs SET status = CASE WHEN merge_attempts >= ? THEN 'failed' ELSE 'running' END, "
+                   "merge_expires = NULL, finished_at = CASE WHEN merge_attempts >= ? THEN ? END "
+                   "WHERE status = 'merging' AND merge_expires < ?", (self.max_attempts, self.max_attempts, now, now))
+        db.execute(
+            "UPDATE jobs SET status = 'failed', finished_at = ? WHERE status = 'running' AND EXISTS "
+            "(SELECT 1 FROM shards WHERE shards.job_id = jobs.id AND shards.status = 'failed')",
+            (now,),
+        )
+
+    def _shard(self, db, shard_id: int) -> Dict[str, Any]:
+        row = db.execute(
+            "SELECT shards.*, jobs.input_pdf, jobs.output_pdf, jobs.options FROM shards "
+            "JOIN jobs ON jobs.id = shards.job_id WHERE shards.id = ?", (shard_id,)
+        ).fetchone()
+        shard = dict(row)
+        shard["options"] = json.loads(shard["options"])
+        return shard
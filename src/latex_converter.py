@@ -1,28 +1,76 @@
 import os
 import argparse
+import json
 import sys
-from pdf2image import convert_from_path
-import google.generativeai as genai
 from dotenv import load_dotenv
+import shutil
 import subprocess
-import fitz  # PyMuPDF
+import tempfile
+from typing import Optional
+try:
+    from .metrics import Metrics
+    from .page_cache import PageCache, fingerprint
+    from .pages import contiguous_runs, page_count, select_pages
+    from .prompts import LATEX_INSTRUCTION, latex_payload
+    from .resilience import ModelCallError
+    from .routing import ModelRouter, RoutingPolicy, token_report
+except ImportError:
+    from metrics import Metrics
+    from page_cache import PageCache, fingerprint
+    from pages import contiguous_runs, page_count, select_pages
+    from prompts import LATEX_INSTRUCTION, latex_payload
+    from resilience import ModelCallError
+    from routing import ModelRouter, RoutingPolicy, token_report
 
 # Load env variables
 load_dotenv()
 
+# Stands in for the page number in image paths of cached LaTeX fragments
+_PAGE_TOKEN = "{page}"
+
 class LatexConverter:
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, metrics: Optional[Metrics] = None, hedge: bool = False,
+                 optimize: bool = False, routing: Optional[RoutingPolicy] = None, budget=None,
+                 page_cache: Optional[PageCache] = None):
+        self.metrics = metrics or Metrics()
+        # LaTeX of pages seen before, in this or any other document (page_cache.py); off unless given
+        self.page_cache = page_cache
+        # Optional memory.MemoryBudget: page images go to disk instead of memory when it runs low
+        self.budget = budget
+        # Run the optimize.py size pass over the compiled PDF (tectonic embeds full fonts)
+        self.optimize = optimize
+        # (page_num, reason) for every page that could not be converted
+        self.failures = []
+        # Pages whose LaTeX only came out by stripping Devanagari; kept out of the page cache
+        self._fallback_pages = set()
         if not api_key:
             api_key = os.environ.get("GOOGLE_API_KEY")
         if not api_key:
             raise ValueError("Google API Key is required.")
             
+        # Deferred: google.generativeai is slow to import and not needed for argument parsing
+        import google.generativeai as genai
         genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
+        # Plain text pages go to the fast tier, scans, figures and math to the standard one;
+        # a page that fails or keeps coming back in Devanagari is retried one tier up
+        self.routing = routing or RoutingPolicy.from_spec()
+        # The conversion rules are the system instruction; each page sends its image and image list
+        self.router = ModelRouter(self.routing, metrics=self.metrics, hedge=hedge, system_instruction=LATEX_INSTRUCTION)
 
     def extract_images_from_page(self, pdf_path, page_num, output_dir):
         """Extracts images from a specific page."""
-        doc = fitz.open(pdf_path)
+        import fitz  # PyMuPDF, deferred to keep CLI startup fast
+
+        def save_image(name, image_bytes):
+            with open(os.path.join(output_dir, name), "wb") as f:
+                f.write(image_bytes)
+            self.metrics.incr("bytes_written", len(image_bytes))
+
+        with fitz.open(pdf_path) as doc:
+            return self._extract_page_images(doc, page_num, save_image)
+
+    def _extract_page_images(self, doc, page_num, store_image):
+        """Hands each embedded image of page page_num to store_image(name, bytes); returns the names."""
         page = doc.load_page(page_num - 1)
         image_list = page.get_images(full=True)
         
@@ -30,13 +78,9 @@ class LatexConverter:
         for img_index, img in enumerate(image_list):
             xref = img[0]
             base_image = doc.extract_image(xref)
-            image_bytes = base_image["image"]
-            image_ext = base_image["ext"]
-            image_name = f"page_{page_num}_img_{img_index+1}.{image_ext}"
-            image_path = os.path.join(output_dir, image_name)
-            
-            with open(image_path, "wb") as f:
-                f.write(image_bytes)
+            image_name = f"page_{page_num}_img_{img_index+1}.{base_image['ext']}"
+            store_image(image_name, base_image["image"])
+            self.metrics.incr("images")
             saved_images.append(image_name)
         return saved_images
 
@@ -55,62 +99,14 @@ class LatexConverter:
                 return True
         return False
 
-    def convert_page_to_latex(self, image, page_num, available_images):
+    def convert_page_to_latex(self, image, page_num, available_images, tier="standard"):
         """
         Sends page image to Gemini and gets LaTeX code with Hinglish translation.
-        Automatically retries if Devanagari script is detected.
+        Automatically retries if Devanagari script is detected, on the next model tier up if there is one.
         """
         print(f"Propcessing page {page_num}...")
         
-        img_list_str = ", ".join(available_images) if available_images else "None"
-        
-        # Create an example string safely
-        example_img = available_images[0] if available_images else "images/placeholder.png"
-
-        prompt = f"""
-        You are an expert Document-to-LaTeX converter and Translator. 
-        
-        Your Goal:
-        1. **Visual to LaTeX**: Convert the visual layout into valid LaTeX.
-           - Use `\\section{{...}}`, `\\subsection{{...}}` for headers.
-           - If you see a **Table of Contents**:
-             - Just write `\\tableofcontents`.
-             - **CRITICAL**: Do NOT manually transcribe the TOC entries as `\\section` commands. The `\\tableofcontents` command will auto-generate it from the rest of the document.
-        
-        2. **Translation (Romanized Hindi - TRANSLITERATED)**: Translate English to Hindi, but write ONLY in Roman/Latin script.
-           - **ABSOLUTELY CRITICAL**: DO NOT use Devanagari script (देवनागरी). Use ONLY a-z characters.
-           - **Example of CORRECT output**: "Hum dikhate hain ki hani kam ho gayi hai."
-           - **Example of WRONG output**: "हम दिखाते हैं कि हानि कम हो गई है।" ← NEVER DO THIS
-           - **Vocabulary**: Use pure Hindi words (not English verbs).
-           - **Grammar Guide**:
-             - English: "This process is used to create mirrors."
-             - WRONG: "Yeh process mirrors create karne ke liye use kiya jata hai." (English verbs)
-             - CORRECT: "Yeh prakriya mirrors banane ke liye upyog ki jaati hai." (Hindi verbs)
-             - English: "We show that the loss is reduced."
-             - WRONG: "Hum show karte hain ki loss reduce ho gaya hai."
-             - CORRECT: "Hum dikhate hain ki hani kam ho gayi hai."
-           - **Exceptions**: Keep technical nouns (Birefringence, Cavity, Laser) in English.
-        
-        3. **Math & Science**:
-           - **CRITICAL**: Transcribe equations EXACTLY as they appear using LaTeX math mode.
-           - Use `\\begin{{equation}} ... \\end{{equation}}` for NUMBERED equations.
-           - Use `$$ ... $$` for unnumbered display math.
-           - **NEVER** use `\\tag` inside `$$ ... $$`.
-        
-        4. **Images**: 
-           - I have extracted the following images from this page: [{img_list_str}].
-           - Use smart sizing to avoid pushing images to next page:
-             * For SMALL images (diagrams, icons): `\\begin{{figure}}[h] \\centering \\includegraphics[width=0.5\\linewidth]{{{example_img}}} \\caption{{Caption}} \\end{{figure}}`
-             * For MEDIUM images (charts, graphs): `\\begin{{figure}}[h] \\centering \\includegraphics[width=0.7\\linewidth]{{{example_img}}} \\caption{{Caption}} \\end{{figure}}`
-             * For LARGE images (full-page plots): `\\begin{{figure}}[h] \\centering \\includegraphics[width=0.85\\linewidth]{{{example_img}}} \\caption{{Caption}} \\end{{figure}}`
-           - **CRITICAL**: Use `[h]` (lowercase h) to allow flexible placement, NOT `[H]`. This prevents blank spaces.
-           - If no extracted image matches the figure, use a placeholder.
-        
-        Strict Rules:
-        - Return ONLY the LaTeX body content.
-        - No markdown formatting.
-        - No chatty intro/outro.
-        """
+        prompt = latex_payload(available_images)
         
         max_retries = 3
         for attempt in range(max_retries):
@@ -118,36 +114,66 @@ class LatexConverter:
                 # Add progressively stronger warnings
                 current_prompt = prompt
                 if attempt > 0:
+                    self.metrics.incr("devanagari_retries")
                     current_prompt += f"\n\n**EMERGENCY OVERRIDE (Attempt {attempt + 1})**: You MUST use ONLY English letters (a-z). NO देवनागरी script allowed!"
                 if attempt == max_retries - 1:
                     current_prompt += "\n\n**FINAL WARNING**: If you CANNOT translate a word to Roman script, just LEAVE IT IN ENGLISH as-is. Do NOT use Devanagari under any circumstances!"
                 
-                response = self.model.generate_content([current_prompt, image])
+                response = self.router.lane(tier).generate([current_prompt, image], "vision.request")
                 content = response.text.replace("```latex", "").replace("```", "").strip()
                 
                 # Check for Devanagari
                 if self.contains_devanagari(content):
+                    self.metrics.incr("devanagari_detections")
                     print(f"⚠️  Warning: Devanagari detected on page {page_num}. Retrying (attempt {attempt + 1}/{max_retries})...")
                     if attempt < max_retries - 1:
+                        tier = self._escalate(tier)
                         continue
                     else:
                         # Final fallback: Strip Devanagari and replace with English placeholder
                         print(f"❌ Failed to get Roman script after {max_retries} attempts.")
                         print(f"🔧 Applying emergency fix: Removing Devanagari characters...")
                         content = self.remove_devanagari_fallback(content)
+                        self._fallback_pages.add(page_num)
                         print(f"✓ Page {page_num} converted with fallback (Devanagari removed)")
                         return content
                 
                 print(f"✓ Page {page_num} converted successfully (Pure Romanized Hindi)")
                 return content
                 
-            except Exception as e:
+            except ModelCallError as e:
+                # Transport errors were already retried with backoff; only a different model gets another go
+                higher = self.routing.escalate(tier)
+                if higher and attempt < max_retries - 1:
+                    print(f"⚠️  Page {page_num} failed on {self.routing.models[tier]}, retrying on {self.routing.models[higher]}: {e}")
+                    tier = self._escalate(tier)
+                    continue
+                print(f"❌ Error converting page {page_num}: {e}")
+                self.metrics.incr("page_failures")
+                self.failures.append((page_num, str(e)))
+                return f"% Error converting page {page_num}: {e}"
+            except ValueError as e:
+                # response.text raises ValueError when the reply was blocked or empty; try again with the stronger prompt
                 print(f"Error converting page {page_num}: {e}")
                 if attempt == max_retries - 1:
+                    self.metrics.incr("page_failures")
+                    self.failures.append((page_num, str(e)))
                     return f"% Error converting page {page_num}: {e}"
+                tier = self._escalate(tier)
         
+        self.metrics.incr("page_failures")
+        self.failures.append((page_num, f"failed after {max_retries} attempts"))
         return f"% Failed to convert page {page_num} after {max_retries} attempts"
     
+    def _escalate(self, tier):
+        """The next tier up for a retry, or tier itself if it is already the top."""
+        higher = self.routing.escalate(tier)
+        if not higher:
+            return tier
+        self.metrics.incr("escalations")
+        self.metrics.incr(f"escalated_to_{higher}")
+        return higher
+
     def remove_devanagari_fallback(self, text):
         """Remove Devanagari characters and replace with descriptive placeholder."""
         result = []
@@ -170,44 +196,205 @@ class LatexConverter:
         
         return ''.join(result)
 
-    def generate_pdf(self, input_pdf, output_pdf, max_pages=None):
+    def generate_pdf(self, input_pdf, output_pdf, max_pages=None, page_numbers=None):
+        """page_numbers: 0-based pages to convert (e.g. from --page-range/--shard); default the first max_pages."""
+        from pdf2image import convert_from_path
+        import fitz  # PyMuPDF, deferred to keep CLI startup fast
+
         print(f"Converting {input_pdf} to images...")
         try:
-            images = convert_from_path(input_pdf)
+            if page_numbers is None:
+                total = page_count(input_pdf)
+                page_numbers = range(min(max_pages or total, total))
+            images = []
+            with self.metrics.span("rasterize"):
+                # Only the selected pages are rendered, one pdftoppm call per contiguous run
+                for first, last in contiguous_runs(list(page_numbers)):
+                    rendered = convert_from_path(input_pdf, first_page=first + 1, last_page=last + 1)
+                    images.extend(zip(range(first + 1, last + 2), rendered))
         except Exception as e:
             print(f"Error reading PDF: {e}")
             return
 
-        if max_pages:
-            images = images[:max_pages]
-
         # Prepare output dir for images
         output_dir = os.path.dirname(output_pdf)
         images_dir = os.path.join(output_dir, "images")
         os.makedirs(images_dir, exist_ok=True)
 
+        def save_image(name, image_bytes):
+            with open(os.path.join(images_dir, name), "wb") as f:
+                f.write(image_bytes)
+            self.metrics.incr("bytes_written", len(image_bytes))
+
+        # One open document for every page's embedded images instead of reopening it per page
+        doc = fitz.open(input_pdf)
+        try:
+            full_latex = self._build_latex(doc, images, save_image)
+        finally:
+            doc.close()
+
+        # Save tex file
+        output_tex = output_pdf.replace(".pdf", ".tex")
+        with open(output_tex, "w") as f:
+            f.write(full_latex)
+        self.metrics.incr("bytes_written", os.path.getsize(output_tex))
+        
+        print(f"LaTeX source saved to {output_tex}")
+        print("Compiling with Tectonic...")
+        
+        # Compile
+        with self.metrics.span("tectonic"):
+            subprocess.run(["tectonic", output_tex], check=True)
+        if os.path.exists(output_pdf):
+            if self.optimize:
+                try:
+                    from .optimize import optimize_pdf
+                except ImportError:
+                    from optimize import optimize_pdf
+                optimize_pdf(output_pdf, self.metrics)
+            self.metrics.incr("bytes_written", os.path.getsize(output_pdf))
+        
+        report = token_report(self.metrics)
+        if report:
+            print(report)
+        if self.failures:
+            print(f"⚠️  {len(self.failures)} page(s) could not be converted: {', '.join(str(page) for page, _ in self.failures)}")
+        print(f"Done! Output saved to {output_pdf}")
+
+    def generate_pdf_bytes(self, pdf_bytes, max_pages=None, dpi=200, page_numbers=None):
+        r"""
+        In-memory variant of generate_pdf for the API server: takes the uploaded PDF
+        as bytes and returns the translated PDF as bytes, or None if the input can't be read.
+        The document is opened once from the buffer and pages are rasterized one at a
+        time as they are converted; embedded images stay in memory. Only the LaTeX
+        compile touches disk, because tectonic reads the source and \includegraphics
+        files from a directory.
+        """
+        import fitz  # PyMuPDF, deferred to keep CLI startup fast
+
+        if self.budget:
+            # The upload is already in memory; the parsed document is the other copy
+            self.budget.admit(len(pdf_bytes), copies=1)
+        try:
+            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        except Exception as e:
+            print(f"Error reading PDF: {e}")
+            return None
+
+        try:
+            if page_numbers is None:
+                page_numbers = range(min(len(doc), max_pages) if max_pages else len(doc))
+            output_bytes = self.convert_document(doc, page_numbers, dpi)
+        finally:
+            doc.close()
+
+        if self.optimize:
+            try:
+                from .optimize import optimize_pdf_bytes
+            except ImportError:
+                from optimize import optimize_pdf_bytes
+            output_bytes = optimize_pdf_bytes(output_bytes, self.metrics)
+        self.metrics.incr("bytes_returned", len(output_bytes))
+        report = token_report(self.metrics)
+        if report:
+            print(report)
+        if self.failures:
+            print(f"⚠️  {len(self.failures)} page(s) could not be converted: {', '.join(str(page) for page, _ in self.failures)}")
+        return output_bytes
+
+    def convert_document(self, doc, page_numbers, dpi=200):
+        """
+        Converts the given 0-based pages of an open PyMuPDF document and returns the
+        compiled PDF as bytes. Shared by generate_pdf_bytes and the hybrid engine
+        (page_router.py), which hands over only the pages that need the vision model.
+        """
+        # name -> bytes, or the path of a copy in the budget's spill directory
+        page_images = {}
+        def keep_image(name, image_bytes):
+            if self.budget and self.budget.should_spill():
+                path = os.path.join(self.budget.spill_dir(), name)
+                with open(path, "wb") as f:
+                    f.write(image_bytes)
+                page_images[name] = path
+                self.metrics.incr("spilled_images")
+            else:
+                page_images[name] = image_bytes
+
+        # Rasterized only when the page is not in the page cache
+        rendered = ((index + 1, lambda index=index: self._rasterize(doc[index], dpi)) for index in page_numbers)
+        full_latex = self._build_latex(doc, rendered, keep_image)
+
+        with tempfile.TemporaryDirectory(prefix="latex-") as build_dir:
+            os.makedirs(os.path.join(build_dir, "images"))
+            for name, image_bytes in page_images.items():
+                if isinstance(image_bytes, str):
+                    shutil.move(image_bytes, os.path.join(build_dir, "images", name))
+                    continue
+                with open(os.path.join(build_dir, "images", name), "wb") as f:
+                    f.write(image_bytes)
+            tex_path = os.path.join(build_dir, "output.tex")
+            with open(tex_path, "w") as f:
+                f.write(full_latex)
+            print("Compiling with Tectonic...")
+            with self.metrics.span("tectonic"):
+                subprocess.run(["tectonic", tex_path], check=True, cwd=build_dir)
+            with open(os.path.join(build_dir, "output.pdf"), "rb") as f:
+                return f.read()
+
+    def _cache_context(self):
+        return f"vision|{sorted(self.routing.models.items())}"
+
+    def _rasterize(self, page, dpi):
+        """Renders one page to a PIL image straight from the open document."""
+        from PIL import Image
+
+        with self.metrics.span("rasterize"):
+            pix = page.get_pixmap(dpi=dpi)
+            return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+    def _build_latex(self, doc, page_images, store_image):
+        """
+        Converts each (1-based page number, page image) pair to LaTeX and wraps the
+        pages in the document preamble. Embedded images of each page are read from the open doc and handed to
+        store_image(name, bytes), which decides where they live. The page image may be a
+        callable that renders it, so pages found in the page cache are never rasterized.
+        """
         latex_body_parts = []
         
-        for i, img in enumerate(images):
-            page_num = i + 1
-            available_images = self.extract_images_from_page(input_pdf, page_num, images_dir)
-            # Pass relative path to Gemini so it generates correct LaTeX
-            # But wait, LaTeX needs path relative to .tex file.
-            # .tex file is in output_dir. images are in output_dir/images.
-            # So latex path should be "images/filename".
-            
-            # Update available_images list to include "images/" prefix for prompt clarity?
-            # Actually, I'll handle the pathing in the prompt logic above or just pass filenames and tell prompt to prefix.
-            # Let's adjust the prompt injection to be cleaner.
-            
-            # Re-inject logic for prompt:
-            # I need to pass 'images/' + name to the prompt instruction.
+        for page_num, img in page_images:
+            if self.budget:
+                self.budget.check("convert")
+            self.metrics.incr("pages")
+            with self.metrics.span("extract_images"):
+                available_images = self._extract_page_images(doc, page_num, store_image)
+            # LaTeX needs paths relative to the .tex file; images live in images/ next to it
             prompt_images = [f"images/{name}" for name in available_images]
             
-            latex_content = self.convert_page_to_latex(img, page_num, prompt_images)
+            key = self.page_cache and fingerprint(doc, page_num - 1, self._cache_context())
+            cached = key and self.page_cache.get(key, "tex")
+            if cached:
+                latex_content = cached.decode("utf-8").replace(f"images/page_{_PAGE_TOKEN}_img_", f"images/page_{page_num}_img_")
+                print(f"✓ Page {page_num} taken from the page cache")
+                latex_body_parts.append(f"% --- Page {page_num} ---\n{latex_content}\n\\newpage\n")
+                continue
+            if callable(img):
+                img = img()
+
+            page = doc.load_page(page_num - 1)
+            tier = self.routing.page_tier(page.get_text("text"), len(available_images))
+            self.metrics.incr(f"routed_{tier}")
+            failures = len(self.failures)
+            with self.metrics.span("convert_page"):
+                latex_content = self.convert_page_to_latex(img, page_num, prompt_images, tier)
+            if key and len(self.failures) == failures and page_num not in self._fallback_pages:
+                # Image names carry the page number; the same page elsewhere has another one
+                fragment = latex_content.replace(f"images/page_{page_num}_img_", f"images/page_{_PAGE_TOKEN}_img_")
+                self.page_cache.put(key, "tex", fragment.encode("utf-8"))
             latex_body_parts.append(f"% --- Page {page_num} ---\n{latex_content}\n\\newpage\n")
+        if self.page_cache:
+            self.page_cache.prune()
 
-        full_latex = r"""
+        return r"""
 \documentclass[12pt]{article}
 \usepackage{amsmath}
 \usepackage{amssymb}
@@ -226,27 +413,96 @@ class LatexConverter:
 
 \end{document}
 """
-        
-        # Save tex file
-        output_tex = output_pdf.replace(".pdf", ".tex")
-        with open(output_tex, "w") as f:
-            f.write(full_latex)
-        
-        print(f"LaTeX source saved to {output_tex}")
-        print("Compiling with Tectonic...")
-        
-        # Compile
-        subprocess.run(["tectonic", output_tex], check=True)
-        
-        print(f"Done! Output saved to {output_pdf}")
+
+def dry_run(input_pdf, max_pages=None, rpm=None, tpm=None, page_numbers=None):
+    """
+    Projects vision requests, tokens and time for generate_pdf without calling the model
+    (no API key needed). Page sizes, text layers and image counts come from PyMuPDF.
+    """
+    import fitz
+    try:
+        from .estimator import CostEstimator, QuotaConfig, format_estimate
+    except ImportError:
+        from estimator import CostEstimator, QuotaConfig, format_estimate
+
+    doc = fitz.open(input_pdf)
+    page_stats = []
+    if page_numbers is None:
+        page_numbers = range(min(max_pages or len(doc), len(doc)))
+    for page_index in page_numbers:
+        page = doc[page_index]
+        page_stats.append({
+            "page": page_index + 1,
+            "width": page.rect.width,
+            "height": page.rect.height,
+            "text": page.get_text("text"),
+            "images": len(page.get_images()),
+        })
+    doc.close()
+
+    estimate = CostEstimator(QuotaConfig(rpm=rpm, tpm=tpm)).estimate_vision_job(page_stats)
+    print(format_estimate(estimate))
+    return estimate
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="PDF to Hinglish via LaTeX")
     parser.add_argument("input_pdf", help="Input PDF")
     parser.add_argument("output_pdf", help="Output PDF")
     parser.add_argument("--pages", type=int, help="Limit pages", default=None)
+    parser.add_argument("--page-range", default=None, help="Pages to convert, 1-based, e.g. 1-10,25,40-")
+    parser.add_argument("--shard", default=None, metavar="I/N", help="Convert only the I-th of N contiguous slices of the selected pages")
+    parser.add_argument("--models", default=None, metavar="SPEC",
+                        help="Model per tier, e.g. fast=gemini-2.0-flash-lite,standard=gemini-2.0-flash,strong=gemini-2.5-flash, or one model for every page (default: $GEMINI_MODELS)")
+    parser.add_argument("--optimize", action="store_true", help="Shrink the output PDF (font subsetting, stream compression, duplicate-object merging)")
+    parser.add_argument("--no-page-cache", action="store_true",
+                        help="Neither reuse nor store pages in the cross-document page cache ($PAGE_CACHE_DIR)")
+    parser.add_argument("--dry-run", action="store_true", help="Print projected requests, tokens and time without calling the model")
+    parser.add_argument("--rpm", type=float, default=None, help="Requests-per-minute quota for --dry-run projections (default: $GEMINI_RPM or 15)")
+    parser.add_argument("--tpm", type=float, default=None, help="Tokens-per-minute quota for --dry-run projections (default: $GEMINI_TPM or 1,000,000)")
+    parser.add_argument("--metrics-json", help="Write a JSON summary of per-stage timings and counters to this path", default=None)
+    parser.add_argument("--profile", nargs="?", const="profile", default=None, metavar="DIR",
+                        help="Profile each pipeline stage and write .prof/.folded files and a hotspot summary to DIR (default: ./profile)")
+    parser.add_argument("--profile-memory", action="store_true", help="With --profile, also track allocations with tracemalloc")
+    parser.add_argument("--profile-top", type=int, default=25, help="Number of hotspots to list per stage in the profile summary")
     
     args = parser.parse_args()
+
+    page_numbers = None
+    if args.page_range or args.shard:
+        try:
+            page_numbers = select_pages(page_count(args.input_pdf), args.page_range, args.pages, args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+    if page_numbers == []:
+        print("No pages selected, nothing to do.")
+        sys.exit(0)
+
+    if args.dry_run:
+        estimate = dry_run(args.input_pdf, args.pages, args.rpm, args.tpm, page_numbers)
+        if args.metrics_json:
+            with open(args.metrics_json, "w") as f:
+                json.dump({"estimate": estimate}, f, indent=2)
+        sys.exit(0)
     
-    converter = LatexConverter()
-    converter.generate_pdf(args.input_pdf, args.output_pdf, args.pages)
+    metrics = Metrics(job=args.input_pdf)
+    if args.profile:
+        try:
+            from .profiling import StageProfiler
+        except ImportError:
+            from profiling import StageProfiler
+        metrics.profiler = StageProfiler(args.profile, trace_memory=args.profile_memory, top_n=args.profile_top)
+    try:
+        routing = RoutingPolicy.from_spec(args.models)
+    except ValueError as e:
+        parser.error(str(e))
+    page_cache = None if args.no_page_cache else PageCache.from_env(metrics)
+    converter = LatexConverter(metrics=metrics, optimize=args.optimize, routing=routing, page_cache=page_cache)
+    with metrics.span("total"):
+        converter.generate_pdf(args.input_pdf, args.output_pdf, args.pages, page_numbers)
+
+    if args.metrics_json:
+        metrics.write_json(args.metrics_json)
+        print(f"Metrics written to {args.metrics_json}")
+    if metrics.profiler:
+        metrics.profiler.write_reports()
+        print(f"Profile written to {args.profile}/ (see hotspots.txt)")
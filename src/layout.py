@@ -0,0 +1,356 @@
+import math
+import re
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+Box = Sequence[float]
+
+# A block that ends like this closes its paragraph
+_SENTENCE_END_RE = re.compile(r"[.!?:;)\]\"'”’]\s*$")
+# Bullets and enumerators ("•", "-", "3.", "(b)", "iv)") start a list item, never a continuation
+_LIST_MARKER_RE = re.compile(r"^\s*(?:[-–—•▪◦●○■□*·‣⁃➢►✓]\s|\(?(?:\d{1,3}|[a-zA-Z]|[ivxlcdm]{1,4})[.)]\s)")
+
+
+class GridIndex:
+    """
+    Uniform-grid spatial index over bounding boxes (x0, y0, x1, y1).
+    A page has at most a few hundred blocks, so a grid with cells about one
+    line high answers neighbourhood queries in near-constant time without
+    pulling in an R-tree dependency.
+    """
+
+    def __init__(self, cell: float = 24.0):
+        self.cell = cell
+        self.cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        self.boxes: Dict[int, Box] = {}
+
+    def _span(self, box: Box) -> Iterable[Tuple[int, int]]:
+        x0, y0, x1, y1 = box
+        for cx in range(int(x0 // self.cell), int(x1 // self.cell) + 1):
+            for cy in range(int(y0 // self.cell), int(y1 // self.cell) + 1):
+                yield cx, cy
+
+    def insert(self, key: int, box: Box):
+        self.boxes[key] = box
+        for cell in self._span(box):
+            self.cells[cell].append(key)
+
+    def query(self, box: Box) -> List[int]:
+        """Keys whose boxes intersect box."""
+        x0, y0, x1, y1 = box
+        found = set()
+        for cell in self._span(box):
+            for key in self.cells.get(cell, ()):
+                bx0, by0, bx1, by1 = self.boxes[key]
+                if bx0 <= x1 and x0 <= bx1 and by0 <= y1 and y0 <= by1:
+                    found.add(key)
+        return sorted(found)
+
+
+def _first_span(block: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    for line in block["lines"]:
+        for span in line["spans"]:
+            if span["text"].strip():
+                return span
+    return None
+
+
+def _line_height(block: Dict[str, Any]) -> float:
+    heights = [line["bbox"][3] - line["bbox"][1] for line in block["lines"]]
+    return sum(heights) / len(heights) if heights else 0.0
+
+
+def _overlap(a: Box, b: Box) -> float:
+    """Horizontal overlap of a and b as a fraction of the narrower one."""
+    width = min(a[2] - a[0], b[2] - b[0])
+    if width <= 0:
+        return 0.0
+    return max(0.0, min(a[2], b[2]) - max(a[0], b[0])) / width
+
+
+def join_fragments(parts: List[str]) -> str:
+    """Joins block texts of one paragraph, undoing end-of-line hyphenation ("infor-" + "mation")."""
+    text = ""
+    for part in parts:
+        if text.endswith("-") and len(text) > 1 and text[-2].isalpha() and part[:1].islower():
+            text = text[:-1] + part
+        else:
+            text = f"{text} {part}" if text else part
+    return text
+
+
+def split_translation(text: str, weights: List[int]) -> List[str]:
+    """
+    Splits a translated paragraph back into len(weights) pieces at word
+    boundaries, each piece's share of the characters proportional to its
+    weight (the length of the original text in that box).
+    """
+    if len(weights) == 1:
+        return [text]
+    words = text.split()
+    total_weight = sum(weights) or len(weights)
+    total_chars = sum(len(word) + 1 for word in words)
+    pieces: List[List[str]] = [[] for _ in weights]
+    index, position, boundary = 0, 0.0, total_chars * weights[0] / total_weight
+    for word in words:
+        # Move on once the middle of the word would fall past this box's share
+        while index < len(weights) - 1 and position + (len(word) + 1) / 2 > boundary:
+            index += 1
+            boundary += total_chars * weights[index] / total_weight
+        pieces[index].append(word)
+        position += len(word) + 1
+    return [" ".join(piece) for piece in pieces]
+
+
+class LayoutAnalyzer:
+    """
+    Puts each page's text blocks in reading order and groups blocks that are
+    fragments of one paragraph, so a paragraph is translated as one segment
+    instead of one request item per PyMuPDF block.
+
+    Reading order comes from a recursive XY-cut: a region is split into
+    columns at vertical gutters no block crosses, otherwise into rows at
+    horizontal gaps, and rows that continue the same column layout are kept
+    together so aligned paragraph breaks in two columns don't interleave them.
+    Paragraphs are built from consecutive blocks in that order that are mutual
+    nearest vertical neighbours (found through a GridIndex), share font size
+    and weight, and are not separated by more than a fraction of a line, plus
+    column breaks in the middle of a sentence. A block only runs on into the
+    next one when its last line reaches the right edge of its column, and past
+    a sentence end only into one that starts lowercase; list
+    items and table cells (single lines or narrow columns with blocks beside
+    them) are never merged, since the model would translate them as one
+    sentence and the split back into boxes would move words between cells.
+
+    annotate() reorders page["blocks"], gives the first block of each
+    multi-block paragraph the joined text and block["paragraph_size"], and
+    clears aggregated_text on the blocks it absorbed. distribute() splits the
+    translated paragraph back into the original boxes as block["translated_text"].
+    """
+
+    def __init__(self, min_gutter: float = 8.0, max_gap_lines: float = 0.8,
+                 size_tolerance: float = 0.1, indent_tolerance: float = 0.5,
+                 edge_tolerance: float = 0.2, table_column_ratio: float = 0.3):
+        self.min_gutter = min_gutter
+        self.max_gap_lines = max_gap_lines
+        self.size_tolerance = size_tolerance
+        self.indent_tolerance = indent_tolerance
+        # A line ending within this share of the column width from its right edge is full
+        self.edge_tolerance = edge_tolerance
+        # Columns narrower than this share of the text width, with blocks beside them, are table columns
+        self.table_column_ratio = table_column_ratio
+
+    def annotate(self, pages_data: List[Dict[str, Any]]) -> Dict[str, int]:
+        stats = {"paragraphs": 0, "merged_blocks": 0}
+        for page in pages_data:
+            blocks = page["blocks"]
+            if len(blocks) < 2:
+                continue
+            order = self._reading_order([block["bbox"] for block in blocks])
+            page["blocks"] = blocks = [blocks[i] for i in order]
+            for start, size in self._paragraphs(blocks):
+                if size < 2:
+                    continue
+                members = blocks[start:start + size]
+                members[0]["aggregated_text"] = join_fragments([block["aggregated_text"] for block in members])
+                members[0]["paragraph_size"] = size
+                for block in members[1:]:
+                    block.pop("aggregated_text", None)
+                    block["paragraph_member"] = True
+                stats["paragraphs"] += 1
+                stats["merged_blocks"] += size - 1
+        return stats
+
+    def distribute(self, pages_data: List[Dict[str, Any]], translation_map: Dict[str, str]):
+        """
+        Sets block["translated_text"] on every block of a multi-block paragraph.
+        Paragraphs without a translation are left alone, so each box keeps its own text.
+        """
+        for page in pages_data:
+            blocks = page["blocks"]
+            for index, block in enumerate(blocks):
+                size = block.get("paragraph_size", 1)
+                if size < 2:
+                    continue
+                translated = translation_map.get(block["aggregated_text"])
+                if translated is None:
+                    continue
+                members = blocks[index:index + size]
+                weights = [len(_block_text(member)) for member in members]
+                for member, piece in zip(members, split_translation(translated, weights)):
+                    member["translated_text"] = piece
+
+    # Reading order
+
+    def _reading_order(self, boxes: List[Box]) -> List[int]:
+        return self._order(list(range(len(boxes))), boxes)
+
+    def _order(self, ids: List[int], boxes: List[Box]) -> List[int]:
+        if len(ids) <= 1:
+            return ids
+        columns = self._split(ids, boxes, axis=0, min_gap=self.min_gutter)
+        if len(columns) > 1:
+            return [i for column in columns for i in self._order(column, boxes)]
+        rows = self._rows(ids, boxes)
+        if len(rows) > 1:
+            return [i for row in rows for i in self._order(row, boxes)]
+        return sorted(ids, key=lambda i: (boxes[i][1], boxes[i][0]))
+
+    def _split(self, ids: List[int], boxes: List[Box], axis: int, min_gap: float) -> List[List[int]]:
+        """Groups ids into bands along axis (0: x, 1: y) separated by gaps of at least min_gap."""
+        ordered = sorted(ids, key=lambda i: boxes[i][axis])
+        groups = [[ordered[0]]]
+        end = boxes[ordered[0]][axis + 2]
+        for i in ordered[1:]:
+            if boxes[i][axis] - end >= min_gap:
+                groups.append([])
+            groups[-1].append(i)
+            end = max(end, boxes[i][axis + 2])
+        return groups
+
+    def _rows(self, ids: List[int], boxes: List[Box]) -> List[List[int]]:
+        """
+        Splits at horizontal gaps, but keeps consecutive rows together while their
+        union still has a column gutter: two columns whose paragraph breaks happen
+        to line up, or whose last row only reaches into one column, are still read
+        column by column. Anything spanning the gutter (a title, a full-width
+        figure caption) ends the run.
+        """
+        rows = self._split(ids, boxes, axis=1, min_gap=0.01)
+        merged = [rows[0]]
+        for row in rows[1:]:
+            candidate = merged[-1] + row
+            if len(self._split(candidate, boxes, 0, self.min_gutter)) > 1:
+                merged[-1] = candidate
+            else:
+                merged.append(row)
+        return merged
+
+    # Paragraphs
+
+    def _paragraphs(self, blocks: List[Dict[str, Any]]) -> List[Tuple[int, int]]:
+        """(start, size) runs of consecutive blocks that form one paragraph."""
+        index = GridIndex()
+        for i, block in enumerate(blocks):
+            index.insert(i, block["bbox"])
+        below = {i: self._nearest(i, blocks, index, down=True) for i in range(len(blocks))}
+        above = {i: self._nearest(i, blocks, index, down=False) for i in range(len(blocks))}
+        columns, cells = self._columns(blocks)
+
+        runs = []
+        start = 0
+        for i in range(1, len(blocks) + 1):
+            if (i < len(blocks) and i - 1 not in cells and i not in cells
+                    and self._continues(blocks[i - 1], blocks[i], below[i - 1] == i and above[i] == i - 1, columns[i - 1])):
+                continue
+            runs.append((start, i - start))
+            start = i
+        return runs
+
+    def _columns(self, blocks: List[Dict[str, Any]]) -> Tuple[List[Tuple[float, float]], set]:
+        """
+        (x0, x1) of the column each block sits in, from the blocks in the same font
+        size stacked with it (overlapping at least half of the wider one), so a
+        title or a full-width block above two columns belongs to neither. x1 is
+        the median end of the column's lines, not the widest one, so overlong
+        lines in ragged-right text do not move it. Neither the block's
+        own last line nor the block after it count, since those are what
+        _continues tests against x1; with fewer than three other lines to go on,
+        the column is the page's text width.
+        Also the indexes of blocks that look like table cells: another block sits
+        beside them on the same line, and they are a single line or their column is narrow.
+        """
+        boxes = [block["bbox"] for block in blocks]
+        sizes = [(_first_span(block) or {}).get("size", 0.0) for block in blocks]
+        text_x0, text_x1 = min(box[0] for box in boxes), max(box[2] for box in boxes)
+        text_width = (text_x1 - text_x0) or 1.0
+        columns, cells = [], set()
+        for i, (x0, y0, x1, y1) in enumerate(boxes):
+            col_x0, ends, beside = x0, [x1], False
+            line_ends = [line["bbox"][2] for line in blocks[i]["lines"][:-1]]
+            for j, (bx0, by0, bx1, by1) in enumerate(boxes):
+                if j == i:
+                    continue
+                shared = min(x1, bx1) - max(x0, bx0)
+                if shared >= 0.5 * max(x1 - x0, bx1 - bx0, 1e-6):
+                    if abs(sizes[i] - sizes[j]) <= self.size_tolerance * max(sizes[i], sizes[j]):
+                        col_x0 = min(col_x0, bx0)
+                        ends.append(bx1)
+                        if j != i + 1:
+                            line_ends.extend(line["bbox"][2] for line in blocks[j]["lines"])
+                elif shared <= 0 and min(y1, by1) - max(y0, by0) >= 0.5 * min(y1 - y0, by1 - by0):
+                    beside = True
+            if len(line_ends) >= 3:
+                line_ends.sort()
+                columns.append((col_x0, line_ends[math.ceil(0.5 * (len(line_ends) - 1))]))
+            else:
+                columns.append((text_x0, text_x1))
+            ends.sort()
+            col_x1 = ends[math.ceil(0.75 * (len(ends) - 1))]
+            if beside and (len(blocks[i]["lines"]) == 1 or col_x1 - col_x0 < self.table_column_ratio * text_width):
+                cells.add(i)
+        return columns, cells
+
+    def _nearest(self, i: int, blocks: List[Dict[str, Any]], index: GridIndex, down: bool) -> Optional[int]:
+        """The closest block directly below (or above) block i that overlaps it horizontally."""
+        x0, y0, x1, y1 = blocks[i]["bbox"]
+        reach = max(_line_height(blocks[i]), 1.0) * (self.max_gap_lines + 1)
+        window = (x0, y1 - 1, x1, y1 + reach) if down else (x0, y0 - reach, x1, y0 + 1)
+        best, best_gap = None, None
+        for j in index.query(window):
+            if j == i or _overlap(blocks[i]["bbox"], blocks[j]["bbox"]) < 0.5:
+                continue
+            gap = blocks[j]["bbox"][1] - y1 if down else y0 - blocks[j]["bbox"][3]
+            if gap < -2 or (best_gap is not None and gap >= best_gap):
+                continue
+            best, best_gap = j, gap
+        return best
+
+    def _continues(self, previous: Dict[str, Any], block: Dict[str, Any], adjacent: bool,
+                   column: Tuple[float, float]) -> bool:
+        """
+        Whether block carries on the paragraph that previous (in column) is part of.
+        After a sentence end only a lowercase start continues it, never a number or a symbol:
+
+        >>> def block(text, y):
+        ...     line = {"bbox": (72, y, 72 + 5 * len(text), y + 12), "spans": [{"text": text, "size": 10.0, "font": "Helvetica"}]}
+        ...     return {"bbox": line["bbox"], "lines": [line], "aggregated_text": text}
+        >>> LayoutAnalyzer().annotate([{"blocks": [block("Visit https://example.com/docs for more.", 100), block("10 mm", 113)]}])
+        {'paragraphs': 0, 'merged_blocks': 0}
+        >>> LayoutAnalyzer().annotate([{"blocks": [block("Readings are taken every hour and the", 100), block("values are averaged.", 113)]}])
+        {'paragraphs': 1, 'merged_blocks': 1}
+        """
+        prev_text, text = previous.get("aggregated_text") or _block_text(previous), block.get("aggregated_text")
+        if not text or not prev_text:
+            return False
+        if _LIST_MARKER_RE.match(prev_text) or _LIST_MARKER_RE.match(text):
+            return False
+        prev_span, span = _first_span(previous), _first_span(block)
+        if not prev_span or not span:
+            return False
+        if abs(prev_span["size"] - span["size"]) > self.size_tolerance * max(prev_span["size"], span["size"]):
+            return False
+        if "Bold" in prev_span["font"] or "Bold" in span["font"]:
+            # Headings and bold labels stay their own segment
+            return False
+
+        ends_sentence = bool(_SENTENCE_END_RE.search(prev_text))
+        if adjacent:
+            # A paragraph runs on only from a full line; a short last line ends it
+            last_line_end = previous["lines"][-1]["bbox"][2] if previous["lines"] else previous["bbox"][2]
+            if last_line_end < column[1] - self.edge_tolerance * (column[1] - column[0]):
+                return False
+            gap = block["bbox"][1] - previous["bbox"][3]
+            if gap > self.max_gap_lines * max(_line_height(previous), 1.0):
+                return False
+            # An indented first line starts a new paragraph
+            if block["bbox"][0] - previous["bbox"][0] > self.indent_tolerance * span["size"]:
+                return False
+            return not ends_sentence or text[:1].islower()
+        # Column (or box) break in the middle of a sentence: the next block starts higher up
+        return (block["bbox"][1] < previous["bbox"][1] and not ends_sentence
+                and text[:1].islower())
+
+
+def _block_text(block: Dict[str, Any]) -> str:
+    return " ".join(span["text"] for line in block["lines"] for span in line["spans"]).strip()
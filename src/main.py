@@ -1,28 +1,78 @@
 import argparse
 import os
 import sys
-from extractor import PDFExtractor
-from translator import Translator
-from generator import PDFGenerator
+from metrics import Metrics
+from memory import MemoryBudget, MemoryBudgetExceeded
+from batch import is_batch_input
+from pages import page_count, page_spans, parse_shard, select_pages
+from pipeline import apply_translations, collect_segments, extract_pages, translate_segments
+from stages import COMMANDS as STAGE_COMMANDS
+from page_cache import PageCache, clean_pages, finish_output
+# The pipeline modules (extractor, translator, generator) are imported inside
+# run_pipeline: they pull in PyMuPDF, google.generativeai, ReportLab and PIL,
+# and argument errors/--help should not have to pay for that.
 
 def main():
-    parser = argparse.ArgumentParser(description="PDF to Hinglish Converter")
-    parser.add_argument("input_pdf", help="Path to the input PDF file")
-    parser.add_argument("output_pdf", help="Path to save the output PDF file")
+    if len(sys.argv) > 1 and sys.argv[1] in STAGE_COMMANDS:
+        # main.py extract|translate|render ...: one stage over an intermediate document (stages.py)
+        load_env_key(os.path.join(os.getcwd(), ".env"))
+        from stages import main as run_stage
+        return run_stage(sys.argv[1:])
+
+    parser = argparse.ArgumentParser(description="PDF to Hinglish Converter",
+                                     epilog="Stages can also be run separately: main.py extract|translate|render --help")
+    parser.add_argument("input_pdf", help="Path to the input PDF file, or a directory / quoted glob of PDFs for batch mode")
+    parser.add_argument("output_pdf", help="Path to save the output PDF file (the output directory in batch mode)")
     parser.add_argument("--api-key", help="Google Gemini API Key (optional if GOOGLE_API_KEY env var is set)", default=None)
     parser.add_argument("--save-key", action="store_true", help="Save the provided API key to a .env file for future use")
     parser.add_argument("--pages", type=int, help="Number of pages to convert (default: all)", default=None)
+    parser.add_argument("--page-range", default=None, metavar="RANGES", help="Pages to convert, 1-based, e.g. 1-10,25,40- (combines with --pages)")
+    parser.add_argument("--shard", default=None, metavar="I/N", help="Convert only the I-th of N contiguous slices of the selected pages; stitch the outputs with merge.py")
     parser.add_argument("--no-ocr", action="store_true", help="Disable OCR for images")
+    parser.add_argument("--scan-dpi", type=int, default=None, metavar="DPI",
+                        help="Resolution scanned pages are rendered at for OCR (default: $SCAN_DPI or 300)")
+    parser.add_argument("--no-layout", action="store_true", help="Translate each text block on its own instead of merging paragraph fragments")
+    parser.add_argument("--image-dpi", type=float, default=None, help="Downsample images shown at well above this resolution (e.g. 150); others are embedded unchanged")
+    parser.add_argument("--optimize", action="store_true", help="Shrink the output PDF (font subsetting, stream compression, duplicate-object merging)")
+    parser.add_argument("--models", default=None, metavar="SPEC",
+                        help="Model per tier, e.g. fast=gemini-2.0-flash-lite,standard=gemini-2.0-flash,strong=gemini-2.5-flash, or one model for everything (default: $GEMINI_MODELS)")
+    parser.add_argument("--engine", choices=("block", "auto"), default="block",
+                        help="block: translate every page's text layer; auto: send math-heavy pages (and, with --no-ocr, scans) to the LaTeX vision pipeline instead (see page_router.py)")
+    parser.add_argument("--memory-budget", type=float, default=None, metavar="MB",
+                        help="Per-job memory limit: spill pages and translations to disk near it, stop the job cleanly above it (default: $MEMORY_BUDGET_MB, or none)")
+    parser.add_argument("--no-page-cache", action="store_true",
+                        help="Neither reuse nor store finished pages in the cross-document page cache ($PAGE_CACHE_DIR)")
+    parser.add_argument("--hedge", action="store_true", help="Send a duplicate request when a call runs longer than the observed p95 latency")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes: documents in batch mode, page ranges when rendering a single document (default: CPU count)")
+    parser.add_argument("--dry-run", action="store_true", help="Extract and analyse locally, then print projected requests, tokens and time without calling the model")
+    parser.add_argument("--rpm", type=float, default=None, help="Requests-per-minute quota for --dry-run projections (default: $GEMINI_RPM or 15)")
+    parser.add_argument("--tpm", type=float, default=None, help="Tokens-per-minute quota for --dry-run projections (default: $GEMINI_TPM or 1,000,000)")
+    parser.add_argument("--metrics-json", help="Write a JSON summary of per-stage timings and counters to this path", default=None)
+    parser.add_argument("--profile", nargs="?", const="profile", default=None, metavar="DIR",
+                        help="Profile each pipeline stage and write .prof/.folded files and a hotspot summary to DIR (default: ./profile)")
+    parser.add_argument("--profile-memory", action="store_true", help="With --profile, also track allocations with tracemalloc")
+    parser.add_argument("--profile-top", type=int, default=25, help="Number of hotspots to list per stage in the profile summary")
 
     args = parser.parse_args()
+    try:
+        if args.page_range:
+            page_spans(args.page_range)
+        if args.shard:
+            parse_shard(args.shard)
+        if args.models:
+            from routing import parse_models
+            parse_models(args.models)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.shard:
+        if is_batch_input(args.input_pdf):
+            parser.error("--shard splits a single document; use worker.py to spread a batch over machines")
+    if args.engine == "auto" and is_batch_input(args.input_pdf):
+        parser.error("--engine auto converts a single document; batch mode uses the block engine")
 
     # Load from .env if exists
     env_path = os.path.join(os.getcwd(), ".env")
-    if os.path.exists(env_path):
-        with open(env_path, "r") as f:
-            for line in f:
-                if line.startswith("GOOGLE_API_KEY="):
-                    os.environ["GOOGLE_API_KEY"] = line.strip().split("=", 1)[1]
+    load_env_key(env_path)
 
     if args.api_key:
         os.environ["GOOGLE_API_KEY"] = args.api_key
@@ -31,72 +81,203 @@ def main():
                 f.write(f"GOOGLE_API_KEY={args.api_key}\n")
             print(f"API Key saved to {env_path}")
     
-    if not os.environ.get("GOOGLE_API_KEY"):
+    if not os.environ.get("GOOGLE_API_KEY") and not args.dry_run:
         print("Error: GOOGLE_API_KEY not found. Please provide it via --api-key or use --save-key to store it.")
         sys.exit(1)
 
     print(f"Processing {args.input_pdf}...")
+    metrics = Metrics(job=args.input_pdf)
+    if args.profile:
+        from profiling import StageProfiler
+        metrics.profiler = StageProfiler(args.profile, trace_memory=args.profile_memory, top_n=args.profile_top)
+    estimate = None
+    budget = None
+    if not args.dry_run and not is_batch_input(args.input_pdf):
+        budget = MemoryBudget.from_env(args.memory_budget, metrics)
+    try:
+        with metrics.span("total"):
+            if args.dry_run:
+                estimate = run_dry_run(args, metrics)
+            elif is_batch_input(args.input_pdf):
+                make_batch_runner(args, metrics).run()
+            else:
+                run_pipeline(args, metrics, budget)
+    except MemoryBudgetExceeded as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        if budget:
+            print(budget.report())
+            budget.close()
+
+    summary = metrics.summary()
+    print(f"Finished in {summary['wall_seconds']}s: {summary['counters']}")
+    if args.metrics_json:
+        metrics.write_json(args.metrics_json, extra={"estimate": estimate} if estimate else None)
+        print(f"Metrics written to {args.metrics_json}")
+    if metrics.profiler:
+        metrics.profiler.write_reports()
+        print(f"Profile written to {args.profile}/ (see hotspots.txt)")
+
+def load_env_key(env_path):
+    if os.path.exists(env_path):
+        with open(env_path, "r") as f:
+            for line in f:
+                if line.startswith("GOOGLE_API_KEY="):
+                    os.environ["GOOGLE_API_KEY"] = line.strip().split("=", 1)[1]
+
+def run_pipeline(args, metrics: Metrics, budget=None):
+    if budget:
+        budget.admit(os.path.getsize(args.input_pdf))
+    if args.engine == "auto":
+        return run_hybrid(args, metrics, budget)
+    from translator import Translator
+    from generator import PDFGenerator
+    from routing import RoutingPolicy
+
+    routing = RoutingPolicy.from_spec(args.models)
+    page_numbers = selected_pages(args)
+    page_cache = None if args.no_page_cache else PageCache.from_env(metrics)
+    if page_cache:
+        # Pages whose finished output is already cached skip every stage below
+        import fitz
+        from page_cache import block_context
+
+        with fitz.open(args.input_pdf) as doc:
+            if page_numbers is None:
+                page_numbers = range(min(args.pages or len(doc), len(doc)))
+            keys = page_cache.fingerprints(doc, page_numbers, block_context(
+                routing.models, not args.no_layout, not args.no_ocr, args.image_dpi, args.scan_dpi))
+        plan = page_cache.lookup(keys, "pdf")
+        page_numbers = [index for index, key in plan.items() if key is None]
+        print(f"Page cache: {len(plan) - len(page_numbers)} of {len(plan)} page(s) reused")
+        if not page_numbers:
+            finish_output(page_cache, args.output_pdf, None, keys, plan, {}, args.optimize)
+            print("Done!")
+            return
+    cached_pages = bool(page_cache) and len(page_numbers) < len(plan)
 
     # 1. Extract
-    print("Extracting text and layout...")
-    extractor = PDFExtractor(args.input_pdf, use_ocr=not args.no_ocr)
-    pages_data = extractor.extract_text_content(max_pages=args.pages)
-    extractor.close()
-    print(f"Extracted {len(pages_data)} pages.")
+    pages_data = extract_pages(args.input_pdf, args.pages, not args.no_ocr, metrics, page_numbers=page_numbers,
+                               scan_dpi=args.scan_dpi, budget=budget)
 
     # 2. Collect unique text for translation (Block Level)
-    print("Preparing text for translation (Block Level)...")
-    unique_texts = set()
-    for page in pages_data:
-        for block in page["blocks"]:
-            # Aggregate text from all lines/spans in the block
-            block_text_parts = []
-            for line in block["lines"]:
-                for span in line["spans"]:
-                    block_text_parts.append(span["text"])
-            
-            full_block_text = " ".join(block_text_parts).strip()
-            if full_block_text:
-                unique_texts.add(full_block_text)
-                # Store it back in the block for easier access later? 
-                # No, we just use the map. But we need to reconstruct the key exactly.
-                # To be safe, let's store the aggregated text in the block structure itself in memory
-                block["aggregated_text"] = full_block_text
-        
-        # Add OCR text if any
-        for img in page["images"]:
-            if img.get("ocr_text"):
-                unique_texts.add(img["ocr_text"])
-
-    sorted_texts = sorted(list(unique_texts))
-    print(f"Found {len(sorted_texts)} blocks to translate.")
+    sorted_texts, normalizer = collect_segments(pages_data, metrics, layout=not args.no_layout)
 
     # 3. Translate
-    print("Translating to Hinglish (this may take a while)...")
-    translator = Translator()
-    # Batch translation could be implemented here for efficiency
-    # For now, simplistic loop
-    translation_map = {}
-    
-    # Simple progress indicator
-    total = len(sorted_texts)
-    for i, text in enumerate(sorted_texts):
-        if i % 10 == 0:
-            print(f"Translating {i}/{total}...")
-        try:
-             translated = translator.translate_text(text)
-             translation_map[text] = translated
-        except Exception as e:
-            print(f"Failed to translate '{text}': {e}")
-            translation_map[text] = text
-
+    translator = Translator(metrics=metrics, hedge=args.hedge, routing=routing)
+    translation_map = translate_segments(translator, sorted_texts, metrics)
+    if budget:
+        translation_map = budget.spill_map(translation_map)
+    apply_translations(pages_data, translation_map, normalizer)
     print("Translation complete.")
 
     # 4. Generate
     print(f"Generating output PDF at {args.output_pdf}...")
-    generator = PDFGenerator(args.output_pdf)
+    # With cached pages to splice in, this run's pages go to a side file and are optimized once spliced
+    render_path = f"{args.output_pdf}.rendered.pdf" if cached_pages else args.output_pdf
+    generator = PDFGenerator(render_path, metrics=metrics, image_dpi=args.image_dpi,
+                             optimize=args.optimize and not cached_pages, jobs=args.jobs or os.cpu_count() or 1)
     generator.generate(pages_data, translation_map)
+    if page_cache:
+        clean = clean_pages(pages_data, [text for text, _ in translator.failures])
+        finish_output(page_cache, args.output_pdf, render_path, keys, plan, clean, args.optimize and cached_pages)
     print("Done!")
 
+def run_hybrid(args, metrics: Metrics, budget=None):
+    """--engine auto: each page on the cheapest engine that can handle it, merged in page order."""
+    from page_router import HybridConverter
+    from routing import RoutingPolicy
+
+    converter = HybridConverter(metrics=metrics, hedge=args.hedge, optimize=args.optimize,
+                                routing=RoutingPolicy.from_spec(args.models), use_ocr=not args.no_ocr,
+                                layout=not args.no_layout, budget=budget,
+                                page_cache=None if args.no_page_cache else PageCache.from_env(metrics))
+    converter.generate_pdf(args.input_pdf, args.output_pdf, max_pages=args.pages, page_numbers=selected_pages(args))
+
+def selected_pages(args):
+    """0-based pages chosen by --page-range/--pages/--shard, or None for the whole document."""
+    if not (args.page_range or args.shard):
+        return None
+    try:
+        pages = select_pages(page_count(args.input_pdf), args.page_range, args.pages, args.shard)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if not pages:
+        print(f"Shard {args.shard} has no pages to convert (the selection is smaller than the shard count).")
+        sys.exit(0)
+    if args.shard:
+        print(f"Shard {args.shard}: pages {pages[0] + 1}-{pages[-1] + 1} ({len(pages)} pages)")
+    return pages
+
+def make_batch_runner(args, metrics: Metrics):
+    from batch import BatchRunner, resolve_inputs
+
+    inputs = resolve_inputs(args.input_pdf)
+    if not inputs:
+        print(f"Error: no PDF files match {args.input_pdf}")
+        sys.exit(1)
+    print(f"Batch mode: {len(inputs)} documents -> {args.output_pdf}/")
+    return BatchRunner(inputs, args.output_pdf, metrics=metrics, jobs=args.jobs, max_pages=args.pages,
+                       use_ocr=not args.no_ocr, hedge=args.hedge, image_dpi=args.image_dpi,
+                       optimize=args.optimize, page_range=args.page_range, layout=not args.no_layout,
+                       models=args.models, scan_dpi=args.scan_dpi)
+
+def run_dry_run(args, metrics: Metrics):
+    """
+    Extracts and dedupes locally, then projects requests, tokens and time
+    for the translation without calling the model.
+    """
+    from estimator import CostEstimator, QuotaConfig, format_estimate
+
+    # OCR is local work; in a dry run we only count the images it would process
+    if is_batch_input(args.input_pdf):
+        runner = make_batch_runner(args, metrics)
+        runner.use_ocr = False
+        sorted_texts = runner.extract()
+        pages_data = [page for document, _ in runner.documents for page in document]
+    elif args.engine == "auto":
+        return dry_run_hybrid(args, metrics)
+    else:
+        pages_data = extract_pages(args.input_pdf, args.pages, False, metrics, page_numbers=selected_pages(args))
+        sorted_texts, _ = collect_segments(pages_data, metrics, layout=not args.no_layout)
+
+    ocr_images = 0 if args.no_ocr else sum(len(page["images"]) for page in pages_data)
+    pages_without_text = sum(1 for page in pages_data if not any(b.get("aggregated_text") for b in page["blocks"]))
+
+    estimator = CostEstimator(QuotaConfig(rpm=args.rpm, tpm=args.tpm))
+    estimate = estimator.estimate_text_job(sorted_texts, ocr_images=ocr_images, pages=len(pages_data),
+                                           pages_without_text=pages_without_text)
+    print(format_estimate(estimate))
+    if ocr_images:
+        print("  Note: text found by OCR is not included in the segment and token counts.")
+    return estimate
+
+def dry_run_hybrid(args, metrics: Metrics):
+    """--dry-run with --engine auto: the page split, then a projection for each engine's share."""
+    import fitz
+    from estimator import CostEstimator, QuotaConfig, format_estimate
+    from latex_converter import dry_run as vision_dry_run
+    from page_router import PageRouter
+
+    page_numbers = selected_pages(args)
+    with fitz.open(args.input_pdf) as doc:
+        if page_numbers is None:
+            page_numbers = range(min(args.pages or len(doc), len(doc)))
+        plan = PageRouter(scans_to_vision=args.no_ocr).plan(doc, page_numbers, metrics)
+    print(f"Routing: {len(plan['block'])} page(s) on the text layer, {len(plan['vision'])} page(s) via page images")
+
+    estimates = {}
+    if plan["block"]:
+        pages_data = extract_pages(args.input_pdf, None, False, metrics, page_numbers=plan["block"])
+        sorted_texts, _ = collect_segments(pages_data, metrics, layout=not args.no_layout)
+        estimator = CostEstimator(QuotaConfig(rpm=args.rpm, tpm=args.tpm))
+        estimates["block"] = estimator.estimate_text_job(sorted_texts, pages=len(pages_data))
+        print(format_estimate(estimates["block"]))
+    if plan["vision"]:
+        estimates["vision"] = vision_dry_run(args.input_pdf, rpm=args.rpm, tpm=args.tpm, page_numbers=plan["vision"])
+    return estimates
+
 if __name__ == "__main__":
     main()
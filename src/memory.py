@@ -0,0 +1,222 @@
+import os
+from typing import Any, Dict, Iterator, List, Optional
+try:
+    from .metrics import Metrics
+except ImportError:
+    from metrics import Metrics
+
+MB = 1024 * 1024
+
+
+class MemoryBudgetExceeded(Exception):
+    """A job needs more memory than its budget allows, even with intermediate data on disk."""
+
+    def __init__(self, message: str, rss: int = 0, limit: int = 0):
+        super().__init__(message)
+        self.rss = rss
+        self.limit = limit
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        import sys
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemoryBudget:
+    """
+    Per-job memory limit, so a worker on a fixed-size container runs a known
+    number of jobs instead of being OOM-killed by one large PDF.
+
+    Usage is the process RSS. When Python allocations are being traced (for
+    example under --profile-memory) the traced heap is reported alongside it,
+    which tells page data apart from PyMuPDF's and ReportLab's native buffers;
+    tracing is not switched on here because it slows every allocation.
+
+    Once usage crosses spill_ratio of the limit, should_spill() turns true and
+    the stages move what they can to a scratch directory: PageStore pickles
+    extracted pages, spill_map() moves the translation map into a shelve file,
+    and the LaTeX converter writes page images straight to disk. check() raises
+    MemoryBudgetExceeded if usage is still over the limit after that; admit()
+    rejects a job up front whose input alone would not fit.
+    """
+
+    def __init__(self, limit_mb: float, metrics: Optional[Metrics] = None, spill_ratio: float = 0.8):
+        self.limit = int(limit_mb * MB)
+        self.spill_ratio = spill_ratio
+        self.metrics = metrics or Metrics()
+        self.peak = 0
+        self._spill_dir: Optional[str] = None
+        self._shelves: List[Any] = []
+
+    @classmethod
+    def from_env(cls, limit_mb: Optional[float] = None, metrics: Optional[Metrics] = None) -> Optional["MemoryBudget"]:
+        """A budget from --memory-budget or $MEMORY_BUDGET_MB, or None when neither is set."""
+        limit_mb = limit_mb or float(os.environ.get("MEMORY_BUDGET_MB", 0) or 0)
+        return cls(limit_mb, metrics) if limit_mb else None
+
+    def usage(self) -> int:
+        rss = rss_bytes()
+        self.peak = max(self.peak, rss)
+        return rss
+
+    def should_spill(self) -> bool:
+        return self.usage() >= self.spill_ratio * self.limit
+
+    def admit(self, input_bytes: int, copies: int = 2):
+        """
+        Rejects a job before it starts if its input can't fit: the upload or file
+        is held at least twice (the raw bytes and the parsed document) and that part
+        can't be spilled.
+        """
+        needed = self.usage() + copies * input_bytes
+        if needed > self.limit:
+            self.metrics.incr("jobs_rejected_memory")
+            raise MemoryBudgetExceeded(
+                f"Input of {input_bytes / MB:.0f} MB needs about {needed / MB:.0f} MB, "
+                f"over the memory budget of {self.limit / MB:.0f} MB", needed, self.limit)
+
+    def check(self, stage: str):
+        rss = self.usage()
+        if rss > self.limit:
+            self.metrics.incr("jobs_rejected_memory")
+            raise MemoryBudgetExceeded(
+                f"Memory use {rss / MB:.0f} MB exceeds the budget of {self.limit / MB:.0f} MB during {stage}",
+                rss, self.limit)
+
+    def pages(self) -> "PageStore":
+        return PageStore(self)
+
+    def spill_dir(self) -> str:
+        """Scratch directory for spilled data, created on first use and removed by close()."""
+        if self._spill_dir is None:
+            import tempfile
+
+            self._spill_dir = tempfile.mkdtemp(prefix="spill-")
+        return self._spill_dir
+
+    def spill_map(self, mapping: Dict[str, str], stage: str = "translate"):
+        """The mapping itself, or a disk-backed copy of it when memory is tight."""
+        if not self.should_spill():
+            return mapping
+        import shelve
+
+        spilled = shelve.open(os.path.join(self.spill_dir(), "translations"), flag="n")
+        self._shelves.append(spilled)
+        spilled.update(mapping)
+        self.metrics.incr("spilled_translations", len(mapping))
+        mapping.clear()
+        self.check(stage)
+        return spilled
+
+    def report(self) -> str:
+        import tracemalloc
+
+        line = f"Memory: peak RSS {self.peak / MB:.0f} MB of a {self.limit / MB:.0f} MB budget"
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            line += f" (Python heap {current / MB:.0f} MB now, {peak / MB:.0f} MB peak)"
+        return line
+
+    def close(self):
+        for spilled in self._shelves:
+            spilled.close()
+        self._shelves.clear()
+        if self._spill_dir:
+            import shutil
+
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+
+
+class PageStore:
+    """
+    List of extracted pages that moves pages to disk when the budget says so.
+
+    Pages stay in memory until the budget is near its limit; from then on every
+    page appended, and every page already held, is pickled to the spill
+    directory. Iterating loads one spilled page at a time and writes it back
+    after the loop body has run, so the in-place annotations the pipeline makes
+    (layout, segments, translated text) are kept. Indexing and slicing return
+    loaded copies and are meant for read-only use.
+    """
+
+    def __init__(self, budget: MemoryBudget, pages: Optional[List[Dict[str, Any]]] = None):
+        self.budget = budget
+        self._pages: List[Optional[Dict[str, Any]]] = []
+        self._paths: Dict[int, str] = {}
+        # A document opened from bytes has them as page["source"]; pickled once per page that would copy the PDF
+        self._source: Any = None
+        for page in pages or ():
+            self.append(page)
+
+    @property
+    def spilled(self) -> bool:
+        return bool(self._paths)
+
+    def append(self, page: Dict[str, Any]):
+        self._pages.append(page)
+        if self.spilled:
+            self._spill(len(self._pages) - 1, page)
+        elif self.budget.should_spill():
+            for index, held in enumerate(self._pages):
+                self._spill(index, held)
+        else:
+            return
+        self.budget.check("extract")
+
+    def _spill(self, index: int, page: Dict[str, Any]):
+        path = self._paths.get(index) or os.path.join(self.budget.spill_dir(), f"page-{index:06d}.pkl")
+        import pickle
+
+        if isinstance(page.get("source"), (bytes, bytearray)):
+            self._source = page["source"]
+            page = dict(page, source=None)
+        with open(path, "wb") as f:
+            pickle.dump(page, f, protocol=pickle.HIGHEST_PROTOCOL)
+        if index not in self._paths:
+            self._paths[index] = path
+            self.budget.metrics.incr("spilled_pages")
+        self._pages[index] = None
+
+    def _load(self, index: int) -> Dict[str, Any]:
+        page = self._pages[index]
+        if page is not None:
+            return page
+        import pickle
+
+        with open(self._paths[index], "rb") as f:
+            page = pickle.load(f)
+        if page.get("source") is None and self._source is not None:
+            page["source"] = self._source
+        return page
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for index in range(len(self._pages)):
+            page = self._load(index)
+            yield page
+            if index in self._paths:
+                self._spill(index, page)
+                self.budget.check("pages")
+
+    def __setitem__(self, index: int, page: Dict[str, Any]):
+        if index in self._paths:
+            self._spill(index, page)
+        else:
+            self._pages[index] = page
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self._load(index) for index in range(*item.indices(len(self._pages)))]
+        return self._load(range(len(self._pages))[item])
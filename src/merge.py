@@ -0,0 +1,53 @@
+import os
+import re
+from typing import List, Optional
+try:
+    from .metrics import Metrics
+except ImportError:
+    from metrics import Metrics
+
+
+def merge_pdfs(paths: List[str], output_path: str, metrics: Optional[Metrics] = None):
+    """
+    Concatenates the PDFs in paths, in the given order, into output_path.
+    Used to stitch page shards rendered by separate workers back into one document.
+    """
+    import fitz
+
+    metrics = metrics or Metrics()
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    with metrics.span("merge"):
+        merged = fitz.open()
+        for path in paths:
+            with fitz.open(path) as part:
+                merged.insert_pdf(part)
+        # Write to a temporary name first so readers never see a half-written output
+        tmp_path = output_path + ".tmp"
+        # garbage=4 also merges identical streams, so fonts and images repeated
+        # across parts are stored once
+        merged.save(tmp_path, garbage=4, deflate=True)
+        merged.close()
+        os.replace(tmp_path, output_path)
+    metrics.incr("merged_parts", len(paths))
+    metrics.incr("bytes_written", os.path.getsize(output_path))
+
+
+def _natural_key(path: str):
+    # "part10.pdf" sorts after "part2.pdf", so shard outputs come back in page order
+    return [int(piece) if piece.isdigit() else piece for piece in re.split(r"(\d+)", os.path.basename(path))]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Merge PDFs produced with --shard back into one document")
+    parser.add_argument("output_pdf", help="Merged output PDF")
+    parser.add_argument("parts", nargs="+", help="Part PDFs (sorted by name, numbers compared numerically)")
+    parser.add_argument("--no-sort", action="store_true", help="Keep the parts in the order given")
+    args = parser.parse_args()
+    parts = args.parts if args.no_sort else sorted(args.parts, key=_natural_key)
+    merge_pdfs(parts, args.output_pdf)
+    print(f"Merged {len(parts)} parts into {args.output_pdf}")
@@ -0,0 +1,146 @@
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+
+class Metrics:
+    """
+    Lightweight per-job instrumentation: timed spans and counters.
+
+    Every pipeline stage (extractor, OCR, translator, generator, LaTeX converter)
+    accepts an optional Metrics object and records into it. The CLI dumps the result
+    as a JSON summary, the API server aggregates jobs and exposes them in Prometheus format.
+    """
+
+    def __init__(self, job: Optional[str] = None):
+        self.job = job
+        self.started_at = time.time()
+        self.counters: Dict[str, float] = {}
+        self.spans: Dict[str, Dict[str, float]] = {}
+        # Optional profiling.StageProfiler; when set, spans are also profiled
+        self.profiler = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Picklable so worker processes can hand their metrics back; the lock and profiler stay behind
+        with self._lock:
+            state = self.__dict__.copy()
+        del state["_lock"]
+        state["profiler"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, value: float = 1):
+        """Adds value to the counter called name."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float):
+        """Records one timed occurrence of the span called name."""
+        with self._lock:
+            span = self.spans.setdefault(name, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            span["count"] += 1
+            span["total_seconds"] += seconds
+            span["max_seconds"] = max(span["max_seconds"], seconds)
+
+    @contextmanager
+    def span(self, name: str):
+        """
+        Times the enclosed block and records it under name.
+        Spans may nest; each one is accounted independently.
+        """
+        start = time.perf_counter()
+        try:
+            if self.profiler is not None:
+                with self.profiler.stage(name):
+                    yield
+            else:
+                yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def merge(self, other: "Metrics"):
+        """Folds another Metrics object (e.g. a finished job) into this one."""
+        with other._lock:
+            counters = dict(other.counters)
+            spans = {name: dict(span) for name, span in other.spans.items()}
+        with self._lock:
+            for name, value in counters.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, span in spans.items():
+                mine = self.spans.setdefault(name, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+                mine["count"] += span["count"]
+                mine["total_seconds"] += span["total_seconds"]
+                mine["max_seconds"] = max(mine["max_seconds"], span["max_seconds"])
+
+    def summary(self) -> Dict[str, Any]:
+        """Returns a JSON-serialisable snapshot of everything recorded so far."""
+        with self._lock:
+            return {
+                "job": self.job,
+                "started_at": self.started_at,
+                "wall_seconds": round(time.time() - self.started_at, 3),
+                "counters": dict(sorted(self.counters.items())),
+                "spans": {
+                    name: {
+                        "count": span["count"],
+                        "total_seconds": round(span["total_seconds"], 4),
+                        "max_seconds": round(span["max_seconds"], 4),
+                    }
+                    for name, span in sorted(self.spans.items())
+                },
+            }
+
+    def write_json(self, path: str, extra: Optional[Dict[str, Any]] = None):
+        """Writes the summary (plus any extra top-level keys) to path as JSON."""
+        summary = self.summary()
+        summary.update(extra or {})
+        with open(path, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    def to_prometheus(self, prefix: str = "pdf_translator") -> str:
+        """
+        Renders counters and spans in the Prometheus text exposition format.
+        Counters become `<prefix>_<name>_total`, spans become the
+        `<prefix>_stage_seconds` summary labelled by stage.
+        """
+        with self._lock:
+            counters = dict(self.counters)
+            spans = {name: dict(span) for name, span in self.spans.items()}
+
+        lines = []
+        for name, value in sorted(counters.items()):
+            metric = f"{prefix}_{_metric_name(name)}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {_format_value(value)}")
+
+        if spans:
+            metric = f"{prefix}_stage_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for name, span in sorted(spans.items()):
+                label = name.replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(f'{metric}_sum{{stage="{label}"}} {span["total_seconds"]:.6f}')
+                lines.append(f'{metric}_count{{stage="{label}"}} {span["count"]}')
+            metric = f"{prefix}_stage_seconds_max"
+            lines.append(f"# TYPE {metric} gauge")
+            for name, span in sorted(spans.items()):
+                label = name.replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(f'{metric}{{stage="{label}"}} {span["max_seconds"]:.6f}')
+
+        return "\n".join(lines) + "\n"
+
+
+def _metric_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _format_value(value: float) -> str:
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
@@ -1,7 +1,4 @@
-import pytesseract
-from PIL import Image
 import io
-import fitz
 
 class OCRProcessor:
     def __init__(self):
@@ -12,6 +9,10 @@ class OCRProcessor:
         """
         Extracts text from an image byte stream.
         """
+        # Heavy imports are deferred until the first image actually needs OCR
+        import pytesseract
+        from PIL import Image
+
         try:
             image = Image.open(io.BytesIO(image_bytes))
             text = pytesseract.image_to_string(image)
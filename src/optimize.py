@@ -0,0 +1,78 @@
+import os
+from typing import Optional, Tuple
+try:
+    from .metrics import Metrics
+except ImportError:
+    from metrics import Metrics
+
+# garbage=4: drop unreferenced objects, renumber, and merge duplicate objects and streams.
+# deflate*: compress every uncompressed stream (content, fonts, raw images; already
+# compressed images are left alone). use_objstms: pack small objects into object streams.
+SAVE_OPTIONS = dict(garbage=4, deflate=True, deflate_images=True, deflate_fonts=True, use_objstms=1)
+
+
+def _optimize_doc(doc, metrics: Metrics, subset_fonts: bool = True):
+    if subset_fonts:
+        try:
+            # Keeps only the glyphs the document uses in each embedded font
+            doc.subset_fonts()
+        except Exception as e:
+            # Needs fontTools; an unsupported font should not fail the whole output
+            metrics.incr("font_subset_failures")
+            print(f"Font subsetting skipped: {e}")
+
+
+def _report(before: int, after: int, metrics: Metrics):
+    metrics.incr("optimize_bytes_saved", max(0, before - after))
+    saved = 100 * (before - after) / before if before else 0
+    print(f"Optimized output: {before / 1024:.1f} KB -> {after / 1024:.1f} KB ({saved:.0f}% smaller)")
+
+
+def optimize_pdf(path: str, metrics: Optional[Metrics] = None, subset_fonts: bool = True) -> Tuple[int, int]:
+    """
+    Rewrites the PDF at path in place: font subsetting, stream compression,
+    duplicate-object merging, garbage collection and object-stream packing.
+    Keeps the original if the rewrite is not smaller. Returns (before, after) sizes in bytes.
+    """
+    import fitz
+
+    metrics = metrics or Metrics()
+    before = os.path.getsize(path)
+    tmp_path = path + ".opt.tmp"
+    with metrics.span("optimize"):
+        with fitz.open(path) as doc:
+            _optimize_doc(doc, metrics, subset_fonts)
+            doc.save(tmp_path, **SAVE_OPTIONS)
+        after = os.path.getsize(tmp_path)
+        if after < before:
+            os.replace(tmp_path, path)
+        else:
+            os.remove(tmp_path)
+            after = before
+    _report(before, after, metrics)
+    return before, after
+
+
+def optimize_pdf_bytes(data: bytes, metrics: Optional[Metrics] = None, subset_fonts: bool = True) -> bytes:
+    """In-memory variant of optimize_pdf for the API path; returns the smaller of the two PDFs."""
+    import fitz
+
+    metrics = metrics or Metrics()
+    with metrics.span("optimize"):
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            _optimize_doc(doc, metrics, subset_fonts)
+            optimized = doc.tobytes(**SAVE_OPTIONS)
+    result = optimized if len(optimized) < len(data) else data
+    _report(len(data), len(result), metrics)
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Shrink a PDF in place (fonts, streams, duplicate objects)")
+    parser.add_argument("pdf", nargs="+", help="PDF file(s) to optimize")
+    parser.add_argument("--no-subset", action="store_true", help="Do not subset embedded fonts")
+    args = parser.parse_args()
+    for pdf in args.pdf:
+        optimize_pdf(pdf, subset_fonts=not args.no_subset)
@@ -0,0 +1,298 @@
+import hashlib
+import os
+from typing import Dict, Iterable, Optional
+try:
+    from .metrics import Metrics
+    from .prompts import PROMPT_VERSION
+except ImportError:
+    from metrics import Metrics
+    from prompts import PROMPT_VERSION
+
+# Bump when fingerprints or stored entries change meaning, so old entries stop matching
+PAGE_CACHE_VERSION = "2"
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pdf-hindi-translator", "pages")
+DEFAULT_MAX_MB = 1024
+
+# Pages with less text than this over mostly image are fingerprinted by how they look (see fingerprint)
+_SCAN_MAX_CHARS = 40
+_SCAN_IMAGE_COVERAGE = 0.5
+# Width in pixels of the thumbnail the perceptual hash is computed from
+_HASH_WIDTH = 64
+
+
+def fingerprint(doc, index: int, context: str = "") -> str:
+    """
+    Content fingerprint of page index of an open PyMuPDF document, equal for
+    pages that translate and render the same in any document.
+
+    Pages with a text layer hash their normalized text spans (whitespace
+    collapsed, positions rounded to whole points) with the style they are
+    rendered in (font, size, flags, colour), the raw streams of their images
+    and where those are placed. Scans (little text over a page-sized
+    image) hash a difference hash of a small grayscale thumbnail instead, so
+    two scans of the same page match even when their image streams differ in
+    encoding. context carries whatever else decides the output (engine,
+    models, prompt and render options).
+    """
+    import fitz
+
+    page = doc[index]
+    digest = hashlib.sha256(f"{PAGE_CACHE_VERSION}|{PROMPT_VERSION}|{context}|".encode())
+    digest.update(f"{round(page.rect.width)}x{round(page.rect.height)}|".encode())
+
+    chars = 0
+    for block in page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]:
+        digest.update(("block:" + ",".join(str(round(v)) for v in block["bbox"]) + "\n").encode())
+        for line in block["lines"]:
+            for span in line["spans"]:
+                text = " ".join(span["text"].split())
+                chars += len(text)
+                # Style decides the rendered output as much as the text does (headings, bold, coloured text)
+                digest.update(f"{','.join(str(round(v)) for v in span['bbox'])}|{span['font']}|{round(span['size'], 1)}"
+                              f"|{span['flags']}|{span['color']}:{text}\n".encode())
+
+    placements = page.get_image_info()
+    covered = sum(abs(fitz.Rect(info["bbox"]) & page.rect) for info in placements)
+    if chars < _SCAN_MAX_CHARS and covered >= _SCAN_IMAGE_COVERAGE * (abs(page.rect) or 1.0):
+        digest.update(b"scan|" + _difference_hash(page))
+    else:
+        for info in placements:
+            digest.update(("image:" + ",".join(str(round(v)) for v in info["bbox"]) + "\n").encode())
+        for item in page.get_images(full=True):
+            # The stream as stored: hashing it needs no decoding
+            digest.update(hashlib.sha256(doc.xref_stream_raw(item[0]) or b"").digest())
+    return digest.hexdigest()
+
+
+def _difference_hash(page) -> bytes:
+    """One bit per horizontally adjacent pixel pair of a _HASH_WIDTH-wide grayscale thumbnail: brighter or not."""
+    import fitz
+
+    scale = _HASH_WIDTH / (page.rect.width or 1.0)
+    pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), colorspace=fitz.csGRAY, alpha=False)
+    samples, width, stride = pix.samples, pix.width, pix.stride
+    bits = bytearray()
+    byte = count = 0
+    for y in range(pix.height):
+        row = samples[y * stride:y * stride + width]
+        for x in range(width - 1):
+            byte = (byte << 1) | (row[x] < row[x + 1])
+            count += 1
+            if count == 8:
+                bits.append(byte)
+                byte = count = 0
+    if count:
+        bits.append(byte << (8 - count))
+    return bytes(bits)
+
+
+class PageCache:
+    """
+    Finished output of individual pages, shared across documents and runs and
+    keyed by fingerprint(): a rendered single-page PDF for the block engine, a
+    LaTeX fragment for the vision engine. Boilerplate that recurs across a
+    corpus (cover pages, legal notices, standard appendices) is then extracted,
+    translated and rendered once and spliced into every later document as is.
+
+    Only pages that came out cleanly are stored, never ones with failed
+    translations. Entries are plain files under cache_dir, written atomically,
+    so several processes and machines on a shared volume can use one cache.
+    prune() keeps it under max_bytes by removing the least recently used
+    entries (reads refresh an entry's modification time).
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, metrics: Optional[Metrics] = None,
+                 max_bytes: Optional[int] = DEFAULT_MAX_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.metrics = metrics or Metrics()
+        # None: unbounded
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_env(cls, metrics: Optional[Metrics] = None,
+                 default_dir: Optional[str] = DEFAULT_CACHE_DIR) -> Optional["PageCache"]:
+        """
+        The cache at $PAGE_CACHE_DIR, else at default_dir (None: no cache unless the
+        variable is set), limited to $PAGE_CACHE_MAX_MB. PAGE_CACHE_DIR= (empty) turns it off.
+        """
+        cache_dir = os.environ.get("PAGE_CACHE_DIR", default_dir)
+        if not cache_dir:
+            return None
+        max_mb = float(os.environ.get("PAGE_CACHE_MAX_MB", DEFAULT_MAX_MB))
+        return cls(cache_dir, metrics, int(max_mb * 1024 * 1024) if max_mb > 0 else None)
+
+    def fingerprints(self, doc, page_numbers: Iterable[int], context: str = "") -> Dict[int, str]:
+        with self.metrics.span("page_fingerprints"):
+            return {index: fingerprint(doc, index, context) for index in page_numbers}
+
+    def _path(self, key: str, kind: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{kind}")
+
+    def get(self, key: str, kind: str) -> Optional[bytes]:
+        """The stored entry (kind "pdf" or "tex") or None."""
+        try:
+            with open(self._path(key, kind), "rb") as f:
+                data = f.read()
+        except OSError:
+            self.metrics.incr("page_cache_misses")
+            return None
+        self.metrics.incr("page_cache_hits")
+        self._touch(key, kind)
+        return data
+
+    def has(self, key: str, kind: str) -> bool:
+        return os.path.exists(self._path(key, kind))
+
+    def lookup(self, keys: Dict[int, str], kind: str) -> Dict[int, Optional[str]]:
+        """{page index: its key when an entry of kind exists, else None}."""
+        plan = {index: key if self.has(key, kind) else None for index, key in keys.items()}
+        for key in plan.values():
+            if key:
+                self._touch(key, kind)
+        hits = sum(1 for key in plan.values() if key)
+        self.metrics.incr("page_cache_hits", hits)
+        self.metrics.incr("page_cache_misses", len(plan) - hits)
+        return plan
+
+    def put(self, key: str, kind: str, data: bytes):
+        path = self._path(key, kind)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary name first so a concurrent reader never sees half a file
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self.metrics.incr("page_cache_stores")
+        except OSError as e:
+            print(f"Could not cache page: {e}")
+
+    def _touch(self, key: str, kind: str):
+        # Marks the entry as recently used, so prune() removes it last
+        try:
+            os.utime(self._path(key, kind))
+        except OSError:
+            pass
+
+    def prune(self):
+        """Removes least recently used entries until the cache fits in max_bytes."""
+        if self.max_bytes is None:
+            return
+        entries = []
+        total = 0
+        with self.metrics.span("page_cache_prune"):
+            for root, _, names in os.walk(self.cache_dir):
+                for name in names:
+                    if name.endswith(".tmp"):
+                        # Another process is still writing it
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            entries.sort()
+            for _, size, path in entries:
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                self.metrics.incr("page_cache_evictions")
+                if total <= self.max_bytes:
+                    break
+
+    def splice(self, doc, rendered, plan: Dict[int, Optional[str]]):
+        """
+        Builds the output in page order into doc (an empty PyMuPDF document): cached
+        pages from plan ({page index: cache key of a hit, or None}) and the next
+        page of rendered (one page per miss, in order) for the rest.
+        """
+        import fitz
+
+        position = 0
+        for index in sorted(plan):
+            key = plan[index]
+            if key is None:
+                doc.insert_pdf(rendered, from_page=position, to_page=position)
+                position += 1
+                continue
+            with fitz.open(self._path(key, "pdf")) as cached:
+                doc.insert_pdf(cached)
+        return doc
+
+    def store_pages(self, rendered, keys: Dict[int, str], clean: Dict[int, bool]):
+        """Stores each page of rendered (one per key, in page order) whose clean flag is set."""
+        import fitz
+
+        for position, index in enumerate(sorted(keys)):
+            if not clean.get(index) or self.has(keys[index], "pdf"):
+                continue
+            single = fitz.open()
+            single.insert_pdf(rendered, from_page=position, to_page=position)
+            self.put(keys[index], "pdf", single.tobytes(garbage=4, deflate=True))
+            single.close()
+
+
+def finish_output(page_cache: PageCache, output_pdf: str, rendered_path: Optional[str], keys: Dict[int, str],
+                  plan: Dict[int, Optional[str]], clean: Dict[int, bool], optimize: bool = False):
+    """
+    Block engine: stores the freshly rendered pages (rendered_path, one page per
+    miss in plan) and, when any page came from the cache, writes output_pdf as the
+    spliced document and removes rendered_path.
+    """
+    import fitz
+
+    misses = {index: keys[index] for index, key in plan.items() if key is None}
+    rendered = fitz.open(rendered_path) if misses else None
+    try:
+        if rendered is not None:
+            page_cache.store_pages(rendered, misses, clean)
+            page_cache.prune()
+        if len(misses) == len(plan):
+            return
+        with page_cache.metrics.span("splice"), fitz.open() as output:
+            page_cache.splice(output, rendered, plan)
+            # garbage=4 merges the fonts every cached page brought along
+            output.save(output_pdf, garbage=4, deflate=True)
+    finally:
+        if rendered is not None:
+            rendered.close()
+    if rendered_path and rendered_path != output_pdf:
+        os.remove(rendered_path)
+    if optimize:
+        try:
+            from .optimize import optimize_pdf
+        except ImportError:
+            from optimize import optimize_pdf
+        optimize_pdf(output_pdf, page_cache.metrics)
+
+
+def block_context(models: Dict[str, str], layout: bool, use_ocr: bool, image_dpi: Optional[float],
+                  scan_dpi: Optional[int] = None) -> str:
+    """What besides page content decides a block-engine page's output."""
+    # The resolution PageScanner will actually use, so changing $SCAN_DPI misses too
+    scan_dpi = scan_dpi or int(os.environ.get("SCAN_DPI", 300))
+    return (f"block|{sorted(models.items())}|layout={layout}|ocr={use_ocr}|image_dpi={image_dpi}"
+            f"|scan_dpi={scan_dpi}")
+
+
+def clean_pages(pages_data, failed_texts) -> Dict[int, bool]:
+    """
+    {0-based page index: True when none of the page's segments failed to translate}.
+    failed_texts are the segments kept in English (translator.failures, refusals
+    included); only clean pages may be cached, or a page left untranslated would
+    be reused as is on every later run.
+    """
+    failed = set(failed_texts)
+    clean = {}
+    for page in pages_data:
+        texts = [block.get("segment") for block in page["blocks"]]
+        texts += [image.get("ocr_text") for image in page["images"]]
+        clean[page["page"] - 1] = not any(text in failed for text in texts if text)
+    return clean
+
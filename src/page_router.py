@@ -0,0 +1,282 @@
+import os
+import re
+import shutil
+import tempfile
+from typing import Any, Dict, List, Optional
+try:
+    from .classifier import MATH_CHARS
+    from .metrics import Metrics
+    from .pages import contiguous_runs
+    from .routing import RoutingPolicy
+except ImportError:
+    from classifier import MATH_CHARS
+    from metrics import Metrics
+    from pages import contiguous_runs
+    from routing import RoutingPolicy
+
+ENGINES = ("block", "vision")
+
+# TeX and OpenType math fonts: glyphs set in these are formulas even when they look like letters
+_MATH_FONT_RE = re.compile(r"CMMI|CMSY|CMEX|MSAM|MSBM|STIX|Math|Symbol|Euler|rsfs", re.IGNORECASE)
+
+
+def page_features(page) -> Dict[str, Any]:
+    """
+    Cheap layout statistics of one PyMuPDF page, read from its text layer and
+    image placements (no rendering):
+    chars, text_coverage and image_coverage (fractions of the page area),
+    math_ratio (share of characters that are math symbols or set in a math font).
+    """
+    import fitz
+
+    area = abs(page.rect) or 1.0
+    chars = math_chars = 0
+    text_area = 0.0
+    for block in page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]:
+        for line in block.get("lines", ()):
+            for span in line["spans"]:
+                text = span["text"].strip()
+                if not text:
+                    continue
+                chars += len(text)
+                text_area += abs(fitz.Rect(span["bbox"]))
+                if _MATH_FONT_RE.search(span["font"]):
+                    math_chars += len(text)
+                else:
+                    math_chars += sum(1 for char in text if char in MATH_CHARS)
+
+    image_area = 0.0
+    for info in page.get_image_info():
+        image_area += abs(fitz.Rect(info["bbox"]) & page.rect)
+
+    return {
+        "chars": chars,
+        "text_coverage": min(text_area / area, 1.0),
+        "image_coverage": min(image_area / area, 1.0),
+        "math_ratio": math_chars / chars if chars else 0.0,
+    }
+
+
+class PageRouter:
+    """
+    Picks the cheaper engine that can handle each page.
+
+    The block pipeline (main.py) translates the text layer in place and costs a
+    share of a packed text request per page; the vision pipeline (latex_converter.py)
+    sends a rendered page image and gets LaTeX back, which is several times the
+    tokens and latency. Only pages the block pipeline can't reproduce go to vision:
+    scans (little or no text layer over a page-sized image) and math, whose
+    formulas are lost when spans are translated one by one. Everything else,
+    including empty pages and pages with ordinary figures, stays on the block engine.
+    """
+
+    def __init__(self, min_text_chars: int = 40, scan_image_coverage: float = 0.5,
+                 math_ratio: float = 0.03, scans_to_vision: bool = True):
+        self.min_text_chars = min_text_chars
+        # With OCR on, the block engine reads scans itself (scan.py)
+        self.scans_to_vision = scans_to_vision
+        self.scan_image_coverage = scan_image_coverage
+        self.math_ratio = math_ratio
+
+    def engine(self, features: Dict[str, Any]) -> str:
+        if (self.scans_to_vision and features["chars"] < self.min_text_chars
+                and features["image_coverage"] >= self.scan_image_coverage):
+            return "vision"
+        if features["math_ratio"] > self.math_ratio:
+            return "vision"
+        return "block"
+
+    def plan(self, doc, page_numbers, metrics: Optional[Metrics] = None) -> Dict[str, List[int]]:
+        """{"block": [...], "vision": [...]}: the 0-based page_numbers split by engine."""
+        metrics = metrics or Metrics()
+        plan = {engine: [] for engine in ENGINES}
+        with metrics.span("route_pages"):
+            for index in page_numbers:
+                plan[self.engine(page_features(doc[index]))].append(index)
+        metrics.incr("pages_block", len(plan["block"]))
+        metrics.incr("pages_vision", len(plan["vision"]))
+        # Every block page is a page image the vision model is not asked about
+        metrics.incr("vision_calls_avoided", len(plan["block"]))
+        return plan
+
+
+class HybridConverter:
+    """
+    Converts a document page by page on the engine PageRouter picks and stitches
+    the results back together in page order.
+
+    Block pages are extracted, translated and rendered together, so repeated
+    segments across them are still translated once; vision pages are converted
+    one contiguous run at a time, because a LaTeX page can overflow onto several
+    output pages and only whole runs can be placed between block pages.
+
+    Same interface as LatexConverter (generate_pdf, generate_pdf_bytes, failures),
+    so the API server can use either.
+    """
+
+    def __init__(self, api_key: str = None, metrics: Optional[Metrics] = None, hedge: bool = False,
+                 optimize: bool = False, routing: Optional[RoutingPolicy] = None,
+                 router: Optional[PageRouter] = None, use_ocr: bool = False, layout: bool = True,
+                 budget=None, page_cache=None):
+        try:
+            from .latex_converter import LatexConverter
+            from .translator import Translator
+        except ImportError:
+            from latex_converter import LatexConverter
+            from translator import Translator
+
+        self.metrics = metrics or Metrics()
+        self.optimize = optimize
+        self.use_ocr = use_ocr
+        self.layout = layout
+        # Optional memory.MemoryBudget shared by both engines
+        self.budget = budget
+        self.page_router = router or PageRouter(scans_to_vision=not use_ocr)
+        routing = routing or RoutingPolicy.from_spec()
+        self.translator = Translator(api_key, metrics=self.metrics, hedge=hedge, routing=routing)
+        # Optional page_cache.PageCache for the vision pages
+        self.vision = LatexConverter(api_key, metrics=self.metrics, hedge=hedge, routing=routing, budget=budget,
+                                     page_cache=page_cache)
+        # (page_num, reason) for block pages with segments left in English
+        self.block_failures = []
+
+    @property
+    def failures(self):
+        """
+        (page_num, reason) for every vision page that could not be converted and every block
+        page with segments kept in English (see translator.failures), in page order.
+        """
+        return sorted(self.vision.failures + self.block_failures)
+
+    def generate_pdf(self, input_pdf: str, output_pdf: str, max_pages: Optional[int] = None,
+                     page_numbers: Optional[List[int]] = None):
+        """
+        Converts the PDF at input_pdf, read from disk as pages are needed rather than
+        loaded whole: the API server sends uploads too large for memory this way.
+        """
+        import fitz
+
+        if self.budget:
+            self.budget.admit(os.path.getsize(input_pdf), copies=1)
+        try:
+            doc = fitz.open(input_pdf)
+        except Exception as e:
+            print(f"Error reading PDF: {e}")
+            return
+        try:
+            output_bytes = self._convert(doc, input_pdf, max_pages, 200, page_numbers)
+        finally:
+            doc.close()
+        output_dir = os.path.dirname(output_pdf)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(output_pdf, "wb") as f:
+            f.write(output_bytes)
+        self.metrics.incr("bytes_written", len(output_bytes))
+        print(f"Done! Output saved to {output_pdf}")
+
+    def generate_pdf_bytes(self, pdf_bytes: bytes, max_pages: Optional[int] = None, dpi: int = 200,
+                           page_numbers: Optional[List[int]] = None) -> Optional[bytes]:
+        import fitz
+
+        if self.budget:
+            # The input is already in memory; the parsed document is the other copy
+            self.budget.admit(len(pdf_bytes), copies=1)
+        try:
+            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        except Exception as e:
+            print(f"Error reading PDF: {e}")
+            return None
+        try:
+            output_bytes = self._convert(doc, pdf_bytes, max_pages, dpi, page_numbers)
+        finally:
+            doc.close()
+        self.metrics.incr("bytes_returned", len(output_bytes))
+        return output_bytes
+
+    def _convert(self, doc, source, max_pages: Optional[int], dpi: int,
+                 page_numbers: Optional[List[int]]) -> bytes:
+        """
+        Routes, converts and assembles the pages of the open doc. source is what the
+        block pipeline extracts from: the same document as a path or as bytes.
+        """
+        import fitz
+
+        work_dir = tempfile.mkdtemp(prefix="hybrid-")
+        try:
+            if page_numbers is None:
+                page_numbers = range(min(len(doc), max_pages) if max_pages else len(doc))
+            plan = self.page_router.plan(doc, page_numbers, self.metrics)
+            print(f"Routing: {len(plan['block'])} page(s) on the text layer, {len(plan['vision'])} page(s) via page images")
+            block_pdf = self._render_block_pages(source, plan["block"], work_dir)
+            with self.metrics.span("assemble"):
+                output = fitz.open()
+                block_position = 0
+                for engine, first, last in self._runs(plan):
+                    if engine == "block":
+                        count = last - first + 1
+                        output.insert_pdf(block_pdf, from_page=block_position, to_page=block_position + count - 1)
+                        block_position += count
+                    else:
+                        with fitz.open(stream=self.vision.convert_document(doc, range(first, last + 1), dpi),
+                                       filetype="pdf") as part:
+                            output.insert_pdf(part)
+                if block_pdf is not None:
+                    block_pdf.close()
+                # garbage=4 merges the fonts and images both engines embedded separately
+                output_bytes = output.tobytes(garbage=4, deflate=True)
+                output.close()
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        if self.optimize:
+            try:
+                from .optimize import optimize_pdf_bytes
+            except ImportError:
+                from optimize import optimize_pdf_bytes
+            output_bytes = optimize_pdf_bytes(output_bytes, self.metrics)
+        if self.failures:
+            print(f"⚠️  {len(self.failures)} page(s) could not be converted: {', '.join(str(page) for page, _ in self.failures)}")
+        return output_bytes
+
+    def _runs(self, plan: Dict[str, List[int]]):
+        """(engine, first, last) for each contiguous run of pages on one engine, in page order."""
+        runs = [(engine, first, last) for engine in ENGINES for first, last in contiguous_runs(plan[engine])]
+        return sorted(runs, key=lambda run: run[1])
+
+    def _render_block_pages(self, source, pages: List[int], work_dir: str):
+        """
+        Runs the block pipeline over pages of source (a path or the PDF's bytes);
+        returns the open rendered PDF (one page per input page) or None.
+        """
+        if not pages:
+            return None
+        import fitz
+        try:
+            from .generator import PDFGenerator
+            from .page_cache import clean_pages
+            from .pipeline import apply_translations, collect_segments, extract_pages, translate_segments
+        except ImportError:
+            from generator import PDFGenerator
+            from page_cache import clean_pages
+            from pipeline import apply_translations, collect_segments, extract_pages, translate_segments
+
+        pages_data = extract_pages(source, None, self.use_ocr, self.metrics, page_numbers=pages, budget=self.budget)
+        sorted_texts, normalizer = collect_segments(pages_data, self.metrics, layout=self.layout)
+        failed_before = len(self.translator.failures)
+        translation_map = translate_segments(self.translator, sorted_texts, self.metrics)
+        failed_texts = {text for text, _ in self.translator.failures[failed_before:]}
+        if failed_texts:
+            for index, clean in sorted(clean_pages(pages_data, failed_texts).items()):
+                if not clean:
+                    self.block_failures.append((index + 1, "segments kept in English"))
+        if self.budget:
+            translation_map = self.budget.spill_map(translation_map)
+        apply_translations(pages_data, translation_map, normalizer)
+        block_path = os.path.join(work_dir, "block.pdf")
+        render_metrics = Metrics()
+        PDFGenerator(block_path, metrics=render_metrics).generate(pages_data, translation_map)
+        # Only the assembled document counts as output
+        render_metrics.counters.pop("bytes_written", None)
+        self.metrics.merge(render_metrics)
+        return fitz.open(block_path)
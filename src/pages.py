@@ -0,0 +1,96 @@
+import re
+from typing import List, Optional, Tuple
+
+_RANGE_RE = re.compile(r"^\s*(\d*)\s*(-?)\s*(\d*)\s*$")
+
+
+def page_spans(spec: str) -> List[Tuple[int, Optional[int]]]:
+    """
+    Syntax check of a 1-based page selection: "1-10,25,40-" -> [(1, 10), (25, 25), (40, None)].
+    An open end is None. Raises ValueError for malformed parts.
+    """
+    spans = []
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        match = _RANGE_RE.match(part)
+        if not match or not (match.group(1) or match.group(3)):
+            raise ValueError(f"Invalid page range {part.strip()!r} (expected e.g. 1-10,25,40-)")
+        first, dash, last = match.groups()
+        start = int(first) if first else 1
+        end = (int(last) if last else None) if dash else start
+        if start < 1 or (end is not None and end < start):
+            raise ValueError(f"Invalid page range {part.strip()!r}")
+        spans.append((start, end))
+    if not spans:
+        raise ValueError(f"Empty page range {spec!r}")
+    return spans
+
+
+def parse_page_ranges(spec: str, page_count: int) -> List[int]:
+    """
+    Parses a 1-based page selection like "1-10,25,40-" (or "-5") into sorted,
+    unique 0-based page indexes, clipped to the document.
+    Raises ValueError for malformed or empty selections.
+    """
+    pages = set()
+    for start, end in page_spans(spec):
+        pages.update(range(start - 1, min(end or page_count, page_count)))
+    if not pages:
+        raise ValueError(f"Page range {spec!r} selects no pages (document has {page_count})")
+    return sorted(pages)
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """Parses "i/n" (1-based) into (i, n)."""
+    match = re.match(r"^\s*(\d+)\s*/\s*(\d+)\s*$", spec or "")
+    if not match:
+        raise ValueError(f"Invalid shard {spec!r} (expected i/n, e.g. 2/4)")
+    index, count = int(match.group(1)), int(match.group(2))
+    if not 1 <= index <= count:
+        raise ValueError(f"Invalid shard {spec!r}: i must be between 1 and n")
+    return index, count
+
+
+def shard_pages(pages: List[int], index: int, count: int) -> List[int]:
+    """
+    The index-th of count contiguous, near-equal slices of pages, so that shard
+    outputs concatenated in shard order are the whole selection in page order.
+    """
+    size, extra = divmod(len(pages), count)
+    start = (index - 1) * size + min(index - 1, extra)
+    return pages[start:start + size + (1 if index <= extra else 0)]
+
+
+def select_pages(page_count: int, page_range: Optional[str] = None, max_pages: Optional[int] = None,
+                 shard: Optional[str] = None) -> Optional[List[int]]:
+    """
+    Combines --page-range, --pages and --shard into the 0-based pages to process.
+    Returns None when nothing restricts the selection (the whole document).
+    """
+    if not (page_range or max_pages or shard):
+        return None
+    pages = parse_page_ranges(page_range, page_count) if page_range else list(range(page_count))
+    if max_pages:
+        pages = [page for page in pages if page < max_pages]
+    if shard:
+        pages = shard_pages(pages, *parse_shard(shard))
+    return pages
+
+
+def page_count(pdf_path: str) -> int:
+    import fitz
+
+    with fitz.open(pdf_path) as doc:
+        return len(doc)
+
+
+def contiguous_runs(pages: List[int]) -> List[Tuple[int, int]]:
+    """[0, 1, 2, 5, 6] -> [(0, 2), (5, 6)]: inclusive runs, for tools that take first/last page."""
+    runs = []
+    for page in pages:
+        if runs and page == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], page)
+        else:
+            runs.append((page, page))
+    return runs
@@ -0,0 +1,125 @@
+try:
+    from .metrics import Metrics
+except ImportError:
+    from metrics import Metrics
+# Stage helpers shared by the single-document CLI (main.py) and batch mode (batch.py).
+# Heavy modules are imported inside each function, as in main.py.
+
+def extract_pages(input_pdf, max_pages, use_ocr, metrics: Metrics, page_numbers=None, scan_dpi=None,
+                  budget=None):
+    """
+    Extracted pages of input_pdf. With a memory.MemoryBudget they come back as a
+    PageStore, which moves pages to disk once the budget runs low.
+    """
+    try:
+        from .extractor import PDFExtractor
+    except ImportError:
+        from extractor import PDFExtractor
+
+    print("Extracting text and layout...")
+    with metrics.span("extract"):
+        extractor = PDFExtractor(input_pdf, use_ocr=use_ocr, metrics=metrics, scan_dpi=scan_dpi)
+        pages_data = extractor.extract_text_content(max_pages=max_pages, page_numbers=page_numbers,
+                                                    into=budget.pages() if budget else None)
+        extractor.close()
+    print(f"Extracted {len(pages_data)} pages.")
+    return pages_data
+
+def collect_segments(pages_data, metrics: Metrics, layout: bool = True):
+    """
+    Aggregates block text, merges paragraph fragments (unless layout is False),
+    templates repeated segments and returns
+    (sorted unique segments to translate, SegmentNormalizer used).
+    """
+    try:
+        from .segments import SegmentNormalizer
+    except ImportError:
+        from segments import SegmentNormalizer
+
+    print("Preparing text for translation (Block Level)...")
+    with metrics.span("collect"):
+        for page in pages_data:
+            for block in page["blocks"]:
+                # Aggregate text from all lines/spans in the block
+                block_text_parts = []
+                for line in block["lines"]:
+                    for span in line["spans"]:
+                        block_text_parts.append(span["text"])
+            
+                full_block_text = " ".join(block_text_parts).strip()
+                if full_block_text:
+                    # Store it back in the block for easier access later? 
+                    # No, we just use the map. But we need to reconstruct the key exactly.
+                    # To be safe, let's store the aggregated text in the block structure itself in memory
+                    block["aggregated_text"] = full_block_text
+
+        if layout:
+            # Reading order and paragraph reconstruction: one segment per paragraph, not per block
+            try:
+                from .layout import LayoutAnalyzer
+            except ImportError:
+                from layout import LayoutAnalyzer
+            with metrics.span("layout"):
+                layout_stats = LayoutAnalyzer().annotate(pages_data)
+            metrics.incr("paragraphs_merged", layout_stats["paragraphs"])
+            metrics.incr("blocks_merged", layout_stats["merged_blocks"])
+
+        # Running headers/footers and other number-only variants become one template each
+        normalizer = SegmentNormalizer()
+        segment_stats = normalizer.annotate(pages_data)
+        metrics.incr("templated_blocks", segment_stats["templated_blocks"])
+
+        unique_texts = set()
+        for page in pages_data:
+            for block in page["blocks"]:
+                segment = block.get("segment")
+                if segment:
+                    if segment in unique_texts:
+                        metrics.incr("cache_hits")
+                    unique_texts.add(segment)
+
+            # Add OCR text if any
+            for img in page["images"]:
+                if img.get("ocr_text"):
+                    unique_texts.add(img["ocr_text"])
+
+    sorted_texts = sorted(list(unique_texts))
+    metrics.incr("segments", len(sorted_texts))
+    print(f"Found {len(sorted_texts)} blocks to translate.")
+    return sorted_texts, normalizer
+
+def apply_translations(pages_data, translation_map, normalizer):
+    """
+    Fills templated blocks from their translated templates and splits translated
+    paragraphs back into the boxes they were merged from (block["translated_text"]).
+    """
+    try:
+        from .layout import LayoutAnalyzer
+    except ImportError:
+        from layout import LayoutAnalyzer
+
+    normalizer.expand(pages_data, translation_map)
+    LayoutAnalyzer().distribute(pages_data, translation_map)
+
+def translate_segments(translator, sorted_texts, metrics: Metrics):
+    """Translates sorted_texts with translator and returns {original: translated}."""
+    print("Translating to Hinglish (this may take a while)...")
+    # Segments are packed into requests by an adaptive token budget (see scheduler.py)
+    def report_progress(done, total):
+        print(f"Translating {done}/{total}... (batch budget tokens: {translator.router.budgets()})")
+
+    with metrics.span("translate"):
+        translated = translator.translate_batch(sorted_texts, progress=report_progress)
+    translation_map = dict(zip(sorted_texts, translated))
+    try:
+        from .routing import token_report
+    except ImportError:
+        from routing import token_report
+    report = token_report(metrics)
+    if report:
+        print(report)
+    if translator.failures:
+        print(f"⚠️  {len(translator.failures)} segment(s) could not be translated and were kept in English:")
+        for text, reason in translator.failures[:10]:
+            print(f"   - {text[:60]!r}: {reason}")
+    return translation_map
@@ -0,0 +1,181 @@
+import cProfile
+import io
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class StageProfiler:
+    """
+    Captures a CPU profile per pipeline stage, optionally with tracemalloc allocation tracking.
+
+    Hook it into a Metrics object (`metrics.profiler = StageProfiler(...)`) and every
+    outermost `metrics.span(...)` becomes a profiled stage. Nested spans are folded into
+    the stage that encloses them, since only one cProfile can be active at a time.
+    Only the calling thread is profiled.
+
+    write_reports() produces, per stage:
+      - <stage>.prof      pstats dump (snakeviz, flameprof, `python -m pstats`)
+      - <stage>.folded    collapsed stacks (flamegraph.pl, speedscope, inferno)
+    plus all_stages.folded (stage name as the root frame) and a top-N hotspot summary.
+    """
+
+    def __init__(self, output_dir: str, trace_memory: bool = False, top_n: int = 25,
+                 skip: Tuple[str, ...] = ("total",)):
+        self.output_dir = output_dir
+        self.trace_memory = trace_memory
+        self.top_n = top_n
+        self.skip = skip
+        self._active: Optional[str] = None
+        self._order: List[str] = []
+        self._profiles: Dict[str, List[cProfile.Profile]] = {}
+        self._wall: Dict[str, float] = {}
+        self._memory: Dict[str, Dict] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Profiles the enclosed block as stage name, unless another stage is already running."""
+        if self._active is not None or name in self.skip:
+            yield
+            return
+
+        self._active = name
+        if name not in self._profiles:
+            self._order.append(name)
+            self._profiles[name] = []
+
+        before = None
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(25)
+            tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self._wall[name] = self._wall.get(name, 0.0) + time.perf_counter() - start
+            self._profiles[name].append(profile)
+            if before is not None:
+                self._record_memory(name, before)
+            self._active = None
+
+    def _record_memory(self, name: str, before: tracemalloc.Snapshot):
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        diffs = after.compare_to(before, "lineno")
+        memory = self._memory.setdefault(name, {"peak_bytes": 0, "top": []})
+        memory["peak_bytes"] = max(memory["peak_bytes"], peak)
+        memory["top"].extend(diff for diff in diffs if diff.size_diff > 0)
+
+    def stats(self, name: str) -> pstats.Stats:
+        """Returns the combined pstats for every run of stage name."""
+        profiles = self._profiles[name]
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+    def write_reports(self) -> List[str]:
+        """Writes .prof, .folded and summary files into output_dir and returns their paths."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        written = []
+        combined = []
+        summary = io.StringIO()
+
+        for name in self._order:
+            stats = self.stats(name)
+            slug = name.replace(os.sep, "_").replace(" ", "_")
+
+            prof_path = os.path.join(self.output_dir, f"{slug}.prof")
+            stats.dump_stats(prof_path)
+            written.append(prof_path)
+
+            folded = folded_stacks(stats)
+            folded_path = os.path.join(self.output_dir, f"{slug}.folded")
+            with open(folded_path, "w") as f:
+                f.writelines(f"{stack} {value}\n" for stack, value in folded)
+            written.append(folded_path)
+            combined.extend((f"{slug};{stack}", value) for stack, value in folded)
+
+            summary.write(f"=== Stage: {name} ({self._wall[name]:.3f}s wall, {stats.total_tt:.3f}s profiled) ===\n")
+            stats.stream = summary
+            stats.sort_stats("tottime").print_stats(self.top_n)
+            if name in self._memory:
+                memory = self._memory[name]
+                summary.write(f"Peak traced memory: {memory['peak_bytes'] / 1024 / 1024:.1f} MiB\n")
+                summary.write(f"Top {self.top_n} allocation sites retained by this stage:\n")
+                top = sorted(memory["top"], key=lambda diff: diff.size_diff, reverse=True)
+                for diff in top[:self.top_n]:
+                    frame = diff.traceback[0]
+                    summary.write(f"  {diff.size_diff / 1024:10.1f} KiB  {diff.count_diff:+8d} blocks  {frame.filename}:{frame.lineno}\n")
+            summary.write("\n")
+
+        combined_path = os.path.join(self.output_dir, "all_stages.folded")
+        with open(combined_path, "w") as f:
+            f.writelines(f"{stack} {value}\n" for stack, value in combined)
+        written.append(combined_path)
+
+        summary_path = os.path.join(self.output_dir, "hotspots.txt")
+        with open(summary_path, "w") as f:
+            f.write(summary.getvalue())
+        written.append(summary_path)
+
+        return written
+
+
+def folded_stacks(stats: pstats.Stats, max_depth: int = 48, min_share: float = 0.0005) -> List[Tuple[str, int]]:
+    """
+    Converts pstats into collapsed-stack lines (`a;b;c <microseconds>`).
+
+    cProfile only records caller->callee edges, so deeper stacks are reconstructed by
+    splitting each function's self time across its callers in proportion to the
+    cumulative time each caller spent in it. Branches below min_share of the total
+    are pruned to keep the output small.
+    """
+    raw = stats.stats
+    total = sum(entry[2] for entry in raw.values()) or 1.0
+    threshold = total * min_share
+    folded: Dict[str, float] = {}
+
+    def walk(func, weight, path, depth):
+        callers = raw.get(func, (0, 0, 0, 0, {}))[4]
+        upstream = {caller: edge for caller, edge in callers.items() if caller not in path}
+        share_total = sum(edge[3] for edge in upstream.values())
+        if not upstream or depth >= max_depth or share_total <= 0:
+            stack = ";".join(_frame_label(f) for f in reversed(path))
+            folded[stack] = folded.get(stack, 0.0) + weight
+            return
+        for caller, edge in upstream.items():
+            share = weight * edge[3] / share_total
+            if share >= threshold:
+                walk(caller, share, path + (caller,), depth + 1)
+
+    for func, (_, _, tottime, _, callers) in raw.items():
+        if tottime < threshold:
+            continue
+        if not callers:
+            walk(func, tottime, (func,), 0)
+            continue
+        # The first hop is exact: the edge records the callee's self time per caller
+        for caller, edge in callers.items():
+            if caller != func and edge[2] >= threshold:
+                walk(caller, edge[2], (func, caller), 1)
+
+    return [(stack, int(seconds * 1_000_000)) for stack, seconds in sorted(folded.items()) if seconds > 0]
+
+
+def _frame_label(func) -> str:
+    filename, lineno, name = func
+    if filename == "~":
+        label = name
+    else:
+        label = f"{name} ({os.path.basename(filename)}:{lineno})"
+    return label.replace(";", ",")
@@ -0,0 +1,220 @@
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Optional
+
+try:
+    from .metrics import Metrics
+except ImportError:
+    from metrics import Metrics
+
+
+class ModelCallError(Exception):
+    """A model call failed for good: retries exhausted or the error is not retryable."""
+
+    def __init__(self, message: str, attempts: int = 0, last_error: Optional[BaseException] = None):
+        super().__init__(message)
+        self.attempts = attempts
+        self.last_error = last_error
+
+
+# Errors that will fail the same way on every attempt (bad request, bad key, unknown model)
+NON_RETRYABLE = {"InvalidArgument", "PermissionDenied", "Unauthenticated", "NotFound", "BadRequest",
+                 "ValueError", "TypeError", "KeyError"}
+NON_RETRYABLE_CODES = {400, 401, 403, 404}
+
+_RETRY_HINT_PATTERNS = [
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)", re.IGNORECASE),
+    re.compile(r"retry in\s*([\d.]+)\s*s", re.IGNORECASE),
+    re.compile(r"retry[- ]after:?\s*([\d.]+)", re.IGNORECASE),
+]
+
+
+def retry_hint(error: BaseException) -> Optional[float]:
+    """Returns the server-suggested wait in seconds, if the error carries one."""
+    delay = getattr(error, "retry_delay", None)
+    if delay is not None:
+        if hasattr(delay, "total_seconds"):  # timedelta
+            return delay.total_seconds()
+        if hasattr(delay, "seconds"):  # protobuf Duration
+            return float(delay.seconds)
+        try:
+            return float(delay)
+        except (TypeError, ValueError):
+            pass
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers and headers.get("Retry-After", "").replace(".", "", 1).isdigit():
+        return float(headers["Retry-After"])
+    message = str(error)
+    for pattern in _RETRY_HINT_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def is_retryable(error: BaseException) -> bool:
+    if type(error).__name__ in NON_RETRYABLE:
+        return False
+    code = getattr(error, "code", None)
+    code = getattr(code, "value", code)
+    return not (isinstance(code, int) and code in NON_RETRYABLE_CODES)
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter; a server retry hint takes precedence."""
+
+    def __init__(self, max_attempts: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, hint: Optional[float] = None) -> float:
+        if hint is not None:
+            # Honour the hint, plus a little jitter so parallel workers don't retry in lockstep
+            return min(self.max_delay, hint) + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Tracks the outcome of recent calls. When the failure rate over the window crosses
+    the threshold the circuit opens and before_call() pauses callers for the cooldown,
+    after which a single trial call decides whether to close it again.
+    """
+
+    def __init__(self, window: int = 20, failure_threshold: float = 0.5, min_calls: int = 5,
+                 cooldown: float = 30.0, metrics: Optional[Metrics] = None):
+        self.window = deque(maxlen=window)
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.metrics = metrics or Metrics()
+        self.state = "closed"
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Blocks while the circuit is open."""
+        while True:
+            with self._lock:
+                if self.state != "open":
+                    return
+                remaining = self.opened_at + self.cooldown - time.monotonic()
+                if remaining <= 0:
+                    self.state = "half_open"
+                    return
+            self.metrics.incr("circuit_wait_seconds", remaining)
+            time.sleep(remaining)
+
+    def record(self, ok: bool):
+        with self._lock:
+            if self.state == "half_open":
+                if ok:
+                    self.state = "closed"
+                    self.window.clear()
+                else:
+                    self._open()
+                return
+            self.window.append(ok)
+            failures = self.window.count(False)
+            if (len(self.window) >= self.min_calls and self.state == "closed"
+                    and failures / len(self.window) >= self.failure_threshold):
+                self._open()
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.metrics.incr("circuit_opened")
+        print(f"⚠️  Model error rate too high, pausing requests for {self.cooldown:.0f}s")
+
+
+class ResilientCaller:
+    """
+    Shared wrapper for every model call: retries with backoff, an optional hedged
+    duplicate request for tail-latency outliers, and a circuit breaker.
+    Failures surface as ModelCallError instead of being swallowed.
+
+    hedge=True sends a duplicate once a call has run longer than the observed
+    hedge_quantile latency (after a few samples), and takes whichever answer comes first.
+    """
+
+    _executor: Optional[ThreadPoolExecutor] = None
+    _executor_lock = threading.Lock()
+
+    def __init__(self, retry: Optional[RetryPolicy] = None, breaker: Optional[CircuitBreaker] = None,
+                 hedge: bool = False, hedge_quantile: float = 0.95, metrics: Optional[Metrics] = None):
+        self.metrics = metrics or Metrics()
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker(metrics=self.metrics)
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self._latencies = deque(maxlen=100)
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        last_error = None
+        for attempt in range(self.retry.max_attempts):
+            self.breaker.before_call()
+            start = time.perf_counter()
+            try:
+                result = self._invoke(fn, args, kwargs)
+            except Exception as e:
+                last_error = e
+                self.breaker.record(False)
+                self.metrics.incr("api_errors")
+                if not is_retryable(e) or attempt == self.retry.max_attempts - 1:
+                    break
+                delay = self.retry.delay(attempt, retry_hint(e))
+                self.metrics.incr("retries")
+                self.metrics.incr("backoff_seconds", delay)
+                time.sleep(delay)
+                continue
+            self._latencies.append(time.perf_counter() - start)
+            self.breaker.record(True)
+            return result
+
+        raise ModelCallError(f"Model call failed after {attempt + 1} attempt(s): {last_error}",
+                             attempts=attempt + 1, last_error=last_error)
+
+    def hedge_delay(self) -> Optional[float]:
+        if not self.hedge or len(self._latencies) < 10:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.hedge_quantile))]
+
+    def _invoke(self, fn, args, kwargs):
+        delay = self.hedge_delay()
+        if delay is None:
+            return fn(*args, **kwargs)
+
+        executor = self._shared_executor()
+        primary = executor.submit(fn, *args, **kwargs)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        self.metrics.incr("hedged_requests")
+        self.metrics.incr("api_requests")
+        hedged = executor.submit(fn, *args, **kwargs)
+        pending = {primary, hedged}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedged:
+                        self.metrics.incr("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    @classmethod
+    def _shared_executor(cls) -> ThreadPoolExecutor:
+        with cls._executor_lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedge")
+            return cls._executor
@@ -0,0 +1,221 @@
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+try:
+    from .metrics import Metrics
+    from .prompts import inline
+    from .resilience import ResilientCaller
+    from .scheduler import AdaptiveBatcher, estimate_tokens
+except ImportError:
+    from metrics import Metrics
+    from prompts import inline
+    from resilience import ResilientCaller
+    from scheduler import AdaptiveBatcher, estimate_tokens
+
+# Cheapest first; a failed segment or page moves one tier up
+TIERS = ("fast", "standard", "strong")
+DEFAULT_MODELS = {
+    "fast": "gemini-2.0-flash-lite",
+    "standard": "gemini-2.0-flash",
+    "strong": "gemini-2.5-flash",
+}
+
+# Characters that make a segment "dense": formulas, code, tables of figures
+_DENSE_CHARS = set("0123456789=+−×÷±√∑∫∂∞≈≠≤≥→^_{}[]()<>/\\|%$#@&*")
+_ACRONYM_RE = re.compile(r"\b[A-Z][A-Z0-9]{1,}\b")
+_PLACEHOLDER_RE = re.compile(r"\[\[\d+\]\]")
+
+
+def parse_models(spec: str) -> Dict[str, str]:
+    """
+    "gemini-2.0-flash" puts every tier on that one model (no routing);
+    "fast=gemini-2.0-flash-lite,strong=gemini-2.5-pro" overrides the named tiers.
+    """
+    spec = (spec or "").strip()
+    if not spec:
+        return {}
+    if "=" not in spec:
+        return {tier: spec for tier in TIERS}
+    models = {}
+    for part in spec.split(","):
+        tier, _, model = part.partition("=")
+        tier, model = tier.strip(), model.strip()
+        if tier not in TIERS or not model:
+            raise ValueError(f"Invalid model spec {part.strip()!r} (expected one of {', '.join(TIERS)}=MODEL)")
+        models[tier] = model
+    return models
+
+
+def density(text: str) -> float:
+    """Share of characters (and acronyms) typical of technical text; template placeholders don't count."""
+    text = _PLACEHOLDER_RE.sub("", text)
+    if not text:
+        return 0.0
+    symbols = sum(1 for char in text if char in _DENSE_CHARS)
+    acronyms = sum(len(match) for match in _ACRONYM_RE.findall(text))
+    return (symbols + acronyms) / len(text)
+
+
+class RoutingPolicy:
+    """
+    Decides which model tier a text segment or a page image starts on.
+
+    Short, plain segments (labels, headings, ordinary sentences) go to the fast
+    tier; long or dense ones (formulas, code, tables of figures, acronym soup)
+    start on the standard tier. Vision pages start on the fast tier only when
+    they are plain text with no embedded images; scans, figures and math go to
+    the standard tier. Whatever fails on a tier escalates to the next one that
+    runs a different model.
+
+    Models come from --models or GEMINI_MODELS (see parse_models); a single
+    model name turns routing off.
+    """
+
+    def __init__(self, models: Optional[Dict[str, str]] = None, simple_max_tokens: int = 48,
+                 dense_ratio: float = 0.15, simple_page_tokens: int = 700):
+        self.models = dict(DEFAULT_MODELS)
+        self.models.update(models or {})
+        self.simple_max_tokens = simple_max_tokens
+        self.dense_ratio = dense_ratio
+        self.simple_page_tokens = simple_page_tokens
+
+    @classmethod
+    def from_spec(cls, spec: Optional[str] = None) -> "RoutingPolicy":
+        return cls(parse_models(spec or os.environ.get("GEMINI_MODELS", "")))
+
+    def text_tier(self, text: str) -> str:
+        if estimate_tokens(text) > self.simple_max_tokens or density(text) > self.dense_ratio:
+            return self._lowest("standard")
+        return "fast"
+
+    def page_tier(self, text: str, images: int) -> str:
+        if (images or not text.strip() or estimate_tokens(text) > self.simple_page_tokens
+                or density(text) > self.dense_ratio):
+            return self._lowest("standard")
+        return "fast"
+
+    def _lowest(self, tier: str) -> str:
+        """The cheapest tier on the same model, so segments for one model are batched together."""
+        return next(lower for lower in TIERS if self.models[lower] == self.models[tier])
+
+    def escalate(self, tier: str) -> Optional[str]:
+        """The next tier up running a different model, or None at the top."""
+        for higher in TIERS[TIERS.index(tier) + 1:]:
+            if self.models[higher] != self.models[tier]:
+                return higher
+        return None
+
+
+class ModelLane:
+    """
+    One model: its client plus its own retry/circuit-breaker state, hedge latency
+    window and adaptive batch budget. Models have separate quotas and latency
+    profiles, so a rate-limited or slow model must not throttle the others.
+
+    The static instructions (prompts.py) are the client's system instruction, so
+    each request only carries its payload and every request shares an identical
+    prefix the backend can serve from its context cache. SDKs without system
+    instructions get them prepended to each prompt instead.
+    """
+
+    def __init__(self, model_name: str, metrics: Metrics, hedge: bool = False,
+                 system_instruction: Optional[str] = None):
+        import google.generativeai as genai
+
+        self.model_name = model_name
+        self.metrics = metrics
+        self.caller = ResilientCaller(metrics=metrics, hedge=hedge)
+        self.batcher = AdaptiveBatcher()
+        self.instruction = system_instruction
+        self.instruction_tokens = estimate_tokens(system_instruction) if system_instruction else 0
+        self.inline_instruction = False
+        if system_instruction:
+            try:
+                self.model = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+            except TypeError:
+                # google-generativeai < 0.5
+                self.model = genai.GenerativeModel(model_name)
+                self.inline_instruction = True
+        else:
+            self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, contents: Any, span: str):
+        """Calls the model through its ResilientCaller; counts tokens and times the request per model."""
+        if self.inline_instruction:
+            contents = self._inline(contents)
+        payload_tokens = sum(estimate_tokens(part) for part in _text_parts(contents))
+        self.metrics.incr("api_requests")
+        self.metrics.incr(f"requests.{self.model_name}")
+        self.metrics.incr("instruction_tokens", self.instruction_tokens)
+        self.metrics.incr("payload_tokens", payload_tokens)
+        self.metrics.incr("estimated_input_tokens", self.instruction_tokens + payload_tokens)
+        start = time.perf_counter()
+        try:
+            with self.metrics.span(span):
+                response = self.caller.call(self.model.generate_content, contents)
+        finally:
+            self.metrics.observe(f"model.{self.model_name}", time.perf_counter() - start)
+        self._record_usage(response)
+        return response
+
+    def _inline(self, contents: Any) -> Any:
+        if isinstance(contents, str):
+            return inline(self.instruction, contents)
+        return [inline(self.instruction, contents[0])] + list(contents[1:])
+
+    def _record_usage(self, response):
+        """Billed and cache-served input tokens, when the backend reports them."""
+        usage = getattr(response, "usage_metadata", None)
+        if not usage:
+            return
+        self.metrics.incr("input_tokens", getattr(usage, "prompt_token_count", 0) or 0)
+        self.metrics.incr("cached_input_tokens", getattr(usage, "cached_content_token_count", 0) or 0)
+        self.metrics.incr("output_tokens", getattr(usage, "candidates_token_count", 0) or 0)
+
+
+def _text_parts(contents: Any) -> List[str]:
+    if isinstance(contents, str):
+        return [contents]
+    return [part for part in contents if isinstance(part, str)]
+
+
+def token_report(metrics: Metrics) -> Optional[str]:
+    """One line on where the job's input tokens went, or None before any request."""
+    counters = metrics.counters
+    requests = counters.get("api_requests", 0)
+    if not requests:
+        return None
+    report = (f"Prompt tokens: ~{int(counters.get('instruction_tokens', 0))} in shared instructions, "
+              f"~{int(counters.get('payload_tokens', 0))} in per-request payloads over {int(requests)} requests")
+    if counters.get("input_tokens"):
+        cached = counters.get("cached_input_tokens", 0)
+        report += (f"; billed input {int(counters['input_tokens'])}, of which {int(cached)} "
+                   f"({100 * cached / counters['input_tokens']:.0f}%) served from the context cache")
+    return report
+
+
+class ModelRouter:
+    """Hands out one ModelLane per distinct model, created on first use."""
+
+    def __init__(self, policy: Optional[RoutingPolicy] = None, metrics: Optional[Metrics] = None,
+                 hedge: bool = False, system_instruction: Optional[str] = None):
+        self.policy = policy or RoutingPolicy.from_spec()
+        self.metrics = metrics or Metrics()
+        self.hedge = hedge
+        self.system_instruction = system_instruction
+        self._lanes: Dict[str, ModelLane] = {}
+        self._lock = threading.Lock()
+
+    def lane(self, tier: str) -> ModelLane:
+        model_name = self.policy.models[tier]
+        with self._lock:
+            if model_name not in self._lanes:
+                self._lanes[model_name] = ModelLane(model_name, self.metrics, self.hedge, self.system_instruction)
+            return self._lanes[model_name]
+
+    def budgets(self) -> str:
+        """Current batch budget per model in use, for progress output."""
+        with self._lock:
+            return ", ".join(f"{name} ~{int(lane.batcher.budget)}" for name, lane in self._lanes.items())
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional
+try:
+    from .metrics import Metrics
+except ImportError:
+    from metrics import Metrics
+
+# Bump when the TSV-to-block conversion below changes, so stale cache entries are not reused
+SCAN_VERSION = "1"
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pdf-hindi-translator", "ocr")
+
+
+def is_scanned(page_data: Dict[str, Any], min_text_chars: int = 40, min_image_coverage: float = 0.5) -> bool:
+    """
+    A page whose content is a picture of text: (almost) no text layer, and
+    images covering at least min_image_coverage of the page.
+    Works on extracted page data, so it costs nothing extra.
+    """
+    chars = sum(len(span["text"].strip()) for block in page_data["blocks"]
+                for line in block["lines"] for span in line["spans"])
+    if chars >= min_text_chars:
+        return False
+    area = page_data["page_width"] * page_data["page_height"] or 1.0
+    covered = 0.0
+    for img in page_data["images"]:
+        x0, y0, x1, y1 = img["bbox"]
+        covered += max(0.0, min(x1, page_data["page_width"]) - max(x0, 0.0)) * \
+            max(0.0, min(y1, page_data["page_height"]) - max(y0, 0.0))
+    return covered / area >= min_image_coverage
+
+
+def tsv_to_blocks(data: Dict[str, List[Any]], scale: float, min_conf: float = 0.0) -> List[Dict[str, Any]]:
+    """
+    Turns tesseract's image_to_data output (a dict of columns) into the block
+    structure PDFExtractor produces for text layers: one block per OCR paragraph,
+    one line per OCR line with a single span, coordinates in PDF points
+    (pixels * scale). Font size is estimated from the line height.
+    """
+    lines: Dict[tuple, Dict[str, Any]] = {}
+    for i, text in enumerate(data["text"]):
+        text = (text or "").strip()
+        if not text or float(data["conf"][i]) < min_conf:
+            continue
+        x0 = data["left"][i] * scale
+        y0 = data["top"][i] * scale
+        x1 = x0 + data["width"][i] * scale
+        y1 = y0 + data["height"][i] * scale
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        line = lines.setdefault(key, {"words": [], "bbox": [x0, y0, x1, y1]})
+        line["words"].append(text)
+        bbox = line["bbox"]
+        bbox[0], bbox[1], bbox[2], bbox[3] = min(bbox[0], x0), min(bbox[1], y0), max(bbox[2], x1), max(bbox[3], y1)
+
+    blocks: Dict[tuple, Dict[str, Any]] = {}
+    for (block_num, par_num, _), line in sorted(lines.items()):
+        x0, y0, x1, y1 = line["bbox"]
+        # Word boxes span ascender to descender, roughly 1.2x the font size
+        size = round(max((y1 - y0) / 1.2, 4.0), 1)
+        span = {
+            "text": " ".join(line["words"]),
+            "bbox": (x0, y0, x1, y1),
+            "size": size,
+            "font": "OCR",
+            "color": 0,
+            "flags": 0,
+            "origin": (x0, y1),
+        }
+        block = blocks.setdefault((block_num, par_num), {"bbox": [x0, y0, x1, y1], "lines": []})
+        block["lines"].append({"bbox": (x0, y0, x1, y1), "spans": [span]})
+        bbox = block["bbox"]
+        bbox[0], bbox[1], bbox[2], bbox[3] = min(bbox[0], x0), min(bbox[1], y0), max(bbox[2], x1), max(bbox[3], y1)
+    return [dict(block, bbox=tuple(block["bbox"]), ocr=True) for block in blocks.values()]
+
+
+def _tesseract(png: bytes, lang: str) -> Dict[str, List[Any]]:
+    """Thread worker: one page image through tesseract, word boxes as columns."""
+    import io
+    import pytesseract
+    from PIL import Image
+
+    return pytesseract.image_to_data(Image.open(io.BytesIO(png)), lang=lang,
+                                     output_type=pytesseract.Output.DICT)
+
+
+class PageScanner:
+    """
+    Full-page OCR for scanned pages, so they go through the same block
+    pipeline (layout, translation, rendering) as pages with a text layer.
+
+    Pages are rasterized in grayscale at dpi, one at a time on the calling
+    thread (PyMuPDF documents are not thread-safe), and handed to a thread
+    pool running one tesseract process per page; tesseract does the heavy
+    lifting in its own process, so threads are enough to keep every core busy.
+    Results are cached on disk by a hash of the rendered pixels, DPI and
+    language, so re-running a document (or another copy of the same scan)
+    skips OCR entirely.
+    """
+
+    def __init__(self, dpi: Optional[int] = None, lang: str = "eng", jobs: Optional[int] = None,
+                 cache_dir: Optional[str] = None, metrics: Optional[Metrics] = None, min_conf: float = 0.0):
+        self.dpi = dpi or int(os.environ.get("SCAN_DPI", 300))
+        self.lang = lang
+        self.jobs = jobs or os.cpu_count() or 1
+        # OCR_CACHE_DIR= (empty) turns the cache off
+        self.cache_dir = cache_dir if cache_dir is not None else os.environ.get("OCR_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.metrics = metrics or Metrics()
+        self.min_conf = min_conf
+
+    def scan(self, doc, page_numbers: Iterable[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """OCR blocks for each 0-based page in page_numbers, keyed by page index."""
+        from concurrent.futures import ThreadPoolExecutor
+
+        import fitz
+
+        # One tesseract per worker thread; its own OpenMP threads would only compete with them
+        os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+        results: Dict[int, List[Dict[str, Any]]] = {}
+        scale = 72.0 / self.dpi
+        with self.metrics.span("scan"), ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            in_flight = deque()
+            for index in page_numbers:
+                with self.metrics.span("scan_rasterize"):
+                    pix = doc[index].get_pixmap(dpi=self.dpi, colorspace=fitz.csGRAY)
+                key = self._key(pix.samples)
+                cached = self._load(key)
+                if cached is not None:
+                    self.metrics.incr("scan_cache_hits")
+                    results[index] = cached
+                    continue
+                # Keep only a couple of page images per worker in memory
+                while len(in_flight) >= 2 * self.jobs:
+                    self._collect(*in_flight.popleft(), scale, results)
+                in_flight.append((index, key, pool.submit(_tesseract, pix.tobytes("png"), self.lang)))
+            while in_flight:
+                self._collect(*in_flight.popleft(), scale, results)
+        self.metrics.incr("scanned_pages", len(results))
+        return results
+
+    def _collect(self, index: int, key: str, future, scale: float, results: Dict[int, List[Dict[str, Any]]]):
+        try:
+            blocks = tsv_to_blocks(future.result(), scale, self.min_conf)
+        except Exception as e:
+            print(f"Error during OCR of page {index + 1}: {e}")
+            results[index] = []
+            return
+        self.metrics.incr("scan_ocr_pages")
+        self._store(key, blocks)
+        results[index] = blocks
+
+    def _key(self, samples: bytes) -> str:
+        digest = hashlib.sha256(samples)
+        digest.update(f"|{self.dpi}|{self.lang}|{self.min_conf}|{SCAN_VERSION}".encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _load(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, key: str, blocks: List[Dict[str, Any]]):
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary name first so a concurrent reader never sees half a file
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(blocks, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not cache OCR result: {e}")
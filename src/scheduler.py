@@ -0,0 +1,73 @@
+import re
+import threading
+from typing import Iterator, List, Optional, Sequence
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap local token estimate for Gemini-style tokenizers.
+    English averages ~4 characters per token; punctuation and numbers split more finely,
+    so take the larger of the character-based and word/punctuation-based estimates.
+    """
+    if not text:
+        return 0
+    by_chars = len(text) / 4
+    by_words = len(_WORD_RE.findall(text)) * 0.75
+    return max(1, int(max(by_chars, by_words) + 0.5))
+
+
+class AdaptiveBatcher:
+    """
+    Packs segments into requests up to a token budget and adapts the budget AIMD-style:
+    every fast, successful request grows it by a fixed step, a slow or failed request
+    cuts it by a factor. The budget settles where requests stay under target_latency
+    and the error rate stays low, and it follows the API as quotas and latency drift.
+    """
+
+    def __init__(self, initial_budget: int = 600, min_budget: int = 60, max_budget: int = 6000,
+                 increase: int = 150, decrease: float = 0.5, target_latency: float = 10.0,
+                 max_items: int = 40):
+        self.budget = float(initial_budget)
+        self.min_budget = min_budget
+        self.max_budget = max_budget
+        self.increase = increase
+        self.decrease = decrease
+        self.target_latency = target_latency
+        self.max_items = max_items
+        # Exponentially weighted averages, for reporting
+        self.avg_latency: Optional[float] = None
+        self.error_rate = 0.0
+        self._lock = threading.Lock()
+
+    def batches(self, texts: Sequence[str]) -> Iterator[List[str]]:
+        """
+        Yields consecutive groups of texts whose estimated tokens fit the current budget.
+        Batches are cut lazily, so feedback recorded between yields shapes the next batch.
+        A single segment larger than the budget is sent on its own.
+        """
+        index = 0
+        while index < len(texts):
+            budget = self.budget
+            batch = [texts[index]]
+            used = estimate_tokens(texts[index])
+            index += 1
+            while index < len(texts) and len(batch) < self.max_items:
+                cost = estimate_tokens(texts[index])
+                if used + cost > budget:
+                    break
+                batch.append(texts[index])
+                used += cost
+                index += 1
+            yield batch
+
+    def record(self, latency: float, ok: bool):
+        """Feeds back the outcome of one request."""
+        with self._lock:
+            self.avg_latency = latency if self.avg_latency is None else 0.8 * self.avg_latency + 0.2 * latency
+            self.error_rate = 0.8 * self.error_rate + 0.2 * (0.0 if ok else 1.0)
+            if ok and latency <= self.target_latency:
+                self.budget = min(self.max_budget, self.budget + self.increase)
+            else:
+                self.budget = max(self.min_budget, self.budget * self.decrease)
@@ -0,0 +1,160 @@
+import re
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Tuple
+
+# Variable parts of a segment are replaced by numbered placeholders the model is told to keep.
+PLACEHOLDER = "[[{}]]"
+PLACEHOLDER_RE = re.compile(r"\[\[(\d+)\]\]")
+
+_MONTHS = r"(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:t(?:ember)?)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\.?"
+
+# Order matters: dates before bare numbers so "12/03/2024" becomes one placeholder, not three.
+VARIABLE_RE = re.compile(
+    r"\b\d{4}-\d{1,2}-\d{1,2}\b"                              # 2024-03-12
+    r"|\b\d{1,2}[/.]\d{1,2}[/.]\d{2,4}\b"                     # 12/03/2024, 12.03.24
+    r"|\b" + _MONTHS + r"\s+\d{1,2},?\s+\d{4}\b"              # March 12, 2024
+    r"|\b\d{1,2}\s+" + _MONTHS + r"\s+\d{4}\b"                # 12 March 2024
+    r"|\b" + _MONTHS + r"\s+\d{4}\b"                          # March 2024
+    r"|(?<=\bpage )[ivxlcdm]+\b"                              # Page iv
+    r"|\d+(?:[.,]\d+)*",                                      # 3, 120, 4.2, 1,024
+    re.IGNORECASE,
+)
+
+
+def template_text(text: str) -> Tuple[str, List[str]]:
+    """
+    Replaces numbers, dates and page counters in text with placeholders.
+    "Page 3 of 120" -> ("Page [[0]] of [[1]]", ["3", "120"])
+    """
+    values = []
+
+    def substitute(match):
+        values.append(match.group(0))
+        return PLACEHOLDER.format(len(values) - 1)
+
+    return VARIABLE_RE.sub(substitute, text), values
+
+
+def fill_template(template: str, values: List[str]) -> Optional[str]:
+    """
+    Puts values back into a (translated) template.
+    Returns None if the placeholders did not survive translation intact.
+    """
+    found = sorted(int(index) for index in PLACEHOLDER_RE.findall(template))
+    if found != list(range(len(values))):
+        return None
+    return PLACEHOLDER_RE.sub(lambda m: values[int(m.group(1))], template)
+
+
+class SegmentNormalizer:
+    """
+    Finds segments that differ only by numbers/dates (running headers and footers,
+    "Page 3 of 120", "Table 4", ...) so each template is translated once and
+    re-instantiated per block.
+
+    Running headers/footers are detected by position (top or bottom band of the page)
+    and text similarity across pages. Anywhere else, short segments are templated
+    when the same template shows up with at least two different values.
+    """
+
+    def __init__(self, band: float = 0.1, min_pages: int = 2, similarity: float = 0.8,
+                 max_template_words: int = 12):
+        self.band = band
+        self.min_pages = min_pages
+        self.similarity = similarity
+        self.max_template_words = max_template_words
+
+    def annotate(self, pages_data: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Sets block["segment"] to the text that should be sent for translation
+        (the template or the block's own aggregated_text) and, for templated blocks,
+        block["template_values"]. Expects block["aggregated_text"] to be set.
+        Returns counts for reporting.
+        """
+        running = self._running_blocks(pages_data)
+
+        # Templates that occur with more than one set of values anywhere in the document
+        variants: Dict[str, set] = {}
+        for page in pages_data:
+            for block in page["blocks"]:
+                text = block.get("aggregated_text")
+                if not text or len(text.split()) > self.max_template_words:
+                    continue
+                template, values = template_text(text)
+                if values:
+                    variants.setdefault(template, set()).add(tuple(values))
+
+        stats = {"running_blocks": 0, "templated_blocks": 0}
+        for page in pages_data:
+            for index, block in enumerate(page["blocks"]):
+                text = block.get("aggregated_text")
+                if not text:
+                    continue
+                template, values = template_text(text)
+                is_running = (page["page"], index) in running
+                if values and (is_running or len(variants.get(template, ())) > 1):
+                    block["segment"] = template
+                    block["template_values"] = values
+                    stats["templated_blocks"] += 1
+                else:
+                    block["segment"] = text
+                if is_running:
+                    block["running"] = True
+                    stats["running_blocks"] += 1
+        return stats
+
+    def expand(self, pages_data: List[Dict[str, Any]], translation_map: Dict[str, str]):
+        """
+        Adds an entry for every templated block's original text to translation_map,
+        filled from the translated template. Falls back to the original text if the
+        model dropped or mangled a placeholder.
+        """
+        for page in pages_data:
+            for block in page["blocks"]:
+                values = block.get("template_values")
+                if not values:
+                    continue
+                original = block["aggregated_text"]
+                translated_template = translation_map.get(block["segment"])
+                filled = fill_template(translated_template, values) if translated_template else None
+                translation_map[original] = filled if filled is not None else original
+
+    def _running_blocks(self, pages_data: List[Dict[str, Any]]) -> set:
+        """
+        Returns (page number, block index) of blocks that repeat in the header/footer
+        bands across pages. Positions rather than object ids, because pages spilled
+        to disk (memory.py) come back as new objects on every pass.
+        """
+        # band -> list of clusters: [representative template, y0, pages, block positions]
+        groups: Dict[str, List[List[Any]]] = {"header": [], "footer": []}
+        for page in pages_data:
+            height = page["page_height"] or 1
+            for index, block in enumerate(page["blocks"]):
+                text = block.get("aggregated_text")
+                if not text:
+                    continue
+                y0, y1 = block["bbox"][1], block["bbox"][3]
+                if y1 <= height * self.band:
+                    band = "header"
+                elif y0 >= height * (1 - self.band):
+                    band = "footer"
+                else:
+                    continue
+                # Only vertical position is compared: headers often alternate sides on odd/even pages
+                template = template_text(text)[0]
+                for cluster in groups[band]:
+                    if abs(cluster[1] - y0) > height * 0.02:
+                        continue
+                    if cluster[0] == template or SequenceMatcher(None, cluster[0], template).ratio() >= self.similarity:
+                        cluster[2].add(page["page"])
+                        cluster[3].append((page["page"], index))
+                        break
+                else:
+                    groups[band].append([template, y0, {page["page"]}, [(page["page"], index)]])
+
+        running = set()
+        for clusters in groups.values():
+            for _, _, pages, blocks in clusters:
+                if len(pages) >= self.min_pages:
+                    running.update(blocks)
+        return running
@@ -0,0 +1,156 @@
+import argparse
+import os
+import sys
+from typing import List, Optional
+try:
+    from .ir import IRFormatError, load, new_document, save, source_changed
+    from .metrics import Metrics
+except ImportError:
+    from ir import IRFormatError, load, new_document, save, source_changed
+    from metrics import Metrics
+# The pipeline as three separately runnable stages over an intermediate document (ir.py):
+#   extract:   PDF -> pages, layout and segments         (CPU, local)
+#   translate: segments -> translations                  (network-bound)
+#   render:    pages + translations -> PDF               (CPU, local)
+# so each stage can run on its own pool, be retried on its own, and a document can be
+# re-rendered without extracting or translating it again.
+
+COMMANDS = ("extract", "translate", "render")
+
+
+def extract(input_pdf: str, ir_path: str, metrics: Metrics, max_pages: Optional[int] = None,
+            page_range: Optional[str] = None, use_ocr: bool = True, scan_dpi: Optional[int] = None,
+            layout: bool = True):
+    try:
+        from .pages import page_count, select_pages
+        from .pipeline import collect_segments, extract_pages
+    except ImportError:
+        from pages import page_count, select_pages
+        from pipeline import collect_segments, extract_pages
+
+    page_numbers = select_pages(page_count(input_pdf), page_range, max_pages) if page_range else None
+    pages_data = extract_pages(input_pdf, max_pages, use_ocr, metrics, page_numbers=page_numbers, scan_dpi=scan_dpi)
+    sorted_texts, _ = collect_segments(pages_data, metrics, layout=layout)
+    with metrics.span("write_ir"):
+        save(new_document(input_pdf, pages_data, sorted_texts, {"layout": layout, "ocr": use_ocr}), ir_path)
+    print(f"Wrote {len(pages_data)} pages and {len(sorted_texts)} segments to {ir_path}")
+
+
+def translate(ir_path: str, output_ir: Optional[str], metrics: Metrics, hedge: bool = False,
+              models: Optional[str] = None):
+    """
+    Translates the document's segments that have no translation yet, or whose last
+    attempt failed, so re-running the stage after an outage only sends what is missing.
+    """
+    try:
+        from .pipeline import translate_segments
+        from .routing import RoutingPolicy
+        from .translator import Translator
+    except ImportError:
+        from pipeline import translate_segments
+        from routing import RoutingPolicy
+        from translator import Translator
+
+    document = load(ir_path)
+    translations = document["translations"]
+    failed = {text for text, _ in document["failures"]}
+    pending = [text for text in document["segments"] if text not in translations or text in failed]
+    metrics.incr("segments_already_translated", len(document["segments"]) - len(pending))
+    if pending:
+        translator = Translator(metrics=metrics, hedge=hedge, routing=RoutingPolicy.from_spec(models))
+        translations.update(translate_segments(translator, pending, metrics))
+        document["failures"] = [[text, reason] for text, reason in translator.failures]
+    else:
+        print("Every segment is already translated.")
+    document["stage"] = "translated"
+    with metrics.span("write_ir"):
+        save(document, output_ir or ir_path)
+    print(f"Translation complete: {output_ir or ir_path}")
+
+
+def render(ir_path: str, output_pdf: str, metrics: Metrics, image_dpi: Optional[float] = None,
+           optimize: bool = False, jobs: Optional[int] = None):
+    try:
+        from .generator import PDFGenerator
+        from .pipeline import apply_translations
+        from .segments import SegmentNormalizer
+    except ImportError:
+        from generator import PDFGenerator
+        from pipeline import apply_translations
+        from segments import SegmentNormalizer
+
+    document = load(ir_path)
+    if document["stage"] != "translated":
+        raise IRFormatError(f"{ir_path} has not been translated yet; run the translate stage first")
+    pages_data = document["pages"]
+    if any(page["images"] for page in pages_data) and source_changed(document):
+        raise IRFormatError(f"{document['source']} is missing or has changed since extraction; "
+                            f"its images are read from it, so extract it again")
+    translation_map = document["translations"]
+    # Templates and paragraph splits live on the blocks, so a fresh normalizer expands them
+    apply_translations(pages_data, translation_map, SegmentNormalizer())
+    print(f"Generating output PDF at {output_pdf}...")
+    PDFGenerator(output_pdf, metrics=metrics, image_dpi=image_dpi, optimize=optimize,
+                 jobs=jobs or os.cpu_count() or 1).generate(pages_data, translation_map)
+    print("Done!")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="main.py", description="Run one stage of the PDF to Hinglish pipeline over an intermediate document")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    extract_parser = subparsers.add_parser("extract", help="Extract pages, layout and segments from a PDF")
+    extract_parser.add_argument("input_pdf", help="Path to the input PDF file")
+    extract_parser.add_argument("ir", help="Intermediate document to write")
+    extract_parser.add_argument("--pages", type=int, default=None, help="Number of pages to convert (default: all)")
+    extract_parser.add_argument("--page-range", default=None, metavar="RANGES", help="Pages to convert, 1-based, e.g. 1-10,25,40-")
+    extract_parser.add_argument("--no-ocr", action="store_true", help="Disable OCR for images")
+    extract_parser.add_argument("--scan-dpi", type=int, default=None, metavar="DPI",
+                                help="Resolution scanned pages are rendered at for OCR (default: $SCAN_DPI or 300)")
+    extract_parser.add_argument("--no-layout", action="store_true", help="Translate each text block on its own instead of merging paragraph fragments")
+
+    translate_parser = subparsers.add_parser("translate", help="Translate an extracted document's segments")
+    translate_parser.add_argument("ir", help="Intermediate document from the extract stage")
+    translate_parser.add_argument("-o", "--output", default=None, metavar="IR", help="Write the translated document here instead of updating IR in place")
+    translate_parser.add_argument("--api-key", default=None, help="Google Gemini API Key (optional if GOOGLE_API_KEY env var is set)")
+    translate_parser.add_argument("--models", default=None, metavar="SPEC", help="Model per tier (default: $GEMINI_MODELS)")
+    translate_parser.add_argument("--hedge", action="store_true", help="Send a duplicate request when a call runs longer than the observed p95 latency")
+
+    render_parser = subparsers.add_parser("render", help="Render a translated document to PDF")
+    render_parser.add_argument("ir", help="Intermediate document from the translate stage")
+    render_parser.add_argument("output_pdf", help="Path to save the output PDF file")
+    render_parser.add_argument("--image-dpi", type=float, default=None, help="Downsample images shown at well above this resolution")
+    render_parser.add_argument("--optimize", action="store_true", help="Shrink the output PDF")
+    render_parser.add_argument("--jobs", type=int, default=None, help="Worker processes for rendering page ranges (default: CPU count)")
+
+    for subparser in (extract_parser, translate_parser, render_parser):
+        subparser.add_argument("--metrics-json", default=None, help="Write a JSON summary of per-stage timings and counters to this path")
+
+    args = parser.parse_args(argv)
+    metrics = Metrics(job=getattr(args, "input_pdf", None) or args.ir)
+    try:
+        with metrics.span("total"):
+            if args.command == "extract":
+                extract(args.input_pdf, args.ir, metrics, args.pages, args.page_range, not args.no_ocr,
+                        args.scan_dpi, not args.no_layout)
+            elif args.command == "translate":
+                if args.api_key:
+                    os.environ["GOOGLE_API_KEY"] = args.api_key
+                if not os.environ.get("GOOGLE_API_KEY"):
+                    print("Error: GOOGLE_API_KEY not found. Please provide it via --api-key.")
+                    sys.exit(1)
+                translate(args.ir, args.output, metrics, args.hedge, args.models)
+            else:
+                render(args.ir, args.output_pdf, metrics, args.image_dpi, args.optimize, args.jobs)
+    except (IRFormatError, OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    summary = metrics.summary()
+    print(f"Finished in {summary['wall_seconds']}s: {summary['counters']}")
+    if args.metrics_json:
+        metrics.write_json(args.metrics_json)
+
+
+if __name__ == "__main__":
+    main()
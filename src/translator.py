@@ -1,73 +1,202 @@
 import os
-import google.generativeai as genai
+import json
 import time
-from typing import List
+from typing import Callable, Dict, List, Optional, Union
+try:
+    from .metrics import Metrics
+    from .classifier import SkipClassifier
+    from .resilience import ModelCallError
+    from .routing import TIERS, ModelRouter, RoutingPolicy
+    from .prompts import TEXT_INSTRUCTION, packed_payload, text_payload
+except ImportError:
+    from metrics import Metrics
+    from classifier import SkipClassifier
+    from resilience import ModelCallError
+    from routing import TIERS, ModelRouter, RoutingPolicy
+    from prompts import TEXT_INSTRUCTION, packed_payload, text_payload
+
+# Markers of a refusal/error message returned instead of a translation
+REFUSAL_MARKERS = ("I cannot translate", "loops", "language model", "Oops")
+
 
 class Translator:
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, metrics: Optional[Metrics] = None, hedge: bool = False,
+                 routing: Optional[RoutingPolicy] = None):
+        self.metrics = metrics or Metrics()
+        self.classifier = SkipClassifier()
+        # (text, reason) for every segment that had to be left untranslated
+        self.failures = []
         if not api_key:
             api_key = os.environ.get("GOOGLE_API_KEY")
         
         if not api_key:
             raise ValueError("Google API Key is required.")
             
+        # google.generativeai takes the better part of a second to import, load it only when needed
+        import google.generativeai as genai
         genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
+        # Segments start on the cheapest tier that suits them and escalate on failure;
+        # each model keeps its own backoff, circuit breaker, hedging stats and batch budget
+        self.routing = routing or RoutingPolicy.from_spec()
+        # The style guide is the system instruction of every model client; requests carry only the text
+        self.router = ModelRouter(self.routing, metrics=self.metrics, hedge=hedge, system_instruction=TEXT_INSTRUCTION)
 
     def translate_text(self, text: str) -> str:
         """
         Translates English text to Hinglish using Gemini.
         """
-        # 1. Skip strictly numeric or very short text to preserve formatting/numbers
-        if not text or not text.strip():
+        # 1. Pass through anything that doesn't need the model: numbers, very short text,
+        # URLs/emails/DOIs, code, equations, references, units, text that is already Hindi
+        skip_reason = self.classifier.classify(text)
+        if skip_reason:
+            self.metrics.incr("api_calls_saved")
+            self.metrics.incr(f"skipped_{skip_reason}")
             return text
-        if len(text.strip()) < 3 and not text.strip().isalpha():
-            return text
-        # Skip if it looks like just a number
-        try:
-            float(text.replace(',', '').strip())
-            return text
-        except ValueError:
-            pass
+        tier = self._route(text)
+        while True:
+            value, problem = self._translate_one(text, tier)
+            if problem is None:
+                return value
+            tier = self._escalate(tier)
+            if tier is None:
+                return self._give_up(text, problem)
 
-        prompt = f"""
-        You are a professional English-to-Hindi translator. Translate the following text into **Conversational Hinglish** (Hindi written in Roman script).
+    def _route(self, text: str) -> str:
+        tier = self.routing.text_tier(text)
+        self.metrics.incr(f"routed_{tier}")
+        return tier
 
-        **Style Guide**:
-        - **Grammar**: Use Hindi grammar (SOV structure usually), but keep the flow natural.
-        - **Vocabulary**: Use English for technical nouns (e.g. 'API', 'Database', 'Laser'). Use Hindi for verbs, adjectives, and connecting words where natural (e.g., 'karna', 'hona', 'accha').
-        - **Conciseness**: Try to keep the translated length close to the original. Do not add unnecessary filler words.
-        - **No Transliteration**: Do not just write English words in Hindi script (e.g., dont write "book" as "buk", writes "kitaab").
-        
-        **Strict Rules**:
-        1. Return ONLY the translated text. DO NOT add "ka matlab hai", "Ye hai", or any conversational filler.
-        2. Keep numbers, table of contents, and symbols EXACTLY as is.
-        3. Do not translate code or URLs.
-        4. If the text is a Table of Contents line (e.g., "1. Introduction ..... 5"), keep the structure and only translate the text part.
-
-        Input Text:
-        "{text}"
+    def _escalate(self, tier: str) -> Optional[str]:
+        higher = self.routing.escalate(tier)
+        if higher:
+            self.metrics.incr("escalations")
+            self.metrics.incr(f"escalated_to_{higher}")
+        return higher
+
+    def _give_up(self, text: str, problem) -> str:
+        """Keeps the original text of a segment no tier could translate and records it in failures."""
+        self._record_failure(text, problem if isinstance(problem, Exception) else "refused by every tier")
+        return text
+
+    def _translate_one(self, text: str, tier: str):
         """
+        Sends a single segment to tier's model. Returns (translation or original text, problem):
+        problem is None on success, "refused" for a refusal, or the exception of a failed request.
+        """
+        prompt = text_payload(text)
+        lane = self.router.lane(tier)
 
+        start = time.perf_counter()
         try:
-            # We add a small delay to avoid hitting rate limits instantly if called in tight loop
-            response = self.model.generate_content(prompt)
+            response = lane.generate(prompt, "translate.request")
             translated = response.text.strip()
-            
-            # 2. Sanity check: If the response is an error message or refusal, return original
-            if "I cannot translate" in translated or "loops" in translated or "language model" in translated or "Oops" in translated:
-                return text
-                
-            return translated
-        except Exception as e:
-            # print(f"Translation error: {e}") # Reduce noise
-            return text # Fallback to original text
-
-    def translate_batch(self, texts: List[str]) -> List[str]:
+        except (ModelCallError, ValueError) as e:
+            # response.text raises ValueError when the reply was blocked or empty
+            lane.batcher.record(time.perf_counter() - start, ok=False)
+            return text, e
+        lane.batcher.record(time.perf_counter() - start, ok=True)
+
+        # 2. Sanity check: If the response is an error message or refusal, return original
+        if self._is_refusal(translated):
+            self.metrics.incr("translation_refusals")
+            return text, "refused"
+        return translated, None
+
+    def translate_batch(self, texts: List[str], progress: Optional[Callable[[int, int], None]] = None) -> List[str]:
+        """
+        Translates a list of texts, packing several segments into each request.
+        Each segment is routed to a model tier (see routing.py); per model, the
+        number of segments per request follows that model's AdaptiveBatcher token
+        budget, which grows while the API is fast and shrinks on slow or failed
+        requests. Segments that fail on a tier are retried on the next tier up.
+        progress(done, total) is called after every request.
         """
-        Translates a batch of texts.
+        results = list(texts)
+        queues: Dict[str, List[int]] = {tier: [] for tier in TIERS}
+        for index, text in enumerate(texts):
+            skip_reason = self.classifier.classify(text)
+            if skip_reason:
+                self.metrics.incr("api_calls_saved")
+                self.metrics.incr(f"skipped_{skip_reason}")
+            else:
+                queues[self._route(text)].append(index)
+
+        done = len(texts) - sum(len(queue) for queue in queues.values())
+        # Cheapest tier first, so segments escalated from it join the next tier's queue in time
+        for tier in TIERS:
+            pending = queues[tier]
+            if not pending:
+                continue
+            higher = self.routing.escalate(tier)
+            position = 0
+            for batch in self.router.lane(tier).batcher.batches([texts[i] for i in pending]):
+                indices = pending[position:position + len(batch)]
+                position += len(batch)
+                if len(batch) == 1:
+                    outcomes = [self._translate_one(batch[0], tier)]
+                else:
+                    outcomes = self._translate_packed(batch, tier)
+                for index, (value, problem) in zip(indices, outcomes):
+                    if problem is not None:
+                        if higher:
+                            self._escalate(tier)
+                            queues[higher].append(index)
+                            continue
+                        value = self._give_up(texts[index], problem)
+                    results[index] = value
+                    done += 1
+                if progress:
+                    progress(done, len(texts))
+        return results
+
+    def _translate_packed(self, batch: List[str], tier: str):
         """
-        translated = []
-        for t in texts:
-            translated.append(self.translate_text(t))
-        return translated
+        Sends several segments in one request as a JSON array; falls back to one request
+        each on a malformed reply. Returns (value, problem) per segment as _translate_one does.
+        """
+        prompt = packed_payload(batch)
+        lane = self.router.lane(tier)
+
+        self.metrics.incr("batched_segments", len(batch))
+        start = time.perf_counter()
+        try:
+            response = lane.generate(prompt, "translate.request")
+        except ModelCallError as e:
+            lane.batcher.record(time.perf_counter() - start, ok=False)
+            return [(text, e) for text in batch]
+        try:
+            translated = self._parse_json_array(response.text, len(batch))
+        except ValueError:
+            translated = None
+        lane.batcher.record(time.perf_counter() - start, ok=translated is not None)
+
+        if translated is None:
+            self.metrics.incr("batch_fallbacks")
+            return [self._translate_one(text, tier) for text in batch]
+
+        # Per-item sanity check, same as the single-segment path
+        results = []
+        for original, value in zip(batch, translated):
+            if not value.strip() or self._is_refusal(value):
+                self.metrics.incr("translation_refusals")
+                results.append((original, "refused"))
+            else:
+                results.append((value.strip(), None))
+        return results
+
+    def _parse_json_array(self, text: str, expected: int) -> Optional[List[str]]:
+        cleaned = text.strip().replace("```json", "").replace("```", "").strip()
+        try:
+            values = json.loads(cleaned)
+        except ValueError:
+            return None
+        if not isinstance(values, list) or len(values) != expected or not all(isinstance(v, str) for v in values):
+            return None
+        return values
+
+    def _record_failure(self, text: str, error: Union[Exception, str]):
+        self.metrics.incr("translation_failures")
+        self.failures.append((text, str(error)))
+
+    def _is_refusal(self, translated: str) -> bool:
+        return any(marker in translated for marker in REFUSAL_MARKERS)
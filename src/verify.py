@@ -1,112 +1,151 @@
 import os
 import argparse
 import sys
-from pdf2image import convert_from_path
-from PIL import Image, ImageDraw, ImageFont
-import google.generativeai as genai
 from dotenv import load_dotenv
+try:
+    from .metrics import Metrics
+    from .prompts import VERIFY_INSTRUCTION, verify_payload
+except ImportError:
+    from metrics import Metrics
+    from prompts import VERIFY_INSTRUCTION, verify_payload
 
 # Load env variables
 load_dotenv()
 
 def stitch_images(image1, image2):
     """Stitches two images side-by-side."""
+    from PIL import Image
+
     width1, height1 = image1.size
     width2, height2 = image2.size
-    
+
     total_width = width1 + width2
     max_height = max(height1, height2)
-    
-    new_im = Image.new('RGB', (total_width, max_height))
+
+    # White background, so a shorter page doesn't leave a black band in the payload
+    new_im = Image.new(image1.mode, (total_width, max_height), "white")
     new_im.paste(image1, (0, 0))
     new_im.paste(image2, (width1, 0))
-    
+
     return new_im
 
-def verify_pdf(input_pdf, output_pdf, api_key, pages_to_check=3):
+def render_page(doc, index, dpi=100, grayscale=True):
+    """One page of an open PyMuPDF document as a PIL image (mode "L" or "RGB")."""
+    import fitz
+    from PIL import Image
+
+    pix = doc[index].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY if grayscale else fitz.csRGB, alpha=False)
+    return Image.frombytes("L" if grayscale else "RGB", (pix.width, pix.height), pix.samples)
+
+def encode_image(image, image_format="jpeg", quality=70):
+    """The image as an inline blob for the model: JPEG (lossy, a fraction of the size) or PNG."""
+    import io
+
+    buffer = io.BytesIO()
+    if image_format == "png":
+        image.save(buffer, format="PNG", optimize=True)
+    else:
+        image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return {"mime_type": f"image/{image_format}", "data": buffer.getvalue()}
+
+def verify_pdf(input_pdf, output_pdf, api_key, pages_to_check=3, dpi=100, grayscale=True, image_format="jpeg",
+               quality=70, pages_per_request=1, debug_dir=None, metrics=None):
     """
     Verifies PDF conversion quality using Gemini Vision.
+
+    Both PDFs are rendered in-process with PyMuPDF at dpi; each page pair is
+    stitched side by side and sent as a grayscale JPEG unless told otherwise.
+    pages_per_request packs several pairs into one request, so the instructions
+    are paid for once per request rather than once per page. Comparison images
+    are written to debug_dir only when it is given.
     """
     if not api_key:
         print("Error: API Key is required for verification.")
         return
 
+    # Heavy dependencies are only loaded once we know there is work to do
+    import fitz
+    import google.generativeai as genai
+    try:
+        from .routing import ModelLane, token_report
+    except ImportError:
+        from routing import ModelLane, token_report
+
+    metrics = metrics or Metrics(job=output_pdf)
     genai.configure(api_key=api_key)
-    # Using gemini-2.0-flash-exp (or stable) for vision capabilities
-    # gemini-1.5-flash is also good for vision. Let's try gemini-2.0-flash as we used it for text.
-    model = genai.GenerativeModel('gemini-2.0-flash')
+    # The QA instructions are the system instruction; each request only carries its images
+    lane = ModelLane(os.environ.get("VERIFY_MODEL", "gemini-2.0-flash"), metrics, system_instruction=VERIFY_INSTRUCTION)
+
+    print(f"Rendering pages for verification (Checking first {pages_to_check} pages at {dpi} DPI)...")
 
-    print(f"Converting PDFs to images for verification (Checking first {pages_to_check} pages)...")
-    
+    payloads = []
     try:
-        images_input = convert_from_path(input_pdf, first_page=1, last_page=pages_to_check)
-        images_output = convert_from_path(output_pdf, first_page=1, last_page=pages_to_check)
+        with fitz.open(input_pdf) as doc_in, fitz.open(output_pdf) as doc_out, metrics.span("verify.rasterize"):
+            min_len = min(len(doc_in), len(doc_out), pages_to_check)
+            for i in range(min_len):
+                stitched = stitch_images(render_page(doc_in, i, dpi, grayscale), render_page(doc_out, i, dpi, grayscale))
+                blob = encode_image(stitched, image_format, quality)
+                metrics.incr("verify_payload_bytes", len(blob["data"]))
+                payloads.append((i + 1, blob))
+                if debug_dir:
+                    # Exactly what the model sees, for checking a verdict by eye
+                    os.makedirs(debug_dir, exist_ok=True)
+                    with open(os.path.join(debug_dir, f"page_{i+1}_comparison.{'jpg' if image_format == 'jpeg' else 'png'}"), "wb") as f:
+                        f.write(blob["data"])
     except Exception as e:
-        print(f"Error converting PDF to image: {e}")
-        print("Note: You need 'poppler' installed. On Mac: `brew install poppler`.")
+        print(f"Error rendering PDF pages: {e}")
         return
 
     report = []
-    
-    min_len = min(len(images_input), len(images_output))
-    
+
     print("Analyzing pages with Gemini Vision...")
-    
-    for i in range(min_len):
-        print(f"Verifying Page {i+1}...")
-        
-        img_in = images_input[i]
-        img_out = images_output[i]
-        
-        stitched = stitch_images(img_in, img_out)
-        
-        # Save stitched for user to see manually if they want
-        debug_dir = "verification_debug"
-        if not os.path.exists(debug_dir):
-            os.makedirs(debug_dir)
-        stitched.save(f"{debug_dir}/page_{i+1}_comparison.png")
-        
-        prompt = """
-        You are a QA expert verifying a PDF translation tool.
-        
-        LEFT IMAGE: Original English PDF Page.
-        RIGHT IMAGE: Translated Hinglish PDF Page.
-        
-        Your Task:
-        Critique the RIGHT image based on the LEFT image. Focus on:
-        1. **Layout Fidelity**: Does the text start/end at similar positions? Are paragraphs split correctly?
-        2. **Text Overlap**: Is the translated text writing OVER other text or images? (Major Fail)
-        3. **Formatting**: Are fonts appropriately sized? (It's okay if they are slightly different, but huge mismatches are bad).
-        4. **Translation Quality**: Does the Hinglish look natural (Romanized Hindi) or just English?
-        
-        Output format:
-        - **Status**: [PASS / WARN / FAIL]
-        - **Issues**: List of specific issues found.
-        - **Suggestion**: How to fix (e.g., "Reduce font size", "Increase line spacing").
-        """
-        
+
+    for start in range(0, len(payloads), pages_per_request):
+        batch = payloads[start:start + pages_per_request]
+        page_numbers = [page for page, _ in batch]
+        label = f"Page {page_numbers[0]}" if len(batch) == 1 else f"Pages {page_numbers[0]}-{page_numbers[-1]}"
+        print(f"Verifying {label}...")
+
         try:
-            response = model.generate_content([prompt, stitched])
-            report.append(f"--- Page {i+1} ---\n{response.text.strip()}\n")
-            print(f"Page {i+1} Analysis:\n{response.text.strip()}\n")
+            response = lane.generate([verify_payload(page_numbers)] + [blob for _, blob in batch], "verify.request")
+            text = response.text.strip()
+            if len(batch) == 1 and not text.startswith("---"):
+                text = f"--- Page {page_numbers[0]} ---\n{text}"
+            report.append(f"{text}\n")
+            print(f"{label} Analysis:\n{text}\n")
         except Exception as e:
-            print(f"Error verifying page {i+1}: {e}")
-            report.append(f"--- Page {i+1} ---\nError during analysis: {e}\n")
+            print(f"Error verifying {label.lower()}: {e}")
+            report.extend(f"--- Page {page} ---\nError during analysis: {e}\n" for page in page_numbers)
 
     # Save full report
     with open("verification_report.txt", "w") as f:
         f.write("\n".join(report))
-    
-    print(f"Verification Check Complete. Report saved to 'verification_report.txt'. Debug images in '{debug_dir}/'.")
+
+    usage = token_report(metrics)
+    if usage:
+        print(usage)
+    print(f"Verification Check Complete. Report saved to 'verification_report.txt'."
+          + (f" Comparison images in '{debug_dir}/'." if debug_dir else ""))
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="PDF Verification Tool")
     parser.add_argument("input_pdf", help="Original PDF")
     parser.add_argument("output_pdf", help="Translated PDF")
     parser.add_argument("--pages", type=int, default=3, help="Number of pages to verify")
-    
+    parser.add_argument("--dpi", type=int, default=100, help="Resolution pages are rendered at for the model (default: 100)")
+    parser.add_argument("--color", action="store_true", help="Send color images instead of grayscale")
+    parser.add_argument("--format", choices=("jpeg", "png"), default="jpeg", help="Image encoding sent to the model (default: jpeg)")
+    parser.add_argument("--quality", type=int, default=70, help="JPEG quality (default: 70)")
+    parser.add_argument("--pages-per-request", type=int, default=1, metavar="N",
+                        help="Page pairs packed into one request (default: 1)")
+    parser.add_argument("--debug-dir", default=None, metavar="DIR",
+                        help="Also write each comparison image to DIR (e.g. verification_debug)")
+    parser.add_argument("--metrics-json", default=None, help="Write a JSON summary of timings, counters and tokens to this path")
+
     args = parser.parse_args()
-    
+    if args.pages_per_request < 1:
+        parser.error("--pages-per-request must be at least 1")
+
     api_key = os.environ.get("GOOGLE_API_KEY")
     if not api_key:
         # Try finding .env manually if not loaded
@@ -115,5 +154,12 @@ if __name__ == "__main__":
                 for line in f:
                     if line.startswith("GOOGLE_API_KEY="):
                         api_key = line.strip().split("=", 1)[1]
-    
-    verify_pdf(args.input_pdf, args.output_pdf, api_key, args.pages)
+
+    metrics = Metrics(job=args.output_pdf)
+    with metrics.span("total"):
+        verify_pdf(args.input_pdf, args.output_pdf, api_key, args.pages, dpi=args.dpi, grayscale=not args.color,
+                   image_format=args.format, quality=args.quality, pages_per_request=args.pages_per_request,
+                   debug_dir=args.debug_dir, metrics=metrics)
+    if args.metrics_json:
+        metrics.write_json(args.metrics_json)
+        print(f"Metrics written to {args.metrics_json}")
@@ -0,0 +1,241 @@
+import argparse
+import os
+import shutil
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Dict, Optional
+try:
+    from .jobqueue import JobQueue, default_worker_id
+    from .metrics import Metrics
+    from .pipeline import apply_translations, collect_segments, extract_pages, translate_segments
+except ImportError:
+    from jobqueue import JobQueue, default_worker_id
+    from metrics import Metrics
+    from pipeline import apply_translations, collect_segments, extract_pages, translate_segments
+
+
+def parts_dir(output_pdf: str) -> str:
+    """Where shard outputs of a job are spooled, next to the final output on the shared volume."""
+    return output_pdf + ".parts"
+
+
+class Worker:
+    """
+    Pulls page shards from a JobQueue, runs extract -> translate -> render on them
+    and writes each shard's PDF into the job's parts directory. Whenever a job has
+    all its shards done, whichever worker notices first merges the parts in page
+    order into the final output, so no separate coordinator process is needed.
+
+    Start one per core on as many machines as share the queue file and output volume;
+    throughput grows with the worker count until the model quota is the limit.
+    """
+
+    def __init__(self, queue: JobQueue, worker_id: Optional[str] = None, lease_seconds: float = 120,
+                 heartbeat_interval: float = 30, hedge: bool = False, metrics: Optional[Metrics] = None,
+                 models: Optional[str] = None):
+        self.queue = queue
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = heartbeat_interval
+        self.hedge = hedge
+        self.models = models
+        self.metrics = metrics or Metrics(job=self.worker_id)
+        self._translator = None
+
+    @property
+    def translator(self):
+        # One client (and one batcher/circuit breaker) for every shard this worker handles
+        if self._translator is None:
+            try:
+                from .routing import RoutingPolicy
+                from .translator import Translator
+            except ImportError:
+                from routing import RoutingPolicy
+                from translator import Translator
+            self._translator = Translator(metrics=self.metrics, hedge=self.hedge, routing=RoutingPolicy.from_spec(self.models))
+        return self._translator
+
+    def run(self, poll_interval: float = 5.0, exit_when_idle: bool = False):
+        print(f"Worker {self.worker_id} polling {self.queue.path}")
+        while True:
+            job = self.queue.claim_merge()
+            if job:
+                self.merge_job(job)
+                continue
+            shard = self.queue.claim(self.worker_id, self.lease_seconds)
+            if shard:
+                self.process_shard(shard)
+                continue
+            if exit_when_idle and self.queue.idle():
+                print("Queue is empty, exiting.")
+                return
+            time.sleep(poll_interval)
+
+    def process_shard(self, shard: Dict[str, Any]):
+        label = f"job {shard['job_id']} pages {shard['first_page'] + 1}-{shard['last_page']}"
+        print(f"Claimed {label} (attempt {shard['attempts']})")
+        lost = threading.Event()
+        stop = threading.Event()
+
+        def keep_lease():
+            while not stop.wait(self.heartbeat_interval):
+                if not self.queue.heartbeat(shard["id"], self.worker_id, self.lease_seconds):
+                    lost.set()
+                    return
+
+        heartbeat = threading.Thread(target=keep_lease, name="lease-heartbeat", daemon=True)
+        heartbeat.start()
+        try:
+            part_path = self._render_shard(shard)
+        except Exception as e:
+            self.metrics.incr("shard_failures")
+            print(f"Error on {label}: {e}")
+            self.queue.fail(shard["id"], self.worker_id, traceback.format_exc())
+            return
+        finally:
+            stop.set()
+            heartbeat.join()
+
+        if lost.is_set() or not self.queue.complete(shard["id"], self.worker_id, part_path):
+            # Someone else took the shard over after our lease ran out; their output wins
+            self.metrics.incr("shard_leases_lost")
+            print(f"Lease on {label} was lost, discarding result")
+            return
+        self.metrics.incr("shards_completed")
+        print(f"Finished {label}")
+
+    def _render_shard(self, shard: Dict[str, Any]) -> str:
+        try:
+            from .generator import PDFGenerator
+        except ImportError:
+            from generator import PDFGenerator
+
+        options = shard["options"]
+        with self.metrics.span("shard"):
+            pages_data = extract_pages(shard["input_pdf"], None, not options.get("no_ocr"), self.metrics,
+                                       page_numbers=range(shard["first_page"], shard["last_page"]))
+            sorted_texts, normalizer = collect_segments(pages_data, self.metrics, layout=not options.get("no_layout"))
+            translation_map = translate_segments(self.translator, sorted_texts, self.metrics)
+            apply_translations(pages_data, translation_map, normalizer)
+
+            directory = parts_dir(shard["output_pdf"])
+            os.makedirs(directory, exist_ok=True)
+            part_path = os.path.join(directory, f"{shard['shard_index']:05d}.pdf")
+            # Unique temporary name: a worker whose lease expired may still be writing the same shard
+            tmp_path = f"{part_path}.{self.worker_id.replace(os.sep, '_')}.tmp"
+            PDFGenerator(tmp_path, metrics=self.metrics, image_dpi=options.get("image_dpi")).generate(pages_data, translation_map)
+            os.replace(tmp_path, part_path)
+        return part_path
+
+    def merge_job(self, job: Dict[str, Any]):
+        try:
+            from .merge import merge_pdfs
+        except ImportError:
+            from merge import merge_pdfs
+
+        print(f"Merging job {job['id']} ({len(job['parts'])} parts) into {job['output_pdf']}")
+        try:
+            merge_pdfs(job["parts"], job["output_pdf"], self.metrics)
+            if job["options"].get("optimize"):
+                # Once on the merged file: shards share fonts and images that only now can be deduplicated
+                try:
+                    from .optimize import optimize_pdf
+                except ImportError:
+                    from optimize import optimize_pdf
+                optimize_pdf(job["output_pdf"], self.metrics)
+        except Exception as e:
+            self.metrics.incr("merge_failures")
+            print(f"Error merging job {job['id']}: {e}")
+            if not self.queue.requeue_merge(job["id"]):
+                self.metrics.incr("jobs_failed")
+                print(f"Job {job['id']} failed: its merge did not succeed after {job['merge_attempts']} attempt(s)")
+            return
+        self.queue.finish_job(job["id"])
+        shutil.rmtree(parts_dir(job["output_pdf"]), ignore_errors=True)
+        self.metrics.incr("jobs_completed")
+        print(f"Job {job['id']} done: {job['output_pdf']}")
+
+
+def submit(queue: JobQueue, input_pdf: str, output_pdf: str, shard_pages: int,
+           max_pages: Optional[int] = None, no_ocr: bool = False, image_dpi: Optional[float] = None,
+           optimize: bool = False, no_layout: bool = False) -> Optional[int]:
+    import fitz
+
+    with fitz.open(input_pdf) as doc:
+        page_count = len(doc)
+    if max_pages:
+        page_count = min(page_count, max_pages)
+    if page_count == 0:
+        print(f"Skipping {input_pdf}: it has no pages")
+        return None
+    options = {"no_ocr": no_ocr, "image_dpi": image_dpi, "optimize": optimize, "no_layout": no_layout}
+    job_id = queue.submit(input_pdf, output_pdf, page_count, shard_pages, options)
+    print(f"Queued job {job_id}: {input_pdf} ({page_count} pages, {shard_pages} per shard) -> {output_pdf}")
+    return job_id
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distributed PDF to Hinglish workers over a shared SQLite queue")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    submit_parser = subparsers.add_parser("submit", help="Queue a PDF (or a directory / quoted glob of PDFs)")
+    submit_parser.add_argument("queue", help="Path to the queue database on the shared volume")
+    submit_parser.add_argument("input_pdf", help="Input PDF, directory or glob")
+    submit_parser.add_argument("output_pdf", help="Output PDF (the output directory for several inputs)")
+    submit_parser.add_argument("--shard-pages", type=int, default=10, help="Pages per shard (default: 10)")
+    submit_parser.add_argument("--pages", type=int, default=None, help="Number of pages to convert (default: all)")
+    submit_parser.add_argument("--no-ocr", action="store_true", help="Disable OCR for images")
+    submit_parser.add_argument("--no-layout", action="store_true", help="Translate each text block on its own instead of merging paragraph fragments")
+    submit_parser.add_argument("--image-dpi", type=float, default=None, help="Downsample images shown at well above this resolution")
+    submit_parser.add_argument("--optimize", action="store_true", help="Shrink each merged output PDF")
+
+    run_parser = subparsers.add_parser("run", help="Process shards until stopped")
+    run_parser.add_argument("queue", help="Path to the queue database on the shared volume")
+    run_parser.add_argument("--worker-id", default=None, help="Name shown in the queue (default: host:pid)")
+    run_parser.add_argument("--lease", type=float, default=120, help="Seconds a shard stays claimed without a heartbeat")
+    run_parser.add_argument("--poll", type=float, default=5.0, help="Seconds between polls when the queue is empty")
+    run_parser.add_argument("--exit-when-idle", action="store_true", help="Exit once every job is done or failed")
+    run_parser.add_argument("--hedge", action="store_true", help="Send a duplicate request when a call runs longer than the observed p95 latency")
+    run_parser.add_argument("--models", default=None, metavar="SPEC", help="Model per tier, e.g. fast=gemini-2.0-flash-lite,strong=gemini-2.5-flash (default: $GEMINI_MODELS)")
+    run_parser.add_argument("--metrics-json", default=None, help="Write this worker's JSON metrics summary on exit")
+
+    status_parser = subparsers.add_parser("status", help="Show job progress")
+    status_parser.add_argument("queue", help="Path to the queue database on the shared volume")
+
+    args = parser.parse_args()
+    queue = JobQueue(args.queue)
+
+    if args.command == "submit":
+        try:
+            from .batch import is_batch_input, output_paths, resolve_inputs
+        except ImportError:
+            from batch import is_batch_input, output_paths, resolve_inputs
+        if is_batch_input(args.input_pdf):
+            inputs = resolve_inputs(args.input_pdf)
+            outputs = output_paths(inputs, args.output_pdf)
+        else:
+            inputs, outputs = [args.input_pdf], [args.output_pdf]
+        for input_pdf, output_pdf in zip(inputs, outputs):
+            submit(queue, input_pdf, output_pdf, args.shard_pages, args.pages, args.no_ocr, args.image_dpi, args.optimize, args.no_layout)
+
+    elif args.command == "run":
+        if not os.environ.get("GOOGLE_API_KEY"):
+            print("Error: GOOGLE_API_KEY not found.")
+            sys.exit(1)
+        worker = Worker(queue, args.worker_id, lease_seconds=args.lease,
+                        heartbeat_interval=max(1.0, args.lease / 4), hedge=args.hedge, models=args.models)
+        try:
+            worker.run(poll_interval=args.poll, exit_when_idle=args.exit_when_idle)
+        except KeyboardInterrupt:
+            print("Stopping; any claimed shard is re-queued when its lease expires.")
+        summary = worker.metrics.summary()
+        print(f"Worker finished in {summary['wall_seconds']}s: {summary['counters']}")
+        if args.metrics_json:
+            worker.metrics.write_json(args.metrics_json)
+
+    else:
+        for job in queue.status():
+            print(f"job {job['id']:>4}  {job['status']:<8} {job['done'] or 0}/{job['shards']} shards done, "
+                  f"{job['leased'] or 0} in progress, {job['failed'] or 0} failed  {job['output_pdf']}")